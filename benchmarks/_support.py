@@ -0,0 +1,20 @@
+"""
+Stand-ins shared by the benchmarks
+"""
+
+from flower_i18n.i18n import I18nHandler
+
+
+class FakeRequest:
+    def __init__(self, accept_language: str):
+        self.headers = {'Accept-Language': accept_language}
+
+
+class FakeHandler(I18nHandler):
+    """Stand-in for a Tornado handler with the methods the mixin relies on"""
+
+    def __init__(self, accept_language: str):
+        self.request = FakeRequest(accept_language)
+
+    def get_cookie(self, name, default=None):
+        return default
@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+"""
+Micro-benchmarks of the i18n hot paths, checked against a JSON baseline
+
+Times catalog lookups, catalog loading with many locales, locale negotiation
+and template patching. Record a baseline before a change or an upgrade, then
+compare against it::
+
+    python benchmarks/bench_hot_paths.py --save
+    python benchmarks/bench_hot_paths.py --tolerance 0.2
+
+Each result is the best of ``--runs`` runs, and lookups are timed in batches,
+so scheduling noise does not show up as a slowdown. Comparing exits with
+status 1 when any benchmark is slower than its baseline by more than the
+tolerance (a fraction, 0.25 by default). Baselines depend on the machine, so
+record and compare them on the same one.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import timeit
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from _support import FakeHandler
+from flower_i18n import __version__
+from flower_i18n.i18n import I18n, get_i18n
+from flower_i18n.patcher import TEMPLATE_REPLACEMENTS, TEMPLATE_RULES, FlowerTemplatePatcher
+
+DEFAULT_BASELINE = Path(__file__).parent / 'baseline.json'
+
+# Accept-Language headers as sent by common browsers and HTTP clients
+ACCEPT_LANGUAGE_CORPUS = [
+    'zh-CN,zh;q=0.9,en;q=0.8',
+    'zh-CN,zh;q=0.9,en-US;q=0.8,en;q=0.7',
+    'zh-TW,zh;q=0.9,en-US;q=0.8,en;q=0.7',
+    'zh-HK,zh-TW;q=0.9,zh;q=0.8,en;q=0.7',
+    'en-US,en;q=0.9',
+    'en-GB,en-US;q=0.9,en;q=0.8',
+    'en-US,en;q=0.5',
+    'de-DE,de;q=0.9,en-US;q=0.8,en;q=0.7',
+    'fr-FR,fr;q=0.9,en;q=0.8',
+    'ja,en-US;q=0.9,en;q=0.8',
+    'ko-KR,ko;q=0.9,en-US;q=0.8,en;q=0.7',
+    'pt-BR,pt;q=0.9,en-US;q=0.8,en;q=0.7',
+    'es-419,es;q=0.9',
+    'ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7',
+    '*',
+    '',
+]
+
+# Times each rule's source text is repeated in a synthetic template
+TEMPLATE_REPEAT = 200
+
+# Lookups per timed call, so each timing is well above the timer's resolution
+LOOKUP_BATCH = 1000
+
+
+def write_locales(root: Path, count: int, keys: int = 200):
+    """Write en_US plus count - 1 synthetic locales of ``keys`` messages each"""
+    names = ['en_US'] + [f'x{index:03d}_XX' for index in range(count - 1)]
+    for name in names:
+        locale_dir = root / name
+        locale_dir.mkdir()
+        messages = {f'section{key % 10}.key{key}': f'{name} message {key}' for key in range(keys)}
+        with open(locale_dir / 'messages.json', 'w', encoding='utf-8') as f:
+            json.dump(messages, f)
+
+
+def time_per_op(func: Callable[[], None], number: int, repeat: int = 7) -> float:
+    """Best of ``repeat`` runs, in microseconds per call"""
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1e6
+
+
+def time_per_lookup(get: Callable[[str, str], str], keys: List[str], locale: str) -> float:
+    """Microseconds per lookup, timing batches of lookups over ``keys``"""
+    def lookup_batch():
+        for key in keys:
+            get(key, locale)
+
+    return time_per_op(lookup_batch, 200) / len(keys)
+
+
+def bench_lookups(results: Dict[str, float]):
+    i18n = get_i18n()
+    i18n.preload(['en_US', 'zh_CN'])
+    known = list(i18n.get_catalog('zh_CN'))
+    hits = (known * (LOOKUP_BATCH // len(known) + 1))[:LOOKUP_BATCH]
+    misses = [f'no.such.key{index}' for index in range(LOOKUP_BATCH)]
+    results['get.hit'] = time_per_lookup(i18n.get, hits, 'zh_CN')
+    results['get.miss'] = time_per_lookup(i18n.get, misses, 'zh_CN')
+    # Unknown locale, served by the default catalog
+    results['get.fallback'] = time_per_lookup(i18n.get, hits, 'de_DE')
+
+
+def bench_loading(results: Dict[str, float]):
+    for count in (2, 30, 200):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            write_locales(root, count)
+            number = max(600 // count, 3)
+            results[f'init.{count}_locales'] = time_per_op(
+                lambda: I18n(locales_dir=root, catalog_format='json'), number)
+
+            for catalog_format, suffix in (('json', ''), ('compact', '.compact')):
+                def load_all():
+                    i18n = I18n(locales_dir=root, catalog_format=catalog_format)
+                    i18n.preload(i18n.get_available_locales())
+
+                results[f'load.{count}_locales{suffix}'] = time_per_op(load_all, number)
+
+
+def bench_negotiation(results: Dict[str, float]):
+    handlers = [FakeHandler(header) for header in ACCEPT_LANGUAGE_CORPUS]
+
+    def negotiate_corpus():
+        for handler in handlers:
+            handler.get_user_locale()
+
+    per_corpus = time_per_op(negotiate_corpus, 5000)
+    results['get_user_locale'] = per_corpus / len(handlers)
+
+
+def synthetic_template(name: str) -> str:
+    """A large template containing every rule's source text many times"""
+    sources = list(TEMPLATE_RULES.get(name, {})) + list(TEMPLATE_REPLACEMENTS.get(name, {}))
+    filler = '<div class="col">{{ value }}</div>\n'
+    body = ''.join(f'{source}\n{filler}' for source in sources if source != '</body>')
+    html = '<html><body>\n' + body * TEMPLATE_REPEAT
+    return html + ('</body></html>' if '</body>' in sources else '</html>')
+
+
+def bench_patching(results: Dict[str, float]):
+    methods: List[Tuple[str, str]] = [
+        ('base.html', 'patch_base_template'),
+        ('navbar.html', 'patch_navbar_template'),
+        ('broker.html', 'patch_broker_template'),
+        ('workers.html', 'patch_workers_template'),
+        ('tasks.html', 'patch_tasks_template'),
+        ('worker.html', 'patch_worker_template'),
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        (root / 'templates').mkdir()
+        sources = {name: synthetic_template(name) for name, _ in methods}
+
+        for name, method in methods:
+            template = root / 'templates' / name
+            best: Optional[float] = None
+            for _ in range(5):
+                template.write_text(sources[name], encoding='utf-8')
+                patcher = FlowerTemplatePatcher(root)
+                patch = getattr(patcher, method)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    start = time.perf_counter()
+                    patch()
+                    elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            results[f'{method}'] = best * 1e6
+        shutil.rmtree(root / 'templates')
+
+
+BENCHMARKS = {
+    'lookups': bench_lookups,
+    'loading': bench_loading,
+    'negotiation': bench_negotiation,
+    'patching': bench_patching,
+}
+
+
+def run(groups: List[str], runs: int) -> Dict[str, float]:
+    """Best result of each benchmark over ``runs`` runs of the groups"""
+    results: Dict[str, float] = {}
+    for _ in range(runs):
+        for group in groups:
+            current: Dict[str, float] = {}
+            BENCHMARKS[group](current)
+            for name, value in current.items():
+                results[name] = min(value, results.get(name, value))
+    return results
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], tolerance: float) -> List[str]:
+    """Print results against a baseline and return the regressed benchmarks"""
+    regressions = []
+    print(f'{"benchmark":<28} {"baseline (us)":>14} {"now (us)":>12} {"change":>8}')
+    for name, value in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            print(f'{name:<28} {"-":>14} {value:>12.2f} {"new":>8}')
+            continue
+        change = value / previous - 1
+        flag = ''
+        if change > tolerance:
+            regressions.append(name)
+            flag = '  ✗'
+        print(f'{name:<28} {previous:>14.2f} {value:>12.2f} {change:>+7.0%}{flag}')
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--baseline', type=Path, default=DEFAULT_BASELINE,
+                        help='baseline JSON file (default: %(default)s)')
+    parser.add_argument('--save', action='store_true',
+                        help='record the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed slowdown as a fraction (default: %(default)s)')
+    parser.add_argument('--only', action='append', choices=sorted(BENCHMARKS),
+                        help='run only these groups')
+    parser.add_argument('--runs', type=int, default=3,
+                        help='runs to keep the best result of (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    results = run(args.only or list(BENCHMARKS), args.runs)
+
+    if args.save:
+        data = {
+            'flower_i18n': __version__,
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'results': results,
+        }
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        print(f'✓ Saved {len(results)} results to {args.baseline}')
+        return 0
+
+    baseline: Dict[str, float] = {}
+    if args.baseline.exists():
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+    else:
+        print(f'⚠ No baseline at {args.baseline}; run with --save to record one')
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f'\n✗ {len(regressions)} benchmark(s) slower than baseline by more than '
+              f'{args.tolerance:.0%}: {", ".join(regressions)}')
+        return 1
+    print('\n✓ No regressions')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+"""
+Benchmark per-request translation overhead of I18nHandler
+
+Compares resolving the locale on every ``_()`` call with the request-scoped
+translator bound in ``prepare()``, for a growing number of keys per page.
+"""
+
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from _support import FakeHandler
+from flower_i18n.i18n import get_i18n
+
+ACCEPT_LANGUAGE = 'zh-CN,zh;q=0.9,en-US;q=0.8,en;q=0.7'
+
+
+def per_call_request(keys):
+    """Resolve the locale for every key, as I18nHandler._ used to"""
+    handler = FakeHandler(ACCEPT_LANGUAGE)
+    i18n = get_i18n()
+    for key in keys:
+        i18n.get(key, handler.get_user_locale())
+
+
+def bound_request(keys):
+    """Resolve the locale once in prepare() and use the bound translator"""
+    handler = FakeHandler(ACCEPT_LANGUAGE)
+    handler.bind_translator()
+    for key in keys:
+        handler._(key)
+
+
+def main():
+    all_keys = list(get_i18n().get_catalog("en_US"))
+    print(f"{'keys':>6} {'per-call (us)':>14} {'bound (us)':>11} {'speedup':>8}")
+    for count in (10, 80, 320, 1280):
+        keys = (all_keys * (count // len(all_keys) + 1))[:count]
+        number = max(20000 // count, 10)
+        per_call = min(timeit.repeat(lambda: per_call_request(keys), number=number, repeat=5))
+        bound = min(timeit.repeat(lambda: bound_request(keys), number=number, repeat=5))
+        per_call_us = per_call / number * 1e6
+        bound_us = bound / number * 1e6
+        print(f"{count:>6} {per_call_us:>14.1f} {bound_us:>11.1f} {per_call_us / bound_us:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,371 @@
+#!/usr/bin/env python
+"""
+End-to-end load harness: a stand-in Flower app with and without i18n
+
+Starts a local Tornado app serving Flower-like workers, tasks and broker
+pages rendered from fake data, and drives it with concurrent async clients
+sending a mix of ``flower_locale`` cookies and Accept-Language headers. Each
+mode gets a fresh app:
+
+    baseline   plain handlers and unpatched templates
+    patched    templates patched by FlowerTemplatePatcher, handlers mixing in I18nHandler
+    ssr        unpatched templates rendered translated via setup_i18n(render_templates=True)
+
+Reports throughput, p50/p99 latency and the peak traced allocation per
+request. Everything runs in one process and offline; no broker or Celery::
+
+    python benchmarks/load_harness.py --requests 3000 --concurrency 32 --tasks 1000
+
+Client and server share the process, so absolute numbers include the
+client's share; compare modes against each other, not against production.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import math
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import tornado.web
+from tornado.httpclient import AsyncHTTPClient, HTTPRequest
+from tornado.httpserver import HTTPServer
+from tornado.testing import bind_unused_port
+
+from bench_hot_paths import ACCEPT_LANGUAGE_CORPUS
+from flower_i18n import __version__
+from flower_i18n.i18n import get_i18n, localize_handlers, setup_i18n
+from flower_i18n.patcher import TEMPLATE_RULES, FlowerTemplatePatcher
+
+MODES = ("baseline", "patched", "ssr")
+
+# Share of requests per page, roughly what a dashboard's users open
+PAGE_WEIGHTS = {"/workers": 4, "/tasks": 4, "/broker": 2}
+
+# Share of clients that already picked a language in the switcher
+COOKIE_SHARE = 0.3
+
+TASK_STATES = ["SUCCESS", "SUCCESS", "SUCCESS", "FAILURE",
+               "STARTED", "RECEIVED", "RETRY", "REVOKED"]
+
+BASE_TEMPLATE = """<!DOCTYPE html>
+<html lang="en">
+  <head>
+    <meta charset="utf-8">
+    <title>Flower</title>
+  </head>
+  <body>
+    {% include "navbar.html" %}
+    <div class="container-fluid">
+      {% block content %}{% end %}
+    </div>
+  </body>
+</html>
+"""
+
+TABLE_TEMPLATE = """{% extends "base.html" %}
+{% block content %}
+<table class="table table-bordered table-striped">
+  <thead>
+    <tr>
+HEADERS
+    </tr>
+  </thead>
+  <tbody>
+  {% for row in rows %}
+    <tr>{% for cell in row %}<td>{{ cell }}</td>{% end %}</tr>
+  {% end %}
+  </tbody>
+</table>
+{% end %}
+"""
+
+
+def navbar_template() -> str:
+    items = "\n".join(f'      <li class="nav-item"><a class="nav-link" {source}</li>'
+                      for source in TEMPLATE_RULES["navbar.html"])
+    return ('<nav class="navbar navbar-expand-lg">\n    <ul class="navbar-nav">\n'
+            f'{items}\n    </ul>\n</nav>\n')
+
+
+def table_template(name: str) -> str:
+    """A page template whose header row holds every rule source of the page"""
+    headers = "\n".join(f"      {source}" for source in TEMPLATE_RULES[name])
+    return TABLE_TEMPLATE.replace("HEADERS", headers)
+
+
+def write_flower_tree(root: Path):
+    """Write stand-in templates and static dir laid out like Flower's package"""
+    templates = root / "templates"
+    templates.mkdir(parents=True)
+    (root / "static" / "js").mkdir(parents=True)
+    (templates / "base.html").write_text(BASE_TEMPLATE, encoding="utf-8")
+    (templates / "navbar.html").write_text(navbar_template(), encoding="utf-8")
+    for name in ("workers.html", "tasks.html", "broker.html"):
+        (templates / name).write_text(table_template(name), encoding="utf-8")
+
+
+def fake_data(workers: int, tasks: int, queues: int, seed: int) -> Dict[str, List[list]]:
+    """Rows for each page, one cell per header of its template"""
+    rng = random.Random(seed)
+    worker_names = [f"celery@worker-{index:03d}" for index in range(max(workers, 1))]
+    now = time.time()
+
+    worker_rows = []
+    for name in worker_names[:workers]:
+        processed = rng.randint(0, 100000)
+        failed = rng.randint(0, processed // 50 + 1)
+        worker_rows.append([
+            name, "Online" if rng.random() < 0.9 else "Offline", rng.randint(0, 16),
+            processed, failed, processed - failed, rng.randint(0, 200),
+            ", ".join(f"{rng.random() * 4:.2f}" for _ in range(3)), processed,
+        ])
+
+    task_rows = []
+    for index in range(tasks):
+        received = now - rng.random() * 86400
+        task_rows.append([
+            f"app.tasks.job_{index % 40}", f"{rng.getrandbits(128):032x}", rng.choice(TASK_STATES),
+            repr((index, "payload")), repr({"attempt": index % 3}), repr({"ok": True}),
+            f"{received:.3f}", f"{received + rng.random():.3f}", f"{rng.random() * 10:.3f}",
+            rng.choice(worker_names), "celery", "celery", index % 3, False, "",
+            "", "",
+        ])
+
+    queue_rows = [
+        [f"queue-{index:02d}", rng.randint(0, 5000), rng.randint(0, 50),
+         rng.randint(0, 5000), rng.randint(0, 8), ""]
+        for index in range(queues)
+    ]
+    return {"workers": worker_rows, "tasks": task_rows, "broker": queue_rows}
+
+
+class PageHandler(tornado.web.RequestHandler):
+    """Stand-in for Flower's page views: renders a table of fake rows"""
+
+    def initialize(self, template: str, rows: List[list]):
+        self.template = template
+        self.rows = rows
+
+    def get(self):
+        self.render(self.template, rows=self.rows)
+
+
+def make_app(root: Path, data: Dict[str, List[list]]) -> tornado.web.Application:
+    return tornado.web.Application(
+        [
+            tornado.web.url(f"/{page}", PageHandler,
+                            {"template": f"{page}.html", "rows": data[page]}, name=page)
+            for page in ("workers", "tasks", "broker")
+        ],
+        template_path=str(root / "templates"),
+        static_path=str(root / "static"),
+    )
+
+
+def build_app(mode: str, root: Path, data: Dict[str, List[list]]) -> tornado.web.Application:
+    """Set up a stand-in Flower tree and app for a mode"""
+    write_flower_tree(root)
+    if mode == "patched":
+        with contextlib.redirect_stdout(io.StringIO()):
+            FlowerTemplatePatcher(root).patch()
+    app = make_app(root, data)
+    if mode == "patched":
+        localize_handlers(app)
+    elif mode == "ssr":
+        setup_i18n(app, render_templates=True)
+    return app
+
+
+def request_mix(count: int, seed: int) -> List[Tuple[str, Dict[str, str]]]:
+    """Paths and headers of ``count`` requests, the same for every mode"""
+    rng = random.Random(seed)
+    pages = [page for page, weight in PAGE_WEIGHTS.items() for _ in range(weight)]
+    locales = sorted(get_i18n().get_available_locales())
+    mix = []
+    for _ in range(count):
+        headers = {}
+        if rng.random() < COOKIE_SHARE:
+            headers["Cookie"] = f"flower_locale={rng.choice(locales)}"
+        accept_language = rng.choice(ACCEPT_LANGUAGE_CORPUS)
+        if accept_language:
+            headers["Accept-Language"] = accept_language
+        mix.append((rng.choice(pages), headers))
+    return mix
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of sorted values"""
+    index = min(len(values) - 1, max(0, math.ceil(fraction * len(values)) - 1))
+    return values[index]
+
+
+async def drive(base_url: str, mix: List[Tuple[str, Dict[str, str]]],
+                concurrency: int) -> Tuple[float, List[float], int]:
+    """Send the requests from ``concurrency`` clients; wall time, latencies, errors"""
+    client = AsyncHTTPClient(force_instance=True, max_clients=concurrency)
+    latencies: List[float] = []
+    errors = 0
+    pending = iter(mix)
+
+    async def run_client():
+        nonlocal errors
+        for path, headers in pending:
+            start = time.perf_counter()
+            response = await client.fetch(HTTPRequest(base_url + path, headers=headers),
+                                          raise_error=False)
+            latencies.append(time.perf_counter() - start)
+            if response.code != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run_client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    client.close()
+    latencies.sort()
+    return elapsed, latencies, errors
+
+
+async def measure_allocations(base_url: str, mix: List[Tuple[str, Dict[str, str]]]) -> float:
+    """Mean peak of traced memory per request, in bytes, one request at a time"""
+    client = AsyncHTTPClient(force_instance=True)
+    peaks = []
+    tracemalloc.start()
+    try:
+        for path, headers in mix:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            await client.fetch(HTTPRequest(base_url + path, headers=headers), raise_error=False)
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+        client.close()
+    return sum(peaks) / len(peaks)
+
+
+async def run_modes(modes: List[str], args: argparse.Namespace, data: Dict[str, List[list]],
+                    mix: List[Tuple[str, Dict[str, str]]]) -> Dict[str, Dict[str, float]]:
+    """Serve every mode at once and load them in turn, round after round
+
+    Interleaving the modes spreads drift of the machine (frequency scaling,
+    other load) over all of them; each mode keeps its best round.
+    """
+    root = Path(tempfile.mkdtemp(prefix="flower-i18n-load-"))
+    servers = {}
+    urls = {}
+    try:
+        for mode in modes:
+            sock, port = bind_unused_port()
+            servers[mode] = HTTPServer(build_app(mode, root / mode, data))
+            servers[mode].add_sockets([sock])
+            urls[mode] = f"http://127.0.0.1:{port}"
+            # Warm up template compilation, catalogs and negotiation memos
+            await drive(urls[mode], mix[:args.warmup], args.concurrency)
+
+        best: Dict[str, Tuple[float, List[float], int]] = {}
+        for _ in range(args.rounds):
+            for mode in modes:
+                elapsed, latencies, errors = await drive(urls[mode], mix, args.concurrency)
+                if mode not in best or elapsed < best[mode][0]:
+                    best[mode] = (elapsed, latencies, errors)
+
+        results = {}
+        for mode in modes:
+            elapsed, latencies, errors = best[mode]
+            allocated = await measure_allocations(urls[mode], mix[:args.alloc_requests])
+            results[mode] = {
+                "requests_per_second": len(mix) / elapsed,
+                "p50_ms": percentile(latencies, 0.50) * 1e3,
+                "p99_ms": percentile(latencies, 0.99) * 1e3,
+                "alloc_kib_per_request": allocated / 1024,
+                "errors": errors,
+            }
+            print(f"✓ {mode}")
+        return results
+    finally:
+        for server in servers.values():
+            server.stop()
+            await server.close_all_connections()
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def report(results: Dict[str, Dict[str, float]]):
+    print(f"\n{'mode':<10} {'req/s':>9} {'p50 (ms)':>9} {'p99 (ms)':>9} "
+          f"{'KiB/req':>9} {'errors':>7}  vs baseline")
+    baseline = results.get("baseline")
+    for mode, result in results.items():
+        change = ""
+        if baseline and mode != "baseline":
+            throughput = result['requests_per_second'] / baseline['requests_per_second'] - 1
+            latency = result['p99_ms'] / baseline['p99_ms'] - 1
+            change = f"{throughput:+.0%} req/s, {latency:+.0%} p99"
+        print(f"{mode:<10} {result['requests_per_second']:>9.1f} {result['p50_ms']:>9.2f} "
+              f"{result['p99_ms']:>9.2f} {result['alloc_kib_per_request']:>9.1f} "
+              f"{result['errors']:>7}  {change}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--mode", action="append", choices=MODES,
+                        help="run only these modes (default: all)")
+    parser.add_argument("--requests", type=int, default=2000,
+                        help="measured requests per mode (default: %(default)s)")
+    parser.add_argument("--concurrency", type=int, default=32,
+                        help="concurrent clients (default: %(default)s)")
+    parser.add_argument("--rounds", type=int, default=3,
+                        help="load rounds per mode, keeping the best (default: %(default)s)")
+    parser.add_argument("--warmup", type=int, default=200,
+                        help="unmeasured requests sent first (default: %(default)s)")
+    parser.add_argument("--alloc-requests", type=int, default=100,
+                        help="requests traced for allocations (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=50,
+                        help="fake workers (default: %(default)s)")
+    parser.add_argument("--tasks", type=int, default=500,
+                        help="fake tasks (default: %(default)s)")
+    parser.add_argument("--queues", type=int, default=20,
+                        help="fake broker queues (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=1,
+                        help="seed of the fake data and request mix (default: %(default)s)")
+    parser.add_argument("--json", type=Path, help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    data = fake_data(args.workers, args.tasks, args.queues, args.seed)
+    mix = request_mix(args.requests, args.seed)
+    print(f"{args.requests} requests x {args.rounds} rounds, {args.concurrency} clients, "
+          f"{args.workers} workers, {args.tasks} tasks, {args.queues} queues")
+
+    modes = [mode for mode in MODES if mode in (args.mode or MODES)]
+    results = asyncio.run(run_modes(modes, args, data, mix))
+
+    report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({
+                "flower_i18n": __version__,
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "options": {name: value for name, value in vars(args).items()
+                            if name not in ("json", "mode")},
+                "results": results,
+            }, f, indent=2, sort_keys=True)
+        print(f"\n✓ Saved results to {args.json}")
+
+    if any(result["errors"] for result in results.values()):
+        print("\n✗ Some requests failed")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
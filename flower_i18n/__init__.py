@@ -6,6 +6,12 @@ __version__ = "0.1.2"
 __author__ = "邹长林 (Zou Changlin)"
 __email__ = "zchanglin@163.com"
 
-from .i18n import I18nHandler, setup_i18n
+__all__ = ['I18nHandler', 'setup_i18n', '__version__']
 
-__all__ = ['I18nHandler', 'setup_i18n', '__version__']
\ No newline at end of file
+
+def __getattr__(name):
+    # Imported on first use, so the command line tools start without them
+    if name in ('I18nHandler', 'setup_i18n'):
+        from . import i18n
+        return getattr(i18n, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,145 @@
+"""
+Build-time generation of the i18n.js runtime and per-locale catalog bundles
+"""
+
+import gzip
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from .i18n import I18n, get_i18n
+
+try:
+    import brotli
+except ImportError:  # brotli is optional
+    brotli = None
+
+RUNTIME_SOURCE = Path(__file__).parent / "static" / "js" / "i18n.js"
+MANIFEST_PLACEHOLDER = "/*@@FLOWER_I18N_MANIFEST@@*/{}"
+RUNTIME_NAME = "i18n.js"
+CATALOG_DIR = "i18n"
+
+
+def serialize_catalog(catalog: Mapping[str, str]) -> bytes:
+    """Serialize a catalog as compact, deterministic JSON"""
+    if not isinstance(catalog, dict):
+        catalog = dict(catalog)
+    return json.dumps(
+        catalog, ensure_ascii=False, sort_keys=True, separators=(',', ':')
+    ).encode('utf-8')
+
+
+def content_hash(data: bytes, length: int = 12) -> str:
+    """Short content hash used in file names and ETags"""
+    return hashlib.sha256(data).hexdigest()[:length]
+
+
+def precompress(data: bytes) -> Dict[str, bytes]:
+    """Compress data once for every supported content encoding"""
+    # mtime=0 keeps the output, and therefore its hash, reproducible
+    encoded = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        encoded['br'] = brotli.compress(data)
+    return encoded
+
+
+# File suffix of the precompressed copies, per content encoding
+ENCODING_SUFFIXES = {'gzip': '.gz', 'br': '.br'}
+
+
+class StaticBundle:
+    """Generated i18n runtime plus one content-hashed catalog file per locale"""
+
+    def __init__(self, files: Dict[str, bytes], manifest: Dict[str, Dict[str, str]]):
+        # Kept in one tuple so replace() swaps files, manifest and the
+        # compression and version caches with a single assignment
+        self._state = (files, manifest, {}, {})
+
+    @property
+    def files(self) -> Dict[str, bytes]:
+        return self._state[0]
+
+    @property
+    def manifest(self) -> Dict[str, Dict[str, str]]:
+        return self._state[1]
+
+    def replace(self, other: "StaticBundle"):
+        """Atomically take over the contents of a freshly built bundle"""
+        self._state = (other.files, other.manifest, {}, {})
+
+    def version(self, name: str) -> Optional[str]:
+        """Content hash of a file, for cache-busting URLs; None if there is no such file"""
+        files, _, _, versions = self._state
+        digest = versions.get(name)
+        if digest is None:
+            data = files.get(name)
+            if data is None:
+                return None
+            digest = versions[name] = content_hash(data)
+        return digest
+
+    def lookup(self, name: str) -> Optional[Tuple[bytes, Dict[str, bytes]]]:
+        """Get a file and its precompressed variants from one consistent snapshot"""
+        files, _, encoded_cache, _ = self._state
+        data = files.get(name)
+        if data is None:
+            return None
+        encoded = encoded_cache.get(name)
+        if encoded is None:
+            encoded = encoded_cache[name] = precompress(data)
+        return data, encoded
+
+    def get_encoded(self, name: str) -> Dict[str, bytes]:
+        """Get the precompressed variants of a file, compressing it only once"""
+        found = self.lookup(name)
+        if found is None:
+            raise KeyError(name)
+        return found[1]
+
+    def write(self, js_dir: Path) -> List[Path]:
+        """Write the bundle and its precompressed copies below a js directory"""
+        catalog_dir = js_dir / CATALOG_DIR
+        catalog_dir.mkdir(parents=True, exist_ok=True)
+
+        # Catalogs from previous builds are stale once their hash changes
+        current = {js_dir / name for name in self.files}
+        for path in catalog_dir.iterdir():
+            if path.with_suffix('') not in current and path not in current:
+                path.unlink()
+
+        written = []
+        for name, data in self.files.items():
+            path = js_dir / name
+            path.write_bytes(data)
+            written.append(path)
+            for encoding, encoded in self.get_encoded(name).items():
+                compressed = path.with_name(path.name + ENCODING_SUFFIXES[encoding])
+                compressed.write_bytes(encoded)
+                written.append(compressed)
+        return written
+
+
+def build_bundle(i18n: Optional[I18n] = None) -> StaticBundle:
+    """Generate the runtime and per-locale catalogs from the messages.json sources"""
+    i18n = i18n or get_i18n()
+    files: Dict[str, bytes] = {}
+    manifest: Dict[str, Dict[str, str]] = {}
+
+    for locale in i18n.get_available_locales():
+        catalog = serialize_catalog(i18n.get_catalog(locale))
+        data = b'window.FlowerI18n.registerCatalog(%s,%s);' % (
+            json.dumps(locale).encode('utf-8'), catalog)
+        digest = content_hash(data)
+        name = f"{CATALOG_DIR}/{locale}.{digest}.min.js"
+        files[name] = data
+        manifest[locale] = {
+            'name': i18n.get_messages(locale).get('locale.name', locale),
+            'file': name,
+            'hash': digest,
+        }
+
+    runtime = RUNTIME_SOURCE.read_text(encoding='utf-8').replace(
+        MANIFEST_PLACEHOLDER, json.dumps(manifest, ensure_ascii=False, sort_keys=True))
+    files[RUNTIME_NAME] = runtime.encode('utf-8')
+    return StaticBundle(files, manifest)
@@ -0,0 +1,98 @@
+"""
+flower-i18n command line
+
+Subcommands import only what they need. ``status`` and ``verify`` locate
+Flower without importing it and only read the patch manifest and a few
+files, so they are cheap enough to run as container health checks.
+"""
+
+import argparse
+import sys
+from typing import List, Optional
+
+
+def _patcher(args):
+    from pathlib import Path
+    from .patcher import FlowerTemplatePatcher
+
+    return FlowerTemplatePatcher(Path(args.flower_path) if args.flower_path else None)
+
+
+def cmd_patch(args) -> int:
+    _patcher(args).patch()
+    return 0
+
+
+def cmd_unpatch(args) -> int:
+    _patcher(args).unpatch()
+    return 0
+
+
+def _report(args, verify: bool) -> int:
+    patcher = _patcher(args)
+    states = patcher.template_states(verify=verify)
+    static = patcher.static_state(verify=verify)
+
+    ok = all(state == 'patched' for state in states.values()) and static == 'generated'
+    if not args.quiet:
+        print(f"Flower: {patcher.flower_path}")
+        for name, state in states.items():
+            print(f"{'✓' if state == 'patched' else '✗'} {name}: {state}")
+        print(f"{'✓' if static == 'generated' else '✗'} static files: {static}")
+    return 0 if ok else 1
+
+
+def cmd_status(args) -> int:
+    return _report(args, verify=False)
+
+
+def cmd_verify(args) -> int:
+    return _report(args, verify=True)
+
+
+def cmd_compile(args) -> int:
+    from .binary import compile_flower_catalogs
+
+    compile_flower_catalogs(args.locales or None)
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="flower-i18n", description="Flower i18n tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add(name, func, help_text):
+        subparser = subparsers.add_parser(name, help=help_text, description=help_text)
+        subparser.set_defaults(func=func)
+        return subparser
+
+    for name, func, help_text in (
+        ("patch", cmd_patch, "patch Flower's templates and generate the i18n scripts"),
+        ("unpatch", cmd_unpatch, "restore Flower's original templates"),
+        ("status", cmd_status, "report whether Flower is patched (exit status 1 if not)"),
+        ("verify", cmd_verify, "like status, but hash every file and check for stale scripts"),
+    ):
+        subparser = add(name, func, help_text)
+        subparser.add_argument("--flower-path",
+                               help="Flower package directory (default: located automatically)")
+        if name in ("status", "verify"):
+            subparser.add_argument("-q", "--quiet", action="store_true",
+                                   help="only set the exit status")
+
+    compile_parser = add("compile", cmd_compile,
+                         "compile catalogs into memory-mappable messages.bin files")
+    compile_parser.add_argument("locales", nargs="*", help="locales to compile (default: all)")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except ImportError as e:
+        print(f"✗ {e}")
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
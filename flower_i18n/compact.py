@@ -0,0 +1,113 @@
+"""
+Compact catalogs: keys interned once, locales stored as arrays indexed by key ID
+
+Each key string is stored a single time in a process-wide ``KeyTable``. A
+locale only keeps a tuple of its own translations indexed by key ID, with
+``None`` holes where it falls back to the next locale of its chain, so memory
+grows with keys + locales × translated strings instead of locales × keys.
+"""
+
+import threading
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# A locale's own translations by key ID; None where it has none
+ValueArray = Tuple[Optional[str], ...]
+
+
+class KeyTable:
+    """Append-only key <-> integer ID table shared by every locale"""
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.keys: List[str] = []
+        self._lock = threading.Lock()
+
+    def intern(self, key: str) -> int:
+        """Get a key's ID, assigning the next free one to a new key"""
+        key_id = self.ids.get(key)
+        if key_id is None:
+            with self._lock:
+                key_id = self.ids.get(key)
+                if key_id is None:
+                    key_id = len(self.keys)
+                    # Publish the key before its ID so readers never see a dangling ID
+                    self.keys.append(key)
+                    self.ids[key] = key_id
+        return key_id
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+
+# IDs are stable for the lifetime of the process, across I18n instances
+KEYS = KeyTable()
+
+
+def build_array(messages: Dict[str, str], keys: KeyTable = KEYS) -> ValueArray:
+    """Turn a locale's messages into its value array; empty strings are holes"""
+    entries = [(keys.intern(key), value) for key, value in messages.items() if value]
+    values: List[Optional[str]] = [None] * (max((key_id for key_id, _ in entries), default=-1) + 1)
+    for key_id, value in entries:
+        values[key_id] = value
+    return tuple(values)
+
+
+class CompactCatalog(Mapping):
+    """Read-only mapping over a fallback chain of value arrays
+
+    Lookups try each array of the chain in order, so holes fall through to
+    the parent locales and finally the default locale.
+    """
+
+    def __init__(self, arrays: Sequence[ValueArray], keys: KeyTable = KEYS):
+        self.key_table = keys
+        self._ids = keys.ids
+        self._arrays = tuple(arrays)
+        longest = max((len(values) for values in self._arrays), default=0)
+        self._length = sum(1 for key_id in range(longest) if self.get_id(key_id) is not None)
+
+    def get_id(self, key_id: int, default=None):
+        """Translate by key ID"""
+        for values in self._arrays:
+            if key_id < len(values):
+                value = values[key_id]
+                if value is not None:
+                    return value
+        return default
+
+    def get(self, key, default=None):
+        key_id = self._ids.get(key)
+        if key_id is None:
+            return default
+        return self.get_id(key_id, default)
+
+    def __getitem__(self, key: str) -> str:
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key) -> bool:
+        return self.get(key) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        keys = self.key_table.keys
+        longest = max((len(values) for values in self._arrays), default=0)
+        for key_id in range(longest):
+            if self.get_id(key_id) is not None:
+                yield keys[key_id]
+
+    def __len__(self) -> int:
+        return self._length
+
+    def sources(self, chain: Sequence[str]) -> Dict[str, str]:
+        """Keys supplied by a later array, with that array's locale in ``chain``"""
+        keys = self.key_table.keys
+        own = self._arrays[0] if self._arrays else ()
+        found: Dict[str, str] = {}
+        for index in range(len(self._arrays) - 1, 0, -1):
+            for key_id, value in enumerate(self._arrays[index]):
+                if value is not None and (key_id >= len(own) or own[key_id] is None):
+                    found[keys[key_id]] = chain[index]
+        return found
@@ -0,0 +1,119 @@
+"""
+Server-side localization of Flower's tasks and workers JSON feeds
+
+The labels are shown by i18n.js in place of the raw values after each table
+draw. Timestamps are formatted in the ``tzinfo`` given as the application's
+``i18n_timezone`` setting, else in Celery's ``timezone`` like Flower's tasks
+page, else in UTC.
+"""
+
+from datetime import tzinfo
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .formatting import format_columns
+from .i18n import I18n, I18nHandler, get_i18n
+
+# Row fields to label per feed handler: handler class name -> field -> key of a value
+FEED_LABELS: Dict[str, Dict[str, Callable[[Any], str]]] = {
+    'TasksDataTable': {
+        'state': lambda state: f'state.{str(state).lower()}',
+    },
+    'WorkersView': {
+        'status': lambda alive: 'workers.online' if alive else 'workers.offline',
+    },
+}
+
+# Row fields to format per feed handler: handler class name -> (field, kind) pairs,
+# kind naming a LocaleFormatter column API, e.g. 'timestamps' -> format_timestamps
+FEED_FORMATS: Dict[str, Tuple[Tuple[str, str], ...]] = {
+    'TasksDataTable': (
+        ('received', 'timestamps'),
+        ('started', 'timestamps'),
+        ('runtime', 'durations'),
+    ),
+}
+
+# Labels are added next to the raw values, which Flower's scripts still
+# compare against (e.g. 'SUCCESS' picks the badge colour); i18n.js reads them
+LABEL_SUFFIX = '_label'
+
+
+def feed_timezone(handler) -> Optional[tzinfo]:
+    """Zone of a feed's timestamps; None means UTC"""
+    tz = handler.settings.get('i18n_timezone')
+    if tz is not None:
+        return tz
+    capp = getattr(handler.application, 'capp', None)
+    name = getattr(getattr(capp, 'conf', None), 'timezone', None)
+    if not name:
+        return None
+    try:
+        from zoneinfo import ZoneInfo
+        return ZoneInfo(str(name))
+    except (ImportError, ValueError, KeyError):
+        # Python 3.8, or a zone name the tz database does not know
+        return None
+
+
+def label_rows(rows: List[Dict[str, Any]], fields: Dict[str, Callable[[Any], str]],
+               i18n: I18n, locale: str):
+    """Add a localized label for each field to every row, in place
+
+    A column only has a handful of distinct values however many rows there
+    are, so keys are built and translated once per distinct value.
+    """
+    for field, key_for in fields.items():
+        distinct = {row[field] for row in rows if field in row}
+        if not distinct:
+            continue
+        values = list(distinct)
+        keys = [key_for(value) for value in values]
+        labels = {}
+        for value, key, label in zip(values, keys, i18n.translate_many(keys, locale)):
+            # Custom states have no translation; show them as they are
+            labels[value] = str(value) if label == key else label
+
+        label_field = field + LABEL_SUFFIX
+        for row in rows:
+            if field in row:
+                row[label_field] = labels[row[field]]
+
+
+class I18nFeedHandler(I18nHandler):
+    """Mixin adding localized labels and formatted values to the rows of a JSON feed"""
+
+    feed_labels: Dict[str, Callable[[Any], str]] = {}
+    feed_formats: Tuple[Tuple[str, str], ...] = ()
+
+    def write(self, chunk):
+        if isinstance(chunk, dict) and isinstance(chunk.get('data'), list):
+            rows = chunk['data']
+            label_rows(rows, self.feed_labels, get_i18n(), self.locale_code)
+            format_columns(rows, self.feed_formats, self.formatter, LABEL_SUFFIX,
+                           feed_timezone(self))
+        super().write(chunk)
+
+
+def _feed_settings(handler_class: type) -> Optional[Dict[str, Any]]:
+    for cls in handler_class.__mro__:
+        name = cls.__name__
+        if name in FEED_LABELS or name in FEED_FORMATS:
+            return {'feed_labels': FEED_LABELS.get(name, {}),
+                    'feed_formats': FEED_FORMATS.get(name, ())}
+    return None
+
+
+def localize_feeds(app):
+    """Mix I18nFeedHandler into the handlers serving the feeds in FEED_LABELS and FEED_FORMATS"""
+    for rule in app.wildcard_router.rules:
+        handler_class = rule.target
+        if not isinstance(handler_class, type) or issubclass(handler_class, I18nFeedHandler):
+            continue
+        settings = _feed_settings(handler_class)
+        if settings is None:
+            continue
+
+        localized = type(handler_class.__name__, (I18nFeedHandler, handler_class), settings)
+        rule.target = localized
+        if hasattr(rule, 'handler_class'):
+            rule.handler_class = localized
@@ -0,0 +1,207 @@
+"""
+Locale-aware formatting of numbers, durations and timestamps
+
+One ``LocaleFormatter`` is built per locale and shared; see ``get_formatter``.
+Besides single values, each kind has a column API formatting a whole list
+(or anything with ``tolist()``, such as a numpy array) in one call, so a
+large table costs one pass per column rather than a formatter per cell::
+
+    fmt = get_formatter('zh_CN')
+    fmt.format_integers([1200, 35000])        # ['1,200', '35,000']
+    fmt.format_durations([0.042, 3.5, 3725])  # ['42毫秒', '3.50秒', '1小时2分5秒']
+
+``None`` cells format as an empty string. Timestamps are formatted in UTC,
+like Flower's own views, unless a ``tzinfo`` is given; never in the server's
+local time zone.
+"""
+
+from datetime import datetime, timezone, tzinfo
+from functools import lru_cache
+from typing import Any, Iterable, List, NamedTuple, Optional, Tuple
+
+
+class DurationUnits(NamedTuple):
+    """Unit suffixes, each including its separator from the number"""
+    hours: str
+    minutes: str
+    seconds: str
+    milliseconds: str
+    # Between the parts of a compound duration such as 1h 2m
+    separator: str
+
+
+# Number symbols by language: (decimal separator, group separator)
+NUMBER_SYMBOLS = {
+    'en': ('.', ','), 'zh': ('.', ','), 'ja': ('.', ','), 'ko': ('.', ','),
+    'de': (',', '.'), 'es': (',', '.'), 'it': (',', '.'), 'nl': (',', '.'), 'pt': (',', '.'),
+    'id': (',', '.'), 'tr': (',', '.'),
+    'fr': (',', ' '), 'ru': (',', '\xa0'), 'uk': (',', '\xa0'), 'pl': (',', '\xa0'),
+    'cs': (',', '\xa0'), 'sv': (',', '\xa0'),
+}
+
+# strftime patterns by locale, then by language
+TIMESTAMP_FORMATS = {
+    'en_US': '%m/%d/%Y, %I:%M:%S %p',
+    'en_GB': '%d/%m/%Y, %H:%M:%S',
+    'zh': '%Y/%m/%d %H:%M:%S',
+    'ja': '%Y/%m/%d %H:%M:%S',
+    'ko': '%Y. %m. %d. %H:%M:%S',
+    'de': '%d.%m.%Y, %H:%M:%S',
+    'ru': '%d.%m.%Y, %H:%M:%S',
+    'fr': '%d/%m/%Y %H:%M:%S',
+    'es': '%d/%m/%Y, %H:%M:%S',
+    'pt': '%d/%m/%Y, %H:%M:%S',
+}
+DEFAULT_TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+DURATION_UNITS = {
+    'en': DurationUnits(' h', ' min', ' s', ' ms', ' '),
+    'zh': DurationUnits('小时', '分', '秒', '毫秒', ''),
+    'ja': DurationUnits('時間', '分', '秒', 'ミリ秒', ''),
+}
+
+
+def _locale_data(table, locale: str, default):
+    value = table.get(locale)
+    if value is None:
+        value = table.get(locale.split('_')[0], default)
+    return value
+
+
+def _as_list(values: Iterable[Any]) -> list:
+    # numpy arrays and similar convert to Python scalars in one C-level call
+    tolist = getattr(values, 'tolist', None)
+    return tolist() if tolist is not None else list(values)
+
+
+class LocaleFormatter:
+    """Number, duration and timestamp formats of one locale"""
+
+    __slots__ = ('locale', 'decimal', 'group', 'timestamp_format', 'units', '_symbols')
+
+    def __init__(self, locale: str):
+        self.locale = locale
+        self.decimal, self.group = _locale_data(NUMBER_SYMBOLS, locale, NUMBER_SYMBOLS['en'])
+        self.timestamp_format = _locale_data(TIMESTAMP_FORMATS, locale, DEFAULT_TIMESTAMP_FORMAT)
+        self.units = _locale_data(DURATION_UNITS, locale, DURATION_UNITS['en'])
+        # Python formats with ',' and '.'; one translate() call swaps in the locale's
+        self._symbols = None
+        if (self.decimal, self.group) != ('.', ','):
+            self._symbols = str.maketrans({'.': self.decimal, ',': self.group})
+
+    def _localize(self, text: str) -> str:
+        return text if self._symbols is None else text.translate(self._symbols)
+
+    def format_integer(self, value: Optional[int]) -> str:
+        """e.g. 1234567 -> '1,234,567' or '1.234.567'"""
+        if value is None:
+            return ''
+        return self._localize(f'{value:,.0f}' if isinstance(value, float) else f'{value:,}')
+
+    def format_decimal(self, value: Optional[float], digits: int = 2) -> str:
+        """e.g. 1234.5 -> '1,234.50' or '1.234,50'"""
+        if value is None:
+            return ''
+        return self._localize(f'{value:,.{digits}f}')
+
+    def format_duration(self, seconds: Optional[float]) -> str:
+        """e.g. 0.042 -> '42 ms', 3.5 -> '3.50 s', 3725 -> '1 h 2 min 5 s'"""
+        if seconds is None:
+            return ''
+        units = self.units
+        if seconds < 1:
+            return f'{seconds * 1000:.0f}{units.milliseconds}'
+        if seconds < 60:
+            return self._localize(f'{seconds:.2f}') + units.seconds
+        minutes, secs = divmod(int(seconds), 60)
+        hours, minutes = divmod(minutes, 60)
+        parts = []
+        if hours:
+            parts.append(self._localize(f'{hours:,}') + units.hours)
+        if minutes or hours:
+            parts.append(f'{minutes}{units.minutes}')
+        parts.append(f'{secs}{units.seconds}')
+        return units.separator.join(parts)
+
+    def format_timestamp(self, epoch: Optional[float], tz: Optional[tzinfo] = None) -> str:
+        """Format seconds since the epoch in ``tz``, UTC by default"""
+        if epoch is None:
+            return ''
+        return datetime.fromtimestamp(epoch, tz or timezone.utc).strftime(self.timestamp_format)
+
+    # Column APIs
+
+    def format_integers(self, values: Iterable[Optional[int]]) -> List[str]:
+        """Format a column of integers"""
+        values = _as_list(values)
+        formatted = ['' if value is None else f'{value:,.0f}' if isinstance(value, float)
+                     else f'{value:,}' for value in values]
+        return self._localize_column(formatted)
+
+    def format_decimals(self, values: Iterable[Optional[float]], digits: int = 2) -> List[str]:
+        """Format a column of decimal numbers with ``digits`` fraction digits"""
+        spec = f',.{digits}f'
+        formatted = ['' if value is None else format(value, spec) for value in _as_list(values)]
+        return self._localize_column(formatted)
+
+    def format_durations(self, values: Iterable[Optional[float]]) -> List[str]:
+        """Format a column of durations in seconds"""
+        format_duration = self.format_duration
+        return [format_duration(value) for value in _as_list(values)]
+
+    def format_timestamps(self, values: Iterable[Optional[float]],
+                          tz: Optional[tzinfo] = None) -> List[str]:
+        """Format a column of seconds since the epoch in ``tz``, UTC by default
+
+        Tasks arrive in bursts, so neighbouring rows often share their second;
+        each distinct second is formatted once.
+        """
+        fromtimestamp = datetime.fromtimestamp
+        tz = tz or timezone.utc
+        pattern = self.timestamp_format
+        memo = {}
+        formatted = []
+        for value in _as_list(values):
+            if value is None:
+                formatted.append('')
+                continue
+            second = int(value)
+            text = memo.get(second)
+            if text is None:
+                text = memo[second] = fromtimestamp(second, tz).strftime(pattern)
+            formatted.append(text)
+        return formatted
+
+    def _localize_column(self, formatted: List[str]) -> List[str]:
+        if self._symbols is None:
+            return formatted
+        symbols = self._symbols
+        return [text.translate(symbols) for text in formatted]
+
+
+@lru_cache(maxsize=None)
+def get_formatter(locale: str) -> LocaleFormatter:
+    """Shared formatter of a locale, built on first use"""
+    return LocaleFormatter(locale)
+
+
+def format_columns(rows: List[dict], columns: Iterable[Tuple[str, str]],
+                   formatter: LocaleFormatter, suffix: str, tz: Optional[tzinfo] = None) -> None:
+    """Add a formatted copy of each column to every row, in place
+
+    ``columns`` holds (field, kind) pairs, kind being one of 'integers',
+    'decimals', 'durations' or 'timestamps'. The formatted value goes to
+    ``field + suffix``. Timestamps are formatted in ``tz``, UTC by default.
+    """
+    for field, kind in columns:
+        present = [row for row in rows if field in row]
+        if not present:
+            continue
+        values = [row[field] for row in present]
+        if kind == 'timestamps':
+            formatted = formatter.format_timestamps(values, tz)
+        else:
+            formatted = getattr(formatter, 'format_' + kind)(values)
+        target = field + suffix
+        for row, text in zip(present, formatted):
+            row[target] = text
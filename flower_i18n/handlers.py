@@ -0,0 +1,151 @@
+"""
+Tornado handlers serving i18n resources
+"""
+
+import re
+from collections import OrderedDict
+from typing import Mapping, Optional, Tuple
+
+import tornado.web
+
+from .bundle import RUNTIME_NAME, StaticBundle, content_hash, precompress, serialize_catalog
+from .i18n import I18n
+
+NAMESPACE_RE = re.compile(r'^[A-Za-z0-9_]+$')
+
+# Key prefixes a catalog is sliced by; None for the whole catalog
+Namespaces = Optional[Tuple[str, ...]]
+
+
+def accepted_encoding(request, available) -> Optional[str]:
+    """Pick a precompressed encoding the client accepts, preferring brotli"""
+    accept = request.headers.get("Accept-Encoding", "")
+    for encoding in ("br", "gzip"):
+        if encoding in available and encoding in accept:
+            return encoding
+    return None
+
+
+class StaticBundleHandler(tornado.web.RequestHandler):
+    """Serve the generated i18n.js runtime and catalog files from memory
+
+    Catalog file names carry their content hash, so they are cached forever;
+    the runtime is revalidated with its ETag.
+    """
+
+    # The response does not depend on the request's locale; see localize_handlers
+    i18n_exempt = True
+
+    def initialize(self, bundle: StaticBundle):
+        self.bundle = bundle
+
+    def get(self, name: str):
+        found = self.bundle.lookup(name)
+        if found is None:
+            raise tornado.web.HTTPError(404)
+        data, encoded = found
+
+        self.set_header("Content-Type", "application/javascript; charset=UTF-8")
+        self.set_header("Vary", "Accept-Encoding")
+        if name == RUNTIME_NAME:
+            self.set_header("Cache-Control", "no-cache")
+        else:
+            self.set_header("Cache-Control", "public, max-age=31536000, immutable")
+
+        encoding = accepted_encoding(self.request, encoded)
+        if encoding is not None:
+            self.set_header("Content-Encoding", encoding)
+            data = encoded[encoding]
+        self.write(data)
+
+
+class CatalogEntry:
+    """Serialized catalog slice with its ETag and precompressed bodies"""
+
+    __slots__ = ('catalog', 'body', 'etag', 'encoded')
+
+    def __init__(self, catalog: Mapping[str, str], body: bytes):
+        self.catalog = catalog
+        self.body = body
+        self.etag = '"%s"' % content_hash(body, 32)
+        self.encoded = precompress(body)
+
+
+class CatalogCache:
+    """Bounded cache of serialized catalogs per (locale, namespaces)
+
+    Entries are rebuilt when the locale's compiled catalog object changes, so
+    a reloaded catalog gets a new ETag.
+    """
+
+    def __init__(self, i18n: I18n, max_entries: int = 256):
+        self.i18n = i18n
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, Namespaces], CatalogEntry]" = OrderedDict()
+
+    def get(self, locale: str, namespaces: Namespaces = None) -> CatalogEntry:
+        """Get the serialized catalog of a locale, optionally sliced by key prefix
+
+        ``namespaces`` of None means the whole catalog, while an empty tuple
+        selects no keys.
+        """
+        catalog = self.i18n.get_catalog(locale)
+        key = (locale, namespaces)
+        entry = self._entries.get(key)
+        if entry is not None and entry.catalog is catalog:
+            self._entries.move_to_end(key)
+            return entry
+
+        if namespaces is not None:
+            prefixes = tuple(ns + '.' for ns in namespaces)
+            sliced = {k: v for k, v in catalog.items() if k.startswith(prefixes)}
+        else:
+            sliced = catalog
+        entry = self._entries[key] = CatalogEntry(catalog, serialize_catalog(sliced))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+
+class CatalogHandler(tornado.web.RequestHandler):
+    """Serve a locale's compiled catalog as JSON
+
+    ``?ns=tasks,common`` limits the catalog to the ``tasks.*`` and
+    ``common.*`` keys; unknown namespaces add no keys and malformed ones are
+    rejected with a 400. Clients revalidate with ``If-None-Match``.
+    """
+
+    # The response does not depend on the request's locale; see localize_handlers
+    i18n_exempt = True
+
+    def initialize(self, cache: CatalogCache):
+        self.cache = cache
+
+    def get(self, locale: str):
+        if not self.cache.i18n.has_locale(locale):
+            raise tornado.web.HTTPError(404)
+
+        namespaces = None
+        values = self.get_arguments('ns')
+        if values:
+            names = {ns.strip() for value in values for ns in value.split(',')} - {''}
+            if not all(NAMESPACE_RE.match(name) for name in names):
+                raise tornado.web.HTTPError(400, 'Invalid namespace in ns')
+            namespaces = tuple(sorted(names))
+        entry = self.cache.get(locale, namespaces)
+
+        self.set_header("Etag", entry.etag)
+        self.set_header("Cache-Control", "no-cache")
+        self.set_header("Vary", "Accept-Encoding")
+        if self.check_etag_header():
+            self.set_status(304)
+            return
+
+        self.set_header("Content-Type", "application/json; charset=UTF-8")
+        encoding = accepted_encoding(self.request, entry.encoded)
+        if encoding is not None:
+            self.set_header("Content-Encoding", encoding)
+            self.write(entry.encoded[encoding])
+        else:
+            self.write(entry.body)
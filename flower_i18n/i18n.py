@@ -3,125 +3,799 @@ Core i18n functionality for Flower
 """
 
 import json
+import logging
 import os
-from typing import Dict, Optional
+import re
+import threading
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, Iterator, List, Mapping, Optional
 from pathlib import Path
 
+from .binary import COMPILED_NAME, load_compiled, write_compiled
+from .compact import KEYS, CompactCatalog, ValueArray, build_array
+from .formatting import LocaleFormatter, get_formatter
+from .messageformat import compile_message
+from .negotiation import LocaleNegotiator
+from .routing import locale_url, localize_response, page_redirect_url
+
+logger = logging.getLogger(__name__)
+
+# Locale of the current request or task; each asyncio task and each
+# contextvars.copy_context() run sees its own value
+current_locale_var: ContextVar[Optional[str]] = ContextVar('flower_i18n_locale', default=None)
+
+
+def _id_lookup(catalog: Mapping[str, str]) -> Callable[[int], str]:
+    """Translate-by-ID function for a catalog; see ``I18n.key_id``"""
+    keys = KEYS.keys
+    if isinstance(catalog, CompactCatalog):
+        get_id = catalog.get_id
+
+        def by_id(key_id: int) -> str:
+            value = get_id(key_id)
+            return keys[key_id] if value is None else value
+    else:
+        lookup = catalog.get
+
+        def by_id(key_id: int) -> str:
+            key = keys[key_id]
+            return lookup(key, key)
+    return by_id
+
+
+class Translator:
+    """Immutable translator bound to one locale's compiled catalog
+
+    Translators are shared between requests and threads, so they cannot be
+    modified once built.
+    """
+
+    __slots__ = ('locale', 'catalog', 'sources', '_lookup', '_formatters', 'by_id')
+
+    def __init__(self, locale: str, catalog: Mapping[str, str],
+                 sources: Optional[Mapping[str, str]] = None):
+        object.__setattr__(self, 'locale', locale)
+        object.__setattr__(self, 'catalog', catalog)
+        # Keys supplied by a fallback locale -> that locale
+        object.__setattr__(self, 'sources', sources or {})
+        object.__setattr__(self, '_lookup', catalog.get)
+        # Parsed messages by key; lives as long as the catalog it came from
+        object.__setattr__(self, '_formatters', {})
+        object.__setattr__(self, 'by_id', _id_lookup(catalog))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __call__(self, key: str, **params) -> str:
+        if params:
+            return self.format(key, params)
+        return self._lookup(key, key)
+
+    def format(self, key: str, params: Mapping[str, object]) -> str:
+        """Render a message's placeholders and plurals, parsing it only once"""
+        formatter = self._formatters.get(key)
+        if formatter is None:
+            message = self._lookup(key)
+            if message is None:
+                return key
+            # Plural rules are those of the language the message is written in
+            locale = self.sources.get(key, self.locale)
+            formatter = self._formatters[key] = compile_message(message, locale)
+        return formatter(params)
+
+
+class CountingTranslator(Translator):
+    """Translator recording lookups, fallbacks and missing keys in TranslationMetrics"""
+
+    __slots__ = ('_metrics',)
+
+    def __init__(self, locale: str, catalog: Mapping[str, str], metrics,
+                 sources: Optional[Mapping[str, str]] = None):
+        super().__init__(locale, catalog, sources)
+        object.__setattr__(self, '_metrics', metrics)
+
+    def __call__(self, key: str, **params) -> str:
+        self._metrics.lookups.add(self.locale)
+        value = self._lookup(key)
+        if value is None:
+            self._metrics.record_missing(self.locale, key)
+            return key
+        if key in self.sources:
+            self._metrics.fallbacks.add(self.locale)
+        if params:
+            return self.format(key, params)
+        return value
+
 
 class I18n:
-    """Internationalization handler for Flower"""
+    """Internationalization handler for Flower
+
+    Catalogs are loaded lazily the first time a locale is requested. When
+    ``max_resident`` is set, at most that many compiled catalogs are kept in
+    memory besides the default locale and the least recently used one is
+    evicted.
+
+    With ``catalog_format="auto"``, an up-to-date compiled ``messages.bin``
+    (see ``compile_catalogs``) is memory-mapped instead of parsing JSON;
+    ``"json"`` always reads the JSON sources. ``"compact"`` keeps each
+    locale's own strings in an array indexed by interned key IDs instead of
+    merged dicts, for deployments with many locales.
+    """
 
-    def __init__(self, default_locale: str = "en_US"):
+    def __init__(self, default_locale: str = "en_US",
+                 fallbacks: Optional[Dict[str, List[str]]] = None,
+                 max_resident: Optional[int] = None,
+                 locales_dir: Optional[Path] = None,
+                 catalog_format: str = "auto"):
+        if catalog_format not in ("auto", "json", "compact"):
+            raise ValueError(f"Unknown catalog format '{catalog_format}'")
         self.default_locale = default_locale
-        self.current_locale = default_locale
+        self.fallbacks = fallbacks or {}
+        self.max_resident = max_resident
+        self.catalog_format = catalog_format
+        self.locales_dir = Path(locales_dir) if locales_dir else Path(__file__).parent / "locales"
         self.translations: Dict[str, Dict[str, str]] = {}
-        self._load_translations()
+        self._catalogs: "OrderedDict[str, Mapping[str, str]]" = OrderedDict()
+        # Keys of each resident catalog supplied by a fallback locale -> that locale
+        self._sources: Dict[str, Mapping[str, str]] = {}
+        # Own value arrays of the locales used by compact catalogs
+        self._arrays: Dict[str, ValueArray] = {}
+        # One shared translator per resident catalog
+        self._translators: Dict[str, Translator] = {}
+        self._load_lock = threading.Lock()
+        self._reload_listeners: List[Callable[[List[str]], None]] = []
+        self.metrics = None
+        self._available = self._discover_locales()
+        self.negotiator = LocaleNegotiator(self._available | set(self.fallbacks), default_locale)
+
+    def _discover_locales(self) -> set:
+        """Find installed locales without reading their catalogs"""
+        if not self.locales_dir.is_dir():
+            return set()
+        return {entry.name for entry in os.scandir(self.locales_dir) if entry.is_dir()}
+
+    def _read_messages_file(self, locale: str) -> Dict[str, str]:
+        """Read the raw messages of a locale from its messages.json"""
+        translation_file = self.locales_dir / locale / "messages.json"
+        if not translation_file.exists():
+            return {}
+        with open(translation_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _read_messages(self, locale: str) -> Dict[str, str]:
+        """Read the raw messages of a locale, preferring the resident copy"""
+        messages = self.translations.get(locale)
+        if messages is not None:
+            return messages
+        if locale not in self._available:
+            return {}
+        return self._read_messages_file(locale)
+
+    def get_messages(self, locale: str) -> Dict[str, str]:
+        """Get a locale's own messages, without fallbacks"""
+        return self._read_messages(locale)
+
+    def get_fallback_chain(self, locale: str) -> List[str]:
+        """Get the ordered list of locales consulted for a locale
+
+        Configured fallbacks win; otherwise the chain is derived by dropping
+        subtags (``zh_Hant_TW`` -> ``zh_Hant`` -> ``zh``). The default locale
+        always comes last.
+        """
+        if locale in self.fallbacks:
+            parents = list(self.fallbacks[locale])
+        else:
+            parts = locale.split("_")
+            parents = ["_".join(parts[:i]) for i in range(len(parts) - 1, 0, -1)]
+
+        chain = []
+        for name in [locale] + parents + [self.default_locale]:
+            if name not in chain:
+                chain.append(name)
+        return chain
+
+    def _compile_catalog(self, locale: str,
+                         overrides: Optional[Dict[str, Dict[str, str]]] = None,
+                         sources: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        """Merge a locale's fallback chain into one flat catalog
+
+        When given, ``sources`` is filled with the keys supplied by a locale
+        other than ``locale`` itself, mapped to that locale.
+        """
+        overrides = overrides or {}
+        catalog: Dict[str, str] = {}
+        for name in reversed(self.get_fallback_chain(locale)):
+            messages = overrides[name] if name in overrides else self._read_messages(name)
+            # Empty strings mean "not translated yet" and keep the fallback
+            translated = [key for key, value in messages.items() if value]
+            catalog.update((key, messages[key]) for key in translated)
+            if sources is not None:
+                if name == locale:
+                    for key in translated:
+                        sources.pop(key, None)
+                else:
+                    sources.update(dict.fromkeys(translated, name))
+        return catalog
+
+    def _compile_compact(self, locale: str) -> CompactCatalog:
+        """Chain the value arrays of a locale's fallback chain"""
+        arrays = []
+        for name in self.get_fallback_chain(locale):
+            if name not in self._arrays:
+                self._arrays[name] = build_array(self._read_messages(name))
+            arrays.append(self._arrays[name])
+        return CompactCatalog(arrays)
+
+    def _load_catalog(self, locale: str) -> Mapping[str, str]:
+        """Load, compile and register a locale's catalog"""
+        with self._load_lock:
+            catalog = self._catalogs.get(locale)
+            if catalog is not None:
+                return catalog
+
+            chain = self.get_fallback_chain(locale)
+            sources: Dict[str, str] = {}
+            if self.catalog_format == "auto":
+                catalog = load_compiled(self.locales_dir / locale, chain)
+                if catalog is not None:
+                    sources = catalog.sources()
+            if catalog is None and self.catalog_format == "compact":
+                catalog = self._compile_compact(locale)
+                sources = catalog.sources(chain)
+            elif catalog is None:
+                self.translations[locale] = self._read_messages(locale)
+                catalog = self._compile_catalog(locale, sources=sources)
+            # Sources first: unlocked readers that find the catalog find its sources
+            self._sources[locale] = sources
+            self._catalogs[locale] = catalog
+
+            if self.max_resident is not None:
+                resident = [name for name in self._catalogs if name != self.default_locale]
+                for name in resident[:max(len(resident) - self.max_resident, 0)]:
+                    del self._catalogs[name]
+                    self._sources.pop(name, None)
+                    self.translations.pop(name, None)
+                    self._translators.pop(name, None)
+                if self._arrays:
+                    used = {name for resident in self._catalogs
+                            for name in self.get_fallback_chain(resident)}
+                    for name in set(self._arrays) - used:
+                        del self._arrays[name]
+            return catalog
+
+    def reload(self, locales: Iterable[str]) -> List[str]:
+        """Re-read locales from disk and swap in every resident catalog using them
+
+        New catalogs are built completely before each is published with a
+        single reference assignment, so concurrent ``get()`` calls never lock
+        and see either the old or the new catalog. Returns the locales whose
+        compiled catalogs were replaced.
+        """
+        locales = set(locales)
+        with self._load_lock:
+            available = self._discover_locales()
+            if available != self._available:
+                self._available = available
+                self.negotiator = LocaleNegotiator(available | set(self.fallbacks),
+                                                   self.default_locale)
+
+            fresh = {locale: self._read_messages_file(locale) for locale in locales}
+            for locale, messages in fresh.items():
+                if locale in self.translations:
+                    self.translations[locale] = messages
+                if locale in self._arrays:
+                    # Catalogs in use keep the old array until swapped below
+                    self._arrays[locale] = build_array(messages)
+
+            affected = [
+                name for name in self._catalogs
+                if locales.intersection(self.get_fallback_chain(name))
+            ]
+            for name in affected:
+                if self.catalog_format == "compact":
+                    catalog = self._compile_compact(name)
+                    sources = catalog.sources(self.get_fallback_chain(name))
+                else:
+                    sources = {}
+                    catalog = self._compile_catalog(name, fresh, sources)
+                self._sources[name] = sources
+                self._catalogs[name] = catalog
+
+        for listener in list(self._reload_listeners):
+            listener(affected)
+        return affected
+
+    def compile_catalogs(self, locales: Optional[Iterable[str]] = None) -> List[Path]:
+        """Compile locales from their JSON sources into memory-mappable catalogs"""
+        written = []
+        for locale in sorted(locales or self._available):
+            path = self.locales_dir / locale / COMPILED_NAME
+            chain = self.get_fallback_chain(locale)
+            sources: Dict[str, str] = {}
+            catalog = self._compile_catalog(locale, {
+                name: self._read_messages_file(name) for name in chain if name in self._available
+            }, sources)
+            write_compiled(path, catalog, chain, sources)
+            written.append(path)
+        return written
+
+    def add_reload_listener(self, listener: Callable[[List[str]], None]):
+        """Call ``listener(locales)`` after catalogs have been reloaded"""
+        self._reload_listeners.append(listener)
+
+    def has_locale(self, locale: str) -> bool:
+        """Check whether a locale is installed or has a configured fallback chain"""
+        return locale in self._available or locale in self.fallbacks
+
+    def preload(self, locales: Iterable[str]):
+        """Load catalogs ahead of the first request that needs them"""
+        for locale in locales:
+            if self.has_locale(locale):
+                self.get_catalog(locale)
+
+    def get_catalog(self, locale: Optional[str] = None) -> Mapping[str, str]:
+        """Get the compiled catalog for a locale, falling back to the default one"""
+        locale = locale or self.current_locale
+        catalog = self._catalogs.get(locale)
+        if catalog is not None:
+            # Eviction iterates the catalogs under the lock, so promote under it
+            # too; when a load holds it, skipping one promotion beats waiting
+            if self.max_resident is not None and self._load_lock.acquire(blocking=False):
+                try:
+                    if locale in self._catalogs:
+                        self._catalogs.move_to_end(locale)
+                finally:
+                    self._load_lock.release()
+            return catalog
+
+        if not self.has_locale(locale):
+            locale = self.default_locale
+            catalog = self._catalogs.get(locale)
+            if catalog is not None:
+                return catalog
+        return self._load_catalog(locale)
+
+    @property
+    def current_locale(self) -> str:
+        """Locale used when none is given, set per context by ``set_locale``"""
+        return current_locale_var.get() or self.default_locale
+
+    def get_translator(self, locale: Optional[str] = None) -> Translator:
+        """Get the shared translator bound to a locale's catalog"""
+        locale = locale or self.current_locale
+        if not self.has_locale(locale):
+            locale = self.default_locale
+        catalog = self.get_catalog(locale)
+        translator = self._translators.get(locale)
+        if translator is None or translator.catalog is not catalog:
+            # Building one twice in a race is harmless; both are equivalent
+            sources = self._sources.get(locale)
+            if self.metrics is not None:
+                translator = CountingTranslator(locale, catalog, self.metrics, sources)
+            else:
+                translator = Translator(locale, catalog, sources)
+            self._translators[locale] = translator
+        return translator
+
+    def get_formatter(self, locale: Optional[str] = None) -> LocaleFormatter:
+        """Get the shared number, duration and timestamp formatter of a locale"""
+        locale = locale or self.current_locale
+        if not self.has_locale(locale):
+            locale = self.default_locale
+        return get_formatter(locale)
 
-    def _load_translations(self):
-        """Load all translation files"""
-        locales_dir = Path(__file__).parent / "locales"
+    def enable_metrics(self, metrics=None):
+        """Start counting lookups, fallbacks and missing keys
 
-        for locale_dir in locales_dir.iterdir():
-            if locale_dir.is_dir():
-                locale_name = locale_dir.name
-                translation_file = locale_dir / "messages.json"
+        The counting lookup replaces ``get`` on this instance, so nothing is
+        counted, and nothing costs extra, until this is called.
+        """
+        from .metrics import TranslationMetrics
 
-                if translation_file.exists():
-                    with open(translation_file, 'r', encoding='utf-8') as f:
-                        self.translations[locale_name] = json.load(f)
+        self.metrics = metrics or TranslationMetrics()
+        self.get = self._get_counted
+        self._translators = {}
+        return self.metrics
+
+    def disable_metrics(self):
+        """Stop counting and restore the plain lookup"""
+        self.metrics = None
+        self.__dict__.pop('get', None)
+        self._translators = {}
+
+    def _get_counted(self, key: str, locale: Optional[str] = None, **params) -> str:
+        """``get`` recording what each lookup resolved to"""
+        metrics = self.metrics
+        locale = locale or self.current_locale
+        metrics.lookups.add(locale)
+        if not self.has_locale(locale):
+            metrics.fallbacks.add(locale)
+            locale = self.default_locale
+        value = self.get_catalog(locale).get(key)
+        if value is None:
+            metrics.record_missing(locale, key)
+            return key
+        if key in self._sources.get(locale, ()):
+            # Served by a fallback locale of an installed one
+            metrics.fallbacks.add(locale)
+        if params:
+            return self.get_translator(locale).format(key, params)
+        return value
 
     def set_locale(self, locale: str):
-        """Set current locale"""
-        if locale in self.translations:
-            self.current_locale = locale
+        """Set the current locale for this context (request, task or thread)"""
+        if self.has_locale(locale):
+            current_locale_var.set(locale)
         else:
-            print(f"Warning: Locale '{locale}' not found, using default '{self.default_locale}'")
+            logger.warning("Locale '%s' not found, using default '%s'", locale, self.default_locale)
+
+    @contextmanager
+    def use_locale(self, locale: str) -> Iterator[Translator]:
+        """Make a locale current for the duration of a ``with`` block"""
+        translator = self.get_translator(locale)
+        token = current_locale_var.set(translator.locale)
+        try:
+            yield translator
+        finally:
+            current_locale_var.reset(token)
+
+    def get(self, key: str, locale: Optional[str] = None, **params) -> str:
+        """Get translation for a key, filling in placeholders from ``params``
 
-    def get(self, key: str, locale: Optional[str] = None) -> str:
-        """Get translation for a key"""
-        target_locale = locale or self.current_locale
+        e.g. ``get('tasks.failed_count', count=3)`` for a message like
+        ``{count, plural, one {# task failed} other {# tasks failed}}``.
+        """
+        if params:
+            return self.get_translator(locale).format(key, params)
+        # Fallbacks are merged at load time, so this is a single lookup
+        # however deep the locale's fallback chain is
+        return self.get_catalog(locale).get(key, key)
 
-        # Try to get translation for target locale
-        if target_locale in self.translations:
-            translation = self.translations[target_locale].get(key)
-            if translation:
-                return translation
+    def translate_many(self, keys: Iterable[str], locale: Optional[str] = None) -> List[str]:
+        """Translate a column of keys with one catalog lookup per distinct key"""
+        if self.metrics is not None:
+            return self._translate_many_counted(keys, locale)
+        lookup = self.get_catalog(locale).get
+        memo: Dict[str, str] = {}
+        translated = []
+        for key in keys:
+            value = memo.get(key)
+            if value is None:
+                value = memo[key] = lookup(key, key)
+            translated.append(value)
+        return translated
 
-        # Fallback to default locale
-        if self.default_locale in self.translations:
-            translation = self.translations[self.default_locale].get(key)
-            if translation:
-                return translation
+    def _translate_many_counted(self, keys: Iterable[str],
+                                locale: Optional[str] = None) -> List[str]:
+        """``translate_many`` counting every key as ``get`` would"""
+        metrics = self.metrics
+        locale = locale or self.current_locale
+        keys = list(keys)
+        metrics.lookups.add(locale, len(keys))
+        if not self.has_locale(locale):
+            metrics.fallbacks.add(locale, len(keys))
+            locale = self.default_locale
+        catalog = self.get_catalog(locale)
+        sources = self._sources.get(locale, ())
+        memo: Dict[str, str] = {}
+        for key, count in Counter(keys).items():
+            value = catalog.get(key)
+            if value is None:
+                metrics.record_missing(locale, key, count)
+                value = key
+            elif key in sources:
+                metrics.fallbacks.add(locale, count)
+            memo[key] = value
+        return [memo[key] for key in keys]
 
-        # Return key if no translation found
-        return key
+    def key_id(self, key: str) -> int:
+        """Stable integer ID of a key, to look up once and pass to ``get_by_id``"""
+        return KEYS.intern(key)
+
+    def get_by_id(self, key_id: int, locale: Optional[str] = None) -> str:
+        """Get translation for a key ID from ``key_id``"""
+        return self.get_translator(locale).by_id(key_id)
 
     def get_available_locales(self) -> list:
         """Get list of available locales"""
-        return list(self.translations.keys())
+        return sorted(self._available)
 
 
 # Global i18n instance
-_i18n_instance = None
+_i18n_instance: Optional[I18n] = None
+_i18n_instance_lock = threading.Lock()
 
 
 def get_i18n() -> I18n:
-    """Get global i18n instance"""
+    """Get global i18n instance, creating it exactly once"""
     global _i18n_instance
-    if _i18n_instance is None:
-        _i18n_instance = I18n()
-    return _i18n_instance
+    instance = _i18n_instance
+    if instance is None:
+        with _i18n_instance_lock:
+            if _i18n_instance is None:
+                _i18n_instance = I18n()
+            instance = _i18n_instance
+    return instance
 
 
 class I18nHandler:
-    """Mixin for Tornado handlers to support i18n"""
+    """Mixin for Tornado handlers to support i18n
+
+    The locale is resolved once per request in ``prepare()`` and a translator
+    bound to its catalog is exposed as ``self._`` and as ``_`` in templates.
+    """
+
+    def prepare(self):
+        """Resolve the user's locale and bind a translator for this request"""
+        self.bind_translator()
+        if self.settings.get('i18n_locale_urls'):
+            localize_response(self)
+        return super().prepare()
+
+    def bind_translator(self, locale: Optional[str] = None) -> Translator:
+        """Bind the request's translator, resolving the locale if not given"""
+        translator = get_i18n().get_translator(locale or self.get_user_locale())
+        self._i18n_translator = translator
+        # Lets the response transform (see transform.py) use the same locale
+        self.request.i18n_translator = translator
+        # Lets code without access to the handler translate for this request
+        current_locale_var.set(translator.locale)
+        # Shadow the ``_`` method so each translation is a plain catalog lookup
+        self._ = translator
+
+        # Tornado's own ``locale`` property expects get_user_locale() to return
+        # a Locale object, so give it one for the same code
+        import tornado.locale
+        self.locale = tornado.locale.get(translator.locale)
+        return translator
+
+    @property
+    def translator(self) -> Translator:
+        """Translator bound to the current request's locale"""
+        translator = getattr(self, '_i18n_translator', None)
+        if translator is None:
+            translator = self.bind_translator()
+        return translator
+
+    @property
+    def formatter(self) -> LocaleFormatter:
+        """Number, duration and timestamp formatter of the request's locale"""
+        return get_formatter(self.locale_code)
+
+    @property
+    def locale_code(self) -> str:
+        """Locale code resolved for the current request"""
+        return self.translator.locale
 
     def get_user_locale(self):
         """Get user's preferred locale from cookie or browser"""
+        i18n = get_i18n()
+
+        # A locale in the URL (see routing.py) wins over the cookie
+        locale = getattr(self.request, 'i18n_locale', None)
+        if locale is not None:
+            if i18n.metrics is not None:
+                i18n.metrics.negotiations.add((locale, 'url'))
+            return locale
+
         # Check cookie first
         locale = self.get_cookie("flower_locale")
-        if locale:
+        if locale and i18n.has_locale(locale):
+            if i18n.metrics is not None:
+                i18n.metrics.negotiations.add((locale, 'cookie'))
             return locale
 
-        # Check Accept-Language header
+        # Negotiate from the Accept-Language header (memoized per header value)
         accept_language = self.request.headers.get("Accept-Language", "")
-        if accept_language:
-            # Parse Accept-Language header (simple implementation)
-            languages = accept_language.split(",")
-            if languages:
-                primary_lang = languages[0].split(";")[0].strip()
-                # Convert en-US to en_US
-                primary_lang = primary_lang.replace("-", "_")
-
-                # Check if we support this locale
-                i18n = get_i18n()
-                if primary_lang in i18n.get_available_locales():
-                    return primary_lang
-
-                # Try just the language code
-                lang_code = primary_lang.split("_")[0]
-                for locale in i18n.get_available_locales():
-                    if locale.startswith(lang_code):
-                        return locale
-
-        return "en_US"
+        locale = i18n.negotiator.negotiate(accept_language)
+        if i18n.metrics is not None:
+            i18n.metrics.negotiations.add((locale, 'header' if accept_language else 'default'))
+        return locale
 
     def set_user_locale(self, locale: str):
         """Set user's locale preference"""
         self.set_cookie("flower_locale", locale, expires_days=365)
+        self.bind_translator(locale)
 
-    def _(self, key: str) -> str:
+    def _(self, key: str, **params) -> str:
         """Translate a key to current locale"""
-        i18n = get_i18n()
-        locale = self.get_user_locale()
-        return i18n.get(key, locale)
+        return self.translator(key, **params)
+
+    def reverse_url(self, name: str, *args) -> str:
+        """Reverse a URL, keeping the request's locale in it when locales are routed by URL"""
+        url = super().reverse_url(name, *args)
+        mode = self.settings.get('i18n_locale_urls')
+        if mode:
+            url = locale_url(url, self.locale_code, mode, self.settings.get('i18n_url_prefix', ''))
+        return url
+
+    def static_url(self, path: str, include_host: Optional[bool] = None, **kwargs) -> str:
+        """Static URL, versioned by content hash for files of the in-memory bundle
+
+        With ``render_templates``, js/i18n.js is generated rather than read from
+        Flower's static directory, where Tornado would look for it to hash it.
+        """
+        bundle = self.settings.get('i18n_static_bundle')
+        version = bundle.version(path[3:]) if bundle is not None and path.startswith('js/') \
+            else None
+        if version is None:
+            return super().static_url(path, include_host, **kwargs)
+
+        if include_host is None:
+            include_host = getattr(self, 'include_host', False)
+        base = f'{self.request.protocol}://{self.request.host}' if include_host else ''
+        return f"{base}{self.settings.get('static_url_prefix', '/static/')}{path}?v={version}"
+
+    def render(self, template_name: str, **kwargs):
+        """Render a page; remembers which render_string() call is the page itself
+
+        With locale URLs, a browser loading the page without a locale in its
+        URL is redirected to its locale's URL instead.
+        """
+        url = page_redirect_url(self) if self.settings.get('i18n_locale_urls') else None
+        if url is not None:
+            self.clear_header('Content-Language')
+            self.set_status(302)
+            self.set_header('Location', url)
+            # Like super().render(), return the future of finish()
+            return self.finish()
+        self._i18n_page_template = template_name
+        return super().render(template_name, **kwargs)
+
+    def render_string(self, template_name: str, **kwargs) -> bytes:
+        """Render a template pre-translated for the request's locale when enabled
+
+        Only templates of the application's own template directory are
+        translated in memory; handlers with their own directory or loader,
+        e.g. from plugins, render through Tornado as usual.
+        """
+        loader = self.settings.get('i18n_template_loader')
+        if loader is None or 'template_loader' in self.settings \
+                or os.path.abspath(self.get_template_path() or '') != loader.root:
+            return super().render_string(template_name, **kwargs)
+
+        template = loader.load(template_name, self.locale_code)
+        if getattr(self, '_i18n_page_template', None) == template_name:
+            # The page is translated as a whole; UI module fragments rendered
+            # inside it are not pages of their own
+            self._i18n_page_template = None
+            # Nothing left for the response transform to translate
+            self.request.i18n_translated = True
+        namespace = self.get_template_namespace()
+        namespace.update(kwargs)
+        return template.generate(**namespace)
 
+    def get_template_namespace(self):
+        """Expose the request's translator to templates"""
+        translator = self.translator
+        namespace = super().get_template_namespace()
+        namespace.update(_=translator, locale_code=translator.locale,
+                         formatter=get_formatter(translator.locale))
+        return namespace
+
+
+def get_url_prefix(app) -> str:
+    """Get Flower's --url_prefix as a path prefix ('' or '/prefix')"""
+    url_prefix = (getattr(getattr(app, 'options', None), 'url_prefix', '') or '').strip('/')
+    return '/' + url_prefix if url_prefix else ''
+
+
+def localize_handlers(app):
+    """Mix I18nHandler into every request handler registered on an application"""
+    import tornado.web
+
+    for rule in app.wildcard_router.rules:
+        handler_class = rule.target
+        if (not isinstance(handler_class, type)
+                or not issubclass(handler_class, tornado.web.RequestHandler)
+                or issubclass(handler_class, (I18nHandler, tornado.web.StaticFileHandler))
+                or getattr(handler_class, 'i18n_exempt', False)):
+            continue
+
+        localized = type(handler_class.__name__, (I18nHandler, handler_class), {})
+        rule.target = localized
+        if hasattr(rule, 'handler_class'):
+            rule.handler_class = localized
+
+
+def setup_i18n(app, render_templates: bool = False, watch: bool = False,
+               watch_interval: float = 2.0, translate_feeds: bool = False,
+               metrics: bool = False, locale_urls: Optional[str] = None,
+               translate_responses: bool = False):
+    """Setup i18n for Flower application
+
+    Registers ``/i18n/catalog/<locale>.json``, serving compiled catalogs with
+    ETags and precompressed bodies. With ``render_templates`` enabled, Flower's
+    handlers render templates that are rewritten and translated in memory, one
+    compiled copy per locale, so pages are sent already translated and nothing
+    is written to Flower's installation directory.
+
+    With ``watch`` enabled, changes to ``messages.json`` files are picked up
+    every ``watch_interval`` seconds without restarting Flower.
+
+    With ``translate_feeds`` enabled, the tasks and workers JSON feeds carry
+    localized labels next to the raw values, e.g. ``state_label``, which
+    i18n.js shows in the tables.
+
+    With ``metrics`` enabled, lookup, fallback, missing-key and negotiation
+    counters are published on Flower's Prometheus ``/metrics`` endpoint.
+
+    With ``locale_urls`` set to ``'path'`` (``/zh_CN/tasks``) or ``'query'``
+    (``/tasks?lang=zh_CN``), the locale is taken from the URL and browsers
+    are redirected to their locale's URL, so pages can be cached per URL.
+
+    With ``translate_responses`` enabled, ``data-i18n`` elements of every
+    ``text/html`` response are translated as it streams out, which covers
+    pages the patcher does not know, e.g. from plugin handlers.
+    """
+    from .handlers import CatalogCache, CatalogHandler
 
-def setup_i18n(app):
-    """Setup i18n for Flower application"""
     # Initialize global i18n instance
     i18n = get_i18n()
 
+    # Serve compiled catalogs as JSON, e.g. /i18n/catalog/zh_CN.json?ns=tasks,common
+    app.add_handlers(r'.*', [
+        (re.escape(get_url_prefix(app)) + r'/i18n/catalog/([A-Za-z0-9_]+)\.json', CatalogHandler,
+         {'cache': CatalogCache(i18n)}),
+    ])
+
+    if render_templates:
+        from .bundle import build_bundle
+        from .handlers import StaticBundleHandler
+        from .loader import I18nTemplateLoader
+
+        settings = (('autoescape', 'autoescape'), ('whitespace', 'template_whitespace'))
+        loader_kwargs = {
+            name: app.settings[setting] for name, setting in settings if setting in app.settings
+        }
+        loader = I18nTemplateLoader(app.settings['template_path'], i18n, **loader_kwargs)
+        app.settings['i18n_template_loader'] = loader
+        localize_handlers(app)
+
+        # Serve the generated i18n.js and catalogs from memory, not Flower's static dir
+        bundle = build_bundle(i18n)
+        app.settings['i18n_static_bundle'] = bundle
+        static_prefix = app.settings.get('static_url_prefix', '/static/')
+        app.add_handlers(r'.*', [
+            (re.escape(static_prefix) + r'js/(i18n\.js|i18n/[^/]+\.min\.js)',
+             StaticBundleHandler, {'bundle': bundle}),
+        ])
+
+        # Compiled templates and bundles embed translations; rebuild them on reload
+        i18n.add_reload_listener(lambda locales: loader.reset())
+        i18n.add_reload_listener(lambda locales: bundle.replace(build_bundle(i18n)))
+
+    if locale_urls:
+        from .routing import install_locale_urls
+        install_locale_urls(app, i18n, locale_urls, get_url_prefix(app))
+        localize_handlers(app)
+
+    if translate_responses:
+        from .transform import HTMLTranslator
+        # Ahead of GZipContentEncoding, which must see the translated body
+        app.transforms.insert(0, HTMLTranslator(i18n).transform)
+
+    if metrics and i18n.metrics is None:
+        from .metrics import register_collector
+        register_collector(i18n.enable_metrics())
+
+    if translate_feeds:
+        from .feeds import localize_feeds
+        localize_feeds(app)
+
+    if watch:
+        from tornado.ioloop import IOLoop
+        from .watcher import CatalogWatcher
+
+        watcher = CatalogWatcher(i18n, watch_interval)
+        io_loop = getattr(app, 'io_loop', None) or IOLoop.current()
+        io_loop.add_callback(watcher.start)
+
     # Add i18n helper to template namespace
     def translate_helper(key: str) -> str:
         """Template helper for translation"""
@@ -131,4 +805,4 @@ def setup_i18n(app):
     return {
         '_': translate_helper,
         'i18n': i18n
-    }
\ No newline at end of file
+    }
@@ -0,0 +1,90 @@
+"""
+In-memory template loader rendering Flower pages already translated
+"""
+
+import html
+import os
+import re
+import threading
+from typing import Any, Dict, Optional
+
+from tornado.template import Loader, Template
+
+from .i18n import I18n, Translator, get_i18n
+from .patcher import rewrite_template
+
+# Text content directly following an element marked with data-i18n
+I18N_TEXT_RE = re.compile(r'(data-i18n="([^"]+)"[^>]*>)([^<]*)')
+
+
+def escape_template_text(text: str) -> str:
+    """Escape translated text for literal use inside a Tornado template"""
+    text = html.escape(text, quote=False)
+    # {{, {% and {# open template directives; the "!" forms emit them verbatim
+    return text.replace("{{", "{{!").replace("{%", "{%!").replace("{#", "{#!")
+
+
+def translate_template(content: str, translator: Translator) -> str:
+    """Replace the text of every data-i18n element with its translation"""
+    def replace(match):
+        text = match.group(3)
+        stripped = text.strip()
+        if not stripped:
+            return match.group(0)
+        translation = escape_template_text(translator(match.group(2)))
+        return match.group(1) + text.replace(stripped, translation, 1)
+
+    return I18N_TEXT_RE.sub(replace, content)
+
+
+class LocaleTemplateLoader(Loader):
+    """Tornado loader that rewrites and translates templates for one locale"""
+
+    def __init__(self, root_directory: str, translator: Translator, **kwargs: Any):
+        super().__init__(root_directory, **kwargs)
+        self.translator = translator
+
+    def _create_template(self, name: str) -> Template:
+        path = os.path.join(self.root, name)
+        with open(path, "rb") as f:
+            content = f.read().decode("utf-8")
+        content = translate_template(rewrite_template(name, content), self.translator)
+        return Template(content, name=name, loader=self)
+
+
+class I18nTemplateLoader:
+    """Compile and cache one template per (template, locale) pair
+
+    The patcher's rewrite rules are applied in memory, so Flower's templates
+    never need to be written to disk, and the ``data-i18n`` elements are
+    translated before compilation, so pages are sent already translated.
+    """
+
+    def __init__(self, root_directory: str, i18n: Optional[I18n] = None, **kwargs: Any):
+        self.root = os.path.abspath(root_directory)
+        self.i18n = i18n or get_i18n()
+        self.loader_kwargs = kwargs
+        self._loaders: Dict[str, LocaleTemplateLoader] = {}
+        self._lock = threading.Lock()
+
+    def for_locale(self, locale: str) -> LocaleTemplateLoader:
+        """Get the template loader for a locale"""
+        loader = self._loaders.get(locale)
+        if loader is None:
+            translator = self.i18n.get_translator(locale)
+            with self._lock:
+                # Unknown locales share the loader of the locale they resolve to
+                loader = self._loaders.get(translator.locale)
+                if loader is None:
+                    loader = LocaleTemplateLoader(self.root, translator, **self.loader_kwargs)
+                    self._loaders[translator.locale] = loader
+        return loader
+
+    def load(self, name: str, locale: str, parent_path: Optional[str] = None) -> Template:
+        """Load a template translated for a locale"""
+        return self.for_locale(locale).load(name, parent_path)
+
+    def reset(self):
+        """Drop all compiled templates"""
+        with self._lock:
+            self._loaders.clear()
@@ -0,0 +1,305 @@
+"""
+ICU MessageFormat-style placeholders, plurals and selects for catalog values
+
+Supported syntax::
+
+    {name}                                   value of the ``name`` parameter
+    {count, plural, =0 {none} one {# task} other {# tasks}}
+    {count, plural, offset:1 =0 {…} other {…}}
+    {kind, select, worker {…} other {…}}
+    '{' ''                                   literal brace, literal quote
+
+Plural categories follow the CLDR rules of the message's language. Each
+message is parsed once into a formatter; see ``compile_message``.
+"""
+
+import logging
+import re
+from typing import Any, Callable, Dict, List, Mapping, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+
+class MessageFormatError(ValueError):
+    """A catalog message has invalid placeholder syntax"""
+
+
+# Plural rules by language, for integer and integral values (CLDR)
+
+def _plural_other(n) -> str:
+    return 'other'
+
+
+def _plural_one_other(n) -> str:
+    return 'one' if n == 1 else 'other'
+
+
+def _plural_zero_one(n) -> str:
+    return 'one' if 0 <= n < 2 else 'other'
+
+
+def _plural_east_slavic(n) -> str:
+    if n != int(n):
+        return 'other'
+    n = abs(int(n))
+    if n % 10 == 1 and n % 100 != 11:
+        return 'one'
+    if 2 <= n % 10 <= 4 and not 12 <= n % 100 <= 14:
+        return 'few'
+    return 'many'
+
+
+def _plural_polish(n) -> str:
+    if n != int(n):
+        return 'other'
+    n = abs(int(n))
+    if n == 1:
+        return 'one'
+    if 2 <= n % 10 <= 4 and not 12 <= n % 100 <= 14:
+        return 'few'
+    return 'many'
+
+
+def _plural_czech(n) -> str:
+    if n != int(n):
+        return 'many'
+    if n == 1:
+        return 'one'
+    if 2 <= n <= 4:
+        return 'few'
+    return 'other'
+
+
+PLURAL_RULES: Dict[str, Callable[[Any], str]] = {
+    'zh': _plural_other, 'ja': _plural_other, 'ko': _plural_other, 'vi': _plural_other,
+    'th': _plural_other, 'id': _plural_other, 'ms': _plural_other,
+    'fr': _plural_zero_one, 'pt': _plural_zero_one, 'hi': _plural_zero_one,
+    'ru': _plural_east_slavic, 'uk': _plural_east_slavic, 'be': _plural_east_slavic,
+    'pl': _plural_polish,
+    'cs': _plural_czech, 'sk': _plural_czech,
+}
+
+
+def get_plural_rule(locale: str) -> Callable[[Any], str]:
+    """Plural category function for a locale, e.g. zh_CN -> always 'other'"""
+    rule = PLURAL_RULES.get(locale)
+    if rule is None:
+        rule = PLURAL_RULES.get(locale.split('_')[0], _plural_one_other)
+    return rule
+
+
+# Parsed messages are lists of parts: literal strings, or tuples
+# ('arg', name), ('#',), ('plural', name, offset, options), ('select', name, options)
+Part = Union[str, Tuple]
+
+_NAME_RE = re.compile(r'\s*([A-Za-z_][A-Za-z0-9_]*)\s*')
+_SELECTOR_RE = re.compile(r'\s*(=-?\d+(?:\.\d+)?|[A-Za-z_][A-Za-z0-9_]*)\s*')
+_OFFSET_RE = re.compile(r'\s*offset:\s*(\d+)')
+
+
+class _Parser:
+    def __init__(self, message: str):
+        self.message = message
+        self.pos = 0
+
+    def error(self, reason: str) -> MessageFormatError:
+        return MessageFormatError(f"{reason} at position {self.pos} of {self.message!r}")
+
+    def parse(self, in_plural: bool = False, nested: bool = False) -> List[Part]:
+        message = self.message
+        parts: List[Part] = []
+        text: List[str] = []
+        while self.pos < len(message):
+            char = message[self.pos]
+            if char == "'":
+                self.pos += 1
+                if message.startswith("'", self.pos):
+                    text.append("'")
+                    self.pos += 1
+                elif self.pos < len(message) and message[self.pos] in '{}#':
+                    end = message.find("'", self.pos)
+                    end = len(message) if end < 0 else end
+                    text.append(message[self.pos:end])
+                    self.pos = end + 1
+                else:
+                    text.append("'")
+            elif char == '{':
+                if text:
+                    parts.append(''.join(text))
+                    text = []
+                self.pos += 1
+                parts.append(self.parse_placeholder())
+            elif char == '}':
+                if not nested:
+                    raise self.error("Unmatched '}'")
+                break
+            elif char == '#' and in_plural:
+                if text:
+                    parts.append(''.join(text))
+                    text = []
+                parts.append(('#',))
+                self.pos += 1
+            else:
+                text.append(char)
+                self.pos += 1
+        if text:
+            parts.append(''.join(text))
+        return parts
+
+    def expect(self, char: str):
+        if not self.message.startswith(char, self.pos):
+            raise self.error(f"Expected '{char}'")
+        self.pos += 1
+
+    def match(self, regex):
+        found = regex.match(self.message, self.pos)
+        if found is None:
+            raise self.error("Unexpected text")
+        self.pos = found.end()
+        return found.group(1)
+
+    def parse_placeholder(self) -> Part:
+        name = self.match(_NAME_RE)
+        if self.message.startswith('}', self.pos):
+            self.pos += 1
+            return ('arg', name)
+
+        self.expect(',')
+        kind = self.match(_NAME_RE)
+        if kind not in ('plural', 'select'):
+            # Format types such as {n, number} render the plain value
+            end = self.message.find('}', self.pos)
+            if end < 0:
+                raise self.error("Unterminated placeholder")
+            self.pos = end + 1
+            return ('arg', name)
+
+        self.expect(',')
+        offset = 0
+        if kind == 'plural':
+            found = _OFFSET_RE.match(self.message, self.pos)
+            if found:
+                offset = int(found.group(1))
+                self.pos = found.end()
+
+        options: Dict[str, List[Part]] = {}
+        while True:
+            found = _SELECTOR_RE.match(self.message, self.pos)
+            if found is None:
+                break
+            self.pos = found.end()
+            self.expect('{')
+            options[found.group(1)] = self.parse(in_plural=kind == 'plural', nested=True)
+            self.expect('}')
+        while self.pos < len(self.message) and self.message[self.pos].isspace():
+            self.pos += 1
+        self.expect('}')
+        if 'other' not in options:
+            raise self.error(f"{kind} for '{name}' needs an 'other' option")
+        if kind == 'plural':
+            return ('plural', name, offset, options)
+        return ('select', name, options)
+
+
+def parse_message(message: str) -> List[Part]:
+    """Parse a message into literal strings and placeholder tuples"""
+    return _Parser(message).parse()
+
+
+def _format_number(value) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _plural_value(name: str, value) -> Any:
+    """Number of a plural argument; numeric strings such as query arguments are converted"""
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise MessageFormatError(f"Plural argument {name!r} is not a number: {value!r}") from None
+
+
+def _render(parts: List[Part], params: Mapping[str, Any], plural_rule, number, out: List[str]):
+    for part in parts:
+        if part.__class__ is str:
+            out.append(part)
+            continue
+        kind = part[0]
+        if kind == 'arg':
+            name = part[1]
+            out.append(str(params[name]) if name in params else '{%s}' % name)
+        elif kind == '#':
+            out.append(_format_number(number))
+        elif kind == 'plural':
+            _, name, offset, options = part
+            value = params.get(name)
+            if value is None:
+                out.append('{%s}' % name)
+                continue
+            value = _plural_value(name, value)
+            branch = options.get(f'={_format_number(value)}')
+            if branch is None:
+                branch = options.get(plural_rule(value - offset)) or options['other']
+            _render(branch, params, plural_rule, value - offset, out)
+        else:
+            _, name, options = part
+            branch = options.get(str(params.get(name)), options['other'])
+            _render(branch, params, plural_rule, number, out)
+
+
+class MessageFormatter:
+    """A catalog message parsed once and rendered with parameters"""
+
+    __slots__ = ('message', 'format')
+
+    def __init__(self, message: str, locale: str):
+        self.message = message
+        parts = parse_message(message)
+
+        if all(part.__class__ is str for part in parts):
+            constant = ''.join(parts)
+            self.format = lambda params: constant
+        elif all(part.__class__ is str or part[0] == 'arg' for part in parts):
+            # Plain interpolation: one str.format_map call
+            template = ''.join(
+                part.replace('{', '{{').replace('}', '}}') if part.__class__ is str
+                else '{%s}' % part[1]
+                for part in parts)
+
+            def format_simple(params):
+                try:
+                    return template.format_map(params)
+                except KeyError:
+                    out: List[str] = []
+                    _render(parts, params, None, None, out)
+                    return ''.join(out)
+
+            self.format = format_simple
+        else:
+            plural_rule = get_plural_rule(locale)
+
+            def format_complex(params):
+                out: List[str] = []
+                _render(parts, params, plural_rule, None, out)
+                return ''.join(out)
+
+            self.format = format_complex
+
+    def __call__(self, params: Mapping[str, Any]) -> str:
+        return self.format(params)
+
+
+def compile_message(message: str, locale: str) -> Callable[[Mapping[str, Any]], str]:
+    """Build the formatter of a message, falling back to the raw text if it is invalid"""
+    try:
+        return MessageFormatter(message, locale).format
+    except MessageFormatError as e:
+        logger.warning("Invalid message in %s: %s", locale, e)
+        return lambda params: message
@@ -0,0 +1,157 @@
+"""
+Translation metrics: lookups, fallbacks, missing keys and negotiated locales
+
+Nothing here runs unless ``I18n.enable_metrics()`` was called; enabling it
+swaps in counting versions of the lookup methods, so the default code paths
+carry no instrumentation at all.
+"""
+
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Dict, Hashable, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Label used for everything beyond a counter's cardinality limit
+OTHER = "__other__"
+
+
+class BoundedCounter(Counter):
+    """Counter holding at most ``max_labels`` labels; later ones are lumped together
+
+    Keeps metrics cardinality bounded when labels come from user input or
+    from an unbounded set such as missing keys.
+    """
+
+    def __init__(self, max_labels: int, other: Hashable = OTHER):
+        super().__init__()
+        self.max_labels = max_labels
+        self.other = other
+
+    def add(self, label: Hashable, amount: int = 1):
+        if label not in self and len(self) >= self.max_labels:
+            label = self.other
+        self[label] += amount
+
+
+class WarningLimiter:
+    """Allow at most ``rate`` warnings per ``per`` seconds, counting the rest"""
+
+    def __init__(self, rate: int = 10, per: float = 60.0):
+        self.rate = rate
+        self.per = per
+        self._window_start = 0.0
+        self._emitted = 0
+        self.suppressed = 0
+        self._lock = threading.Lock()
+
+    def allow(self) -> Tuple[bool, int]:
+        """Whether a warning may be emitted now, and how many were suppressed before it"""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= self.per:
+                self._window_start = now
+                self._emitted = 0
+            if self._emitted >= self.rate:
+                self.suppressed += 1
+                return False, 0
+            self._emitted += 1
+            suppressed, self.suppressed = self.suppressed, 0
+            return True, suppressed
+
+
+class TranslationMetrics:
+    """In-process counters for translation lookups and locale negotiation"""
+
+    def __init__(self, max_missing_keys: int = 500, max_locales: int = 100,
+                 warn_rate: int = 10, warn_per: float = 60.0):
+        # Requested locale -> lookups
+        self.lookups = BoundedCounter(max_locales)
+        # Requested locale -> lookups served by another locale: the default one
+        # for unknown locales, or a fallback locale for keys it does not translate
+        self.fallbacks = BoundedCounter(max_locales)
+        # (locale, key) -> lookups that returned the raw key
+        self.missing = BoundedCounter(max_missing_keys, (OTHER, OTHER))
+        # (locale, source) -> requests, source being url, cookie, header or default
+        self.negotiations = BoundedCounter(max_locales * 3, (OTHER, OTHER))
+        self.warnings = WarningLimiter(warn_rate, warn_per)
+
+    def record_missing(self, locale: str, key: str, amount: int = 1):
+        """Count a missing key, warning about it the first time it is seen"""
+        label = (locale, key)
+        first = label not in self.missing
+        self.missing.add(label, amount)
+        if not first:
+            return
+        allowed, suppressed = self.warnings.allow()
+        if allowed:
+            if suppressed:
+                logger.warning("Missing translation for '%s' in %s "
+                               "(%d similar warnings suppressed)", key, locale, suppressed)
+            else:
+                logger.warning("Missing translation for '%s' in %s", key, locale)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Copy of all counters"""
+        return {
+            'lookups': dict(self.lookups),
+            'fallbacks': dict(self.fallbacks),
+            'missing': dict(self.missing),
+            'negotiations': dict(self.negotiations),
+        }
+
+
+class TranslationCollector:
+    """prometheus_client collector publishing TranslationMetrics"""
+
+    def __init__(self, metrics: TranslationMetrics):
+        self.metrics = metrics
+
+    def collect(self) -> Iterator:
+        from prometheus_client.core import CounterMetricFamily
+
+        counters = self.metrics.snapshot()
+
+        lookups = CounterMetricFamily(
+            'flower_i18n_lookups', 'Translation lookups by requested locale', labels=['locale'])
+        for locale, count in counters['lookups'].items():
+            lookups.add_metric([locale], count)
+        yield lookups
+
+        fallbacks = CounterMetricFamily(
+            'flower_i18n_locale_fallbacks',
+            'Lookups served by a fallback locale', labels=['locale'])
+        for locale, count in counters['fallbacks'].items():
+            fallbacks.add_metric([locale], count)
+        yield fallbacks
+
+        missing = CounterMetricFamily(
+            'flower_i18n_missing_keys', 'Lookups that fell back to the raw key',
+            labels=['locale', 'key'])
+        for (locale, key), count in counters['missing'].items():
+            missing.add_metric([locale, key], count)
+        yield missing
+
+        negotiations = CounterMetricFamily(
+            'flower_i18n_negotiations', 'Locales resolved for requests, by source',
+            labels=['locale', 'source'])
+        for (locale, source), count in counters['negotiations'].items():
+            negotiations.add_metric([locale, source], count)
+        yield negotiations
+
+
+def register_collector(metrics: TranslationMetrics,
+                       registry=None) -> Optional[TranslationCollector]:
+    """Publish metrics through prometheus_client, which serves Flower's /metrics"""
+    try:
+        from prometheus_client import REGISTRY
+    except ImportError:
+        logger.warning("prometheus_client is not installed; translation metrics are not exported")
+        return None
+
+    registry = registry or REGISTRY
+    collector = TranslationCollector(metrics)
+    registry.register(collector)
+    return collector
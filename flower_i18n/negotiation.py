@@ -0,0 +1,80 @@
+"""
+Accept-Language negotiation for Flower i18n
+"""
+
+from functools import lru_cache
+from typing import Dict, Iterable, List, Tuple
+
+
+def normalize_tag(tag: str) -> str:
+    """Normalize a language tag or locale name for comparison (``zh-CN`` -> ``zh_cn``)"""
+    return tag.strip().replace("-", "_").lower()
+
+
+def parse_accept_language(header: str) -> List[Tuple[str, float]]:
+    """Parse an Accept-Language header into ranges ordered by preference
+
+    Ranges with ``q=0`` are dropped; ties keep the order of the header.
+    """
+    ranges = []
+    for position, item in enumerate(header.split(",")):
+        parts = item.split(";")
+        tag = normalize_tag(parts[0])
+        if not tag:
+            continue
+
+        quality = 1.0
+        for param in parts[1:]:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            ranges.append((tag, quality, position))
+
+    ranges.sort(key=lambda r: (-r[1], r[2]))
+    return [(tag, quality) for tag, quality, _ in ranges]
+
+
+class LocaleNegotiator:
+    """Match Accept-Language headers against the available locales
+
+    Follows the RFC 4647 lookup scheme: each range is tried in order of
+    preference and progressively truncated (``zh_hant_tw`` -> ``zh_hant`` ->
+    ``zh``) until it hits a locale or one of its prefixes. Results are memoized
+    per raw header, since browsers only ever send a handful of distinct ones.
+    """
+
+    def __init__(self, locales: Iterable[str], default_locale: str, cache_size: int = 256):
+        self.default_locale = default_locale
+        self._index = self._build_index(locales)
+        self.negotiate = lru_cache(maxsize=cache_size)(self._negotiate)
+
+    def _build_index(self, locales: Iterable[str]) -> Dict[str, str]:
+        """Map every locale name and each of its prefixes to a locale"""
+        index: Dict[str, str] = {}
+        # Exact names win over prefixes, and the default locale wins shared prefixes
+        ordered = sorted(locales, key=lambda name: (name != self.default_locale, name))
+        for locale in ordered:
+            index[normalize_tag(locale)] = locale
+        for locale in ordered:
+            parts = normalize_tag(locale).split("_")
+            for i in range(len(parts) - 1, 0, -1):
+                index.setdefault("_".join(parts[:i]), locale)
+        return index
+
+    def _negotiate(self, header: str) -> str:
+        """Negotiate the best locale for an Accept-Language header"""
+        for tag, _ in parse_accept_language(header):
+            if tag == "*":
+                return self.default_locale
+
+            parts = tag.split("_")
+            for i in range(len(parts), 0, -1):
+                locale = self._index.get("_".join(parts[:i]))
+                if locale is not None:
+                    return locale
+
+        return self.default_locale
@@ -2,10 +2,187 @@
 Template patcher for Flower to add i18n support
 """
 
+import hashlib
+import json
 import os
 import shutil
+from functools import cached_property, lru_cache
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict, List, Optional, Tuple
+
+from .rewrite import RuleSet, mark_i18n
+from .snapshot import atomic_write, clone_file, snapshot_tree, stage_tree, swap_directory
+
+
+# Script tag injected into base.html
+I18N_SCRIPT = '''
+    <!-- Flower i18n support -->
+    <script src="{{ static_url('js/i18n.js') }}"></script>'''
+
+# Templates rewritten by patch(), in patching order
+PATCHED_TEMPLATES = ('base.html', 'navbar.html', 'broker.html',
+                     'workers.html', 'tasks.html', 'worker.html')
+
+# Records what was patched, so re-runs only need to stat and hash files
+MANIFEST_NAME = ".flower_i18n_manifest.json"
+MANIFEST_VERSION = 1
+
+# Marker telling whether a template has already been rewritten
+PATCH_MARKERS = {'base.html': 'flower-i18n'}
+DEFAULT_PATCH_MARKER = 'data-i18n='
+
+# Elements to mark with data-i18n, per template: source text -> translation key
+TEMPLATE_RULES = {
+    'navbar.html': {
+        # Navigation items
+        'href="{{ reverse_url(\'workers\') }}">Workers</a>': 'nav.workers',
+        'href="{{ reverse_url(\'tasks\') }}">Tasks</a>': 'nav.tasks',
+        'href="{{ reverse_url(\'broker\') }}">Broker</a>': 'nav.broker',
+        'href="https://flower.readthedocs.io/" target="_blank" rel="noopener">Documentation</a>': 'nav.documentation',
+    },
+    'broker.html': {
+        # Table headers
+        '<th>Queue</th>': 'broker.queue',
+        '<th>Messages</th>': 'broker.messages',
+        '<th>Unacked</th>': 'broker.unacked',
+        '<th>Ready</th>': 'broker.ready',
+        '<th>Consumers</th>': 'broker.consumers',
+        '<th>Idle since</th>': 'broker.idle_since',
+    },
+    'workers.html': {
+        # Table headers
+        '<th>Worker</th>': 'workers.worker',
+        '<th class="text-center">Status</th>': 'workers.status',
+        '<th class="text-center">Active</th>': 'workers.active',
+        '<th class="text-center">Processed</th>': 'workers.processed',
+        '<th class="text-center">Failed</th>': 'workers.failed',
+        '<th class="text-center">Succeeded</th>': 'workers.succeeded',
+        '<th class="text-center">Retried</th>': 'workers.retried',
+        '<th class="text-center">Load Average</th>': 'workers.load_average',
+        '<th>Total</th>': 'common.total',
+    },
+    'tasks.html': {
+        # Table headers
+        '<th>Name</th>': 'tasks.name',
+        '<th>UUID</th>': 'tasks.uuid',
+        '<th class="text-center">State</th>': 'tasks.state',
+        '<th>args</th>': 'tasks.args',
+        '<th>kwargs</th>': 'tasks.kwargs',
+        '<th>Result</th>': 'tasks.result',
+        '<th class="text-center">Received</th>': 'tasks.received',
+        '<th class="text-center">Started</th>': 'tasks.started',
+        '<th class="text-center">Runtime</th>': 'tasks.runtime',
+        '<th>Worker</th>': 'tasks.worker',
+        '<th>Exchange</th>': 'tasks.exchange',
+        '<th>Routing Key</th>': 'tasks.routing_key',
+        '<th class="text-center">Retries</th>': 'tasks.retries',
+        '<th class="text-center">Revoked</th>': 'tasks.revoked',
+        '<th>Exception</th>': 'tasks.exception',
+        '<th class="text-center">Expires</th>': 'tasks.expires',
+        '<th class="text-center">ETA</th>': 'tasks.eta',
+    },
+    'worker.html': {
+        # Tab titles
+        'aria-selected="true">Pool</a>': 'worker.pool',
+        'aria-selected="false">Broker</a>': 'worker.broker',
+        'aria-selected="false">Queues</a>': 'worker.queues',
+        'aria-selected="false">Tasks</a>': 'worker.tasks',
+        'aria-selected="false">Limits</a>': 'worker.limits',
+        'aria-selected="false">Config</a>': 'worker.config',
+        'aria-selected="false">System</a>': 'worker.system',
+        'aria-selected="false">Other</a>': 'worker.other',
+        # Dropdown actions
+        '>Shut Down</a>': 'worker.shutdown',
+        '>Restart Pool</a>': 'worker.restart_pool',
+        'data-bs-dismiss="dropdown">Refresh</a>': 'worker.refresh',
+        'data-bs-dismiss="dropdown">Refresh All</a>': 'worker.refresh_all',
+        # Captions and legends
+        '<caption>Worker pool options</caption>': 'worker.pool_options',
+        '<caption>Broker options</caption>': 'worker.broker_options',
+        '<caption>Configuration options</caption>': 'worker.config_options',
+        '<caption>System usage statistics</caption>': 'worker.system_stats',
+        '<caption>Other statistics</caption>': 'worker.other_stats',
+        '<legend class="form-label mt-md-5">Pool size control</legend>': 'worker.pool_size_control',
+        # Labels and buttons
+        '<label for="pool-size" class="col-sm-2 col-form-label text-nowrap">Pool size</label>': 'worker.pool_size',
+        '>Grow</button>': 'worker.grow',
+        '>Shrink</button>': 'worker.shrink',
+        '<label for="min-autoscale" class="col-sm-2 form-label text-nowrap">Auto scale</label>': 'worker.auto_scale',
+        # Table cells
+        '<td>Worker PID</td>': 'worker.worker_pid',
+        '<td>Prefetch Count</td>': 'worker.prefetch_count',
+        '<th>Queue arguments</th>': 'worker.queue_arguments',
+    },
+}
+
+
+# Plain replacements applied in the same pass as the data-i18n rules
+TEMPLATE_REPLACEMENTS = {
+    'base.html': {
+        '</body>': f'{I18N_SCRIPT}\n  </body>',
+    },
+}
+
+
+def is_template_patched(name: str, content: str) -> bool:
+    """Check whether a template source already carries the i18n rewrite"""
+    return PATCH_MARKERS.get(name, DEFAULT_PATCH_MARKER) in content
+
+
+@lru_cache(maxsize=None)
+def get_rule_set(name: str) -> Optional[RuleSet]:
+    """Get the compiled rewrite rules of a template, if it has any"""
+    if name not in TEMPLATE_RULES and name not in TEMPLATE_REPLACEMENTS:
+        return None
+
+    replacements = {
+        match: mark_i18n(match, key) for match, key in TEMPLATE_RULES.get(name, {}).items()
+    }
+    replacements.update(TEMPLATE_REPLACEMENTS.get(name, {}))
+    return RuleSet(replacements)
+
+
+def rewrite_template_with_counts(name: str, content: str) -> Tuple[str, Dict[str, int]]:
+    """Apply the i18n rewrite rules for a template, counting matches per rule"""
+    rule_set = get_rule_set(name)
+    if rule_set is None or is_template_patched(name, content):
+        return content, {}
+    return rule_set.apply(content)
+
+
+def rewrite_template(name: str, content: str) -> str:
+    """Apply the i18n rewrite rules for a template to its source"""
+    return rewrite_template_with_counts(name, content)[0]
+
+
+def file_state(path: Path) -> List[int]:
+    """Cheap change detector for a file: [size, mtime_ns]"""
+    stat = path.stat()
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def sha256_bytes(data: bytes) -> str:
+    """Hex SHA-256 of some bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def find_flower_path() -> Path:
+    """Locate Flower's package directory without importing it"""
+    from importlib.util import find_spec
+
+    spec = find_spec("flower")
+    if spec is None or not spec.submodule_search_locations:
+        raise ImportError("Flower is not installed")
+    return Path(list(spec.submodule_search_locations)[0])
+
+
+def get_flower_version() -> Optional[str]:
+    """Installed Flower version, if it can be determined"""
+    try:
+        from importlib.metadata import version
+        return version("flower")
+    except Exception:
+        return None
 
 
 class FlowerTemplatePatcher:
@@ -14,301 +191,358 @@ class FlowerTemplatePatcher:
     def __init__(self, flower_path: Optional[Path] = None):
         if flower_path is None:
             # Try to find flower installation
-            import flower
-            self.flower_path = Path(flower.__file__).parent
+            self.flower_path = find_flower_path()
         else:
             self.flower_path = flower_path
 
         self.templates_path = self.flower_path / "templates"
         self.static_path = self.flower_path / "static"
         self.backup_path = self.flower_path / "templates_backup"
+        self.manifest_path = self.flower_path / MANIFEST_NAME
+        # Matches per rewrite rule for each template patched by this instance
+        self.rule_counts: Dict[str, Dict[str, int]] = {}
+        self._manifest: Optional[Dict[str, Any]] = None
+        # Directory the patch_* methods rewrite; a staged copy during patch()
+        self._work_path = self.templates_path
+        self._work_changed = False
+
+    @property
+    def manifest(self) -> Dict[str, Any]:
+        """Hashes recorded by the last patch run, loaded on first use"""
+        if self._manifest is None:
+            self._manifest = self.load_manifest()
+        return self._manifest
+
+    def load_manifest(self) -> Dict[str, Any]:
+        """Read the patch manifest, or start an empty one"""
+        manifest: Dict[str, Any] = {}
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            pass
+        if manifest.get('version') != MANIFEST_VERSION:
+            manifest = {'version': MANIFEST_VERSION}
+        manifest.setdefault('flower_version', None)
+        manifest.setdefault('templates', {})
+        manifest.setdefault('static', {})
+        return manifest
+
+    def save_manifest(self):
+        """Write the patch manifest next to Flower's templates"""
+        tmp = self.manifest_path.with_name(self.manifest_path.name + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.manifest_path)
+
+    @cached_property
+    def flower_version(self) -> Optional[str]:
+        """Installed Flower version, looked up once per patcher"""
+        return get_flower_version()
+
+    @property
+    def _trust_file_states(self) -> bool:
+        """Size and mtime are only trusted while Flower's version is unchanged"""
+        return self.manifest['flower_version'] == self.flower_version
+
+    def _templates_up_to_date(self) -> bool:
+        """Check that every template still holds the output of the last run"""
+        if not self._trust_file_states:
+            return False
+        for name in PATCHED_TEMPLATES:
+            template = self.templates_path / name
+            entry = self.manifest['templates'].get(name)
+            if entry is None or not template.exists():
+                # Missing templates are only reported, never patched
+                if entry is None and not template.exists():
+                    continue
+                return False
+            if entry['state'] == file_state(template):
+                continue
+            if sha256_bytes(template.read_bytes()) != entry['output']:
+                return False
+            entry['state'] = file_state(template)
+        return True
 
     def backup_templates(self):
         """Backup original templates"""
         if not self.backup_path.exists():
-            shutil.copytree(self.templates_path, self.backup_path)
+            snapshot_tree(self.templates_path, self.backup_path)
             print(f"✓ Backed up templates to {self.backup_path}")
         else:
             print(f"✓ Backup already exists at {self.backup_path}")
 
+    def refresh_backup(self):
+        """Re-snapshot the originals after Flower's templates were replaced
+
+        Files still holding our patched output keep their previous backup,
+        everything else is taken from the live templates.
+        """
+        fresh = stage_tree(self.templates_path, self.backup_path)
+        for name, entry in self.manifest['templates'].items():
+            live = self.templates_path / name
+            previous = self.backup_path / name
+            if (live.exists() and previous.exists()
+                    and sha256_bytes(live.read_bytes()) == entry['output']):
+                (fresh / name).unlink()
+                clone_file(previous, fresh / name)
+
+        if self.backup_path.exists():
+            swap_directory(self.backup_path, fresh)
+        else:
+            os.rename(fresh, self.backup_path)
+        print(f"✓ Refreshed backup at {self.backup_path}")
+
     def restore_templates(self):
         """Restore original templates from backup"""
         if self.backup_path.exists():
-            if self.templates_path.exists():
-                shutil.rmtree(self.templates_path)
-            shutil.copytree(self.backup_path, self.templates_path)
+            # Flower sees either the patched or the original tree, never a mix
+            staged = stage_tree(self.backup_path, self.templates_path)
+            if self.templates_path.exists() or self.templates_path.is_symlink():
+                swap_directory(self.templates_path, staged)
+            else:
+                os.rename(staged, self.templates_path)
             print(f"✓ Restored templates from backup")
         else:
             print("✗ No backup found")
 
-    def patch_base_template(self):
-        """Patch base.html to include i18n script"""
-        base_template = self.templates_path / "base.html"
+    def _patch_template(self, name: str) -> bool:
+        """Rewrite a template in place using its replacement table"""
+        template = self._work_path / name
 
-        if not base_template.exists():
-            print(f"✗ base.html not found at {base_template}")
+        if not template.exists():
+            print(f"✗ {name} not found at {template}")
             return False
 
-        with open(base_template, 'r', encoding='utf-8') as f:
-            content = f.read()
-
-        # Check if already patched
-        if 'flower-i18n' in content:
-            print("✓ base.html already patched")
+        entry = self.manifest['templates'].get(name)
+        if entry and self._trust_file_states and entry['state'] == file_state(template):
+            print(f"✓ {name} unchanged")
             return True
 
-        # Add i18n script before closing body tag
-        i18n_script = '''
-    <!-- Flower i18n support -->
-    <script src="{{ static_url('js/i18n.js') }}"></script>'''
-
-        content = content.replace('</body>', f'{i18n_script}\n  </body>')
-
-        with open(base_template, 'w', encoding='utf-8') as f:
-            f.write(content)
-
-        print("✓ Patched base.html")
-        return True
-
-    def patch_navbar_template(self):
-        """Patch navbar.html to add data attributes for i18n"""
-        navbar_template = self.templates_path / "navbar.html"
-
-        if not navbar_template.exists():
-            print(f"✗ navbar.html not found at {navbar_template}")
-            return False
-
-        with open(navbar_template, 'r', encoding='utf-8') as f:
-            content = f.read()
+        data = template.read_bytes()
+        digest = sha256_bytes(data)
+        if entry and digest == entry['output']:
+            entry['state'] = file_state(template)
+            print(f"✓ {name} unchanged")
+            return True
 
-        # Check if already patched
-        if 'data-i18n=' in content:
-            print("✓ navbar.html already patched")
+        content = data.decode('utf-8')
+        if is_template_patched(name, content):
+            # Patched by a run that predates the manifest; adopt it as is
+            self.manifest['templates'][name] = {
+                'source': None, 'output': digest, 'state': file_state(template),
+            }
+            print(f"✓ {name} already patched")
             return True
 
-        # Add data-i18n attributes to navigation items
-        replacements = {
-            'href="{{ reverse_url(\'workers\') }}">Workers</a>':
-                'href="{{ reverse_url(\'workers\') }}" data-i18n="nav.workers">Workers</a>',
-            'href="{{ reverse_url(\'tasks\') }}">Tasks</a>':
-                'href="{{ reverse_url(\'tasks\') }}" data-i18n="nav.tasks">Tasks</a>',
-            'href="{{ reverse_url(\'broker\') }}">Broker</a>':
-                'href="{{ reverse_url(\'broker\') }}" data-i18n="nav.broker">Broker</a>',
-            'href="https://flower.readthedocs.io/" target="_blank" rel="noopener">Documentation</a>':
-                'href="https://flower.readthedocs.io/" target="_blank" rel="noopener" data-i18n="nav.documentation">Documentation</a>',
+        if entry and self.backup_path.exists():
+            # Replaced since the last run, e.g. by a Flower upgrade
+            print(f"↻ {name} changed since it was patched")
+            backup = self.backup_path / name
+            if backup.exists():
+                backup.unlink()
+            clone_file(template, backup)
+
+        content, counts = rewrite_template_with_counts(name, content)
+        self.rule_counts[name] = counts
+
+        output = content.encode('utf-8')
+        # Replaces the file, so snapshots sharing its data keep the original
+        atomic_write(template, output)
+        self._work_changed = True
+        self.manifest['templates'][name] = {
+            'source': digest,
+            'output': sha256_bytes(output),
+            'state': file_state(template),
         }
 
-        for old, new in replacements.items():
-            content = content.replace(old, new)
+        print(f"✓ Patched {name}")
+        unmatched = [pattern for pattern, count in counts.items() if not count]
+        if unmatched:
+            # Usually means Flower changed this template in a new release
+            print(f"⚠ {len(unmatched)} rule(s) matched nothing in {name}:")
+            for pattern in unmatched:
+                print(f"    {pattern}")
+        return True
 
-        with open(navbar_template, 'w', encoding='utf-8') as f:
-            f.write(content)
+    def patch_base_template(self):
+        """Patch base.html to include i18n script"""
+        return self._patch_template("base.html")
 
-        print("✓ Patched navbar.html")
-        return True
+    def patch_navbar_template(self):
+        """Patch navbar.html to add data attributes for i18n"""
+        return self._patch_template("navbar.html")
 
     def patch_broker_template(self):
         """Patch broker.html to add data-i18n attributes"""
-        broker_template = self.templates_path / "broker.html"
-
-        if not broker_template.exists():
-            print(f"✗ broker.html not found at {broker_template}")
-            return False
-
-        with open(broker_template, 'r', encoding='utf-8') as f:
-            content = f.read()
-
-        if 'data-i18n=' in content:
-            print("✓ broker.html already patched")
-            return True
-
-        # Add data-i18n attributes to table headers
-        replacements = {
-            '<th>Queue</th>': '<th data-i18n="broker.queue">Queue</th>',
-            '<th>Messages</th>': '<th data-i18n="broker.messages">Messages</th>',
-            '<th>Unacked</th>': '<th data-i18n="broker.unacked">Unacked</th>',
-            '<th>Ready</th>': '<th data-i18n="broker.ready">Ready</th>',
-            '<th>Consumers</th>': '<th data-i18n="broker.consumers">Consumers</th>',
-            '<th>Idle since</th>': '<th data-i18n="broker.idle_since">Idle since</th>',
-        }
-
-        for old, new in replacements.items():
-            content = content.replace(old, new)
-
-        with open(broker_template, 'w', encoding='utf-8') as f:
-            f.write(content)
-
-        print("✓ Patched broker.html")
-        return True
+        return self._patch_template("broker.html")
 
     def patch_workers_template(self):
         """Patch workers.html to add data-i18n attributes"""
-        workers_template = self.templates_path / "workers.html"
-
-        if not workers_template.exists():
-            print(f"✗ workers.html not found at {workers_template}")
-            return False
-
-        with open(workers_template, 'r', encoding='utf-8') as f:
-            content = f.read()
-
-        if 'data-i18n=' in content:
-            print("✓ workers.html already patched")
-            return True
-
-        # Add data-i18n attributes to table headers
-        replacements = {
-            '<th>Worker</th>': '<th data-i18n="workers.worker">Worker</th>',
-            '<th class="text-center">Status</th>': '<th class="text-center" data-i18n="workers.status">Status</th>',
-            '<th class="text-center">Active</th>': '<th class="text-center" data-i18n="workers.active">Active</th>',
-            '<th class="text-center">Processed</th>': '<th class="text-center" data-i18n="workers.processed">Processed</th>',
-            '<th class="text-center">Failed</th>': '<th class="text-center" data-i18n="workers.failed">Failed</th>',
-            '<th class="text-center">Succeeded</th>': '<th class="text-center" data-i18n="workers.succeeded">Succeeded</th>',
-            '<th class="text-center">Retried</th>': '<th class="text-center" data-i18n="workers.retried">Retried</th>',
-            '<th class="text-center">Load Average</th>': '<th class="text-center" data-i18n="workers.load_average">Load Average</th>',
-            '<th>Total</th>': '<th data-i18n="common.total">Total</th>',
-        }
-
-        for old, new in replacements.items():
-            content = content.replace(old, new)
-
-        with open(workers_template, 'w', encoding='utf-8') as f:
-            f.write(content)
-
-        print("✓ Patched workers.html")
-        return True
+        return self._patch_template("workers.html")
 
     def patch_tasks_template(self):
         """Patch tasks.html to add data-i18n attributes"""
-        tasks_template = self.templates_path / "tasks.html"
-
-        if not tasks_template.exists():
-            print(f"✗ tasks.html not found at {tasks_template}")
-            return False
-
-        with open(tasks_template, 'r', encoding='utf-8') as f:
-            content = f.read()
-
-        if 'data-i18n=' in content:
-            print("✓ tasks.html already patched")
-            return True
-
-        # Add data-i18n attributes to table headers
-        replacements = {
-            '<th>Name</th>': '<th data-i18n="tasks.name">Name</th>',
-            '<th>UUID</th>': '<th data-i18n="tasks.uuid">UUID</th>',
-            '<th class="text-center">State</th>': '<th class="text-center" data-i18n="tasks.state">State</th>',
-            '<th>args</th>': '<th data-i18n="tasks.args">args</th>',
-            '<th>kwargs</th>': '<th data-i18n="tasks.kwargs">kwargs</th>',
-            '<th>Result</th>': '<th data-i18n="tasks.result">Result</th>',
-            '<th class="text-center">Received</th>': '<th class="text-center" data-i18n="tasks.received">Received</th>',
-            '<th class="text-center">Started</th>': '<th class="text-center" data-i18n="tasks.started">Started</th>',
-            '<th class="text-center">Runtime</th>': '<th class="text-center" data-i18n="tasks.runtime">Runtime</th>',
-            '<th>Worker</th>': '<th data-i18n="tasks.worker">Worker</th>',
-            '<th>Exchange</th>': '<th data-i18n="tasks.exchange">Exchange</th>',
-            '<th>Routing Key</th>': '<th data-i18n="tasks.routing_key">Routing Key</th>',
-            '<th class="text-center">Retries</th>': '<th class="text-center" data-i18n="tasks.retries">Retries</th>',
-            '<th class="text-center">Revoked</th>': '<th class="text-center" data-i18n="tasks.revoked">Revoked</th>',
-            '<th>Exception</th>': '<th data-i18n="tasks.exception">Exception</th>',
-            '<th class="text-center">Expires</th>': '<th class="text-center" data-i18n="tasks.expires">Expires</th>',
-            '<th class="text-center">ETA</th>': '<th class="text-center" data-i18n="tasks.eta">ETA</th>',
-        }
-
-        for old, new in replacements.items():
-            content = content.replace(old, new)
-
-        with open(tasks_template, 'w', encoding='utf-8') as f:
-            f.write(content)
-
-        print("✓ Patched tasks.html")
-        return True
+        return self._patch_template("tasks.html")
 
     def patch_worker_template(self):
         """Patch worker.html to add data-i18n attributes"""
-        worker_template = self.templates_path / "worker.html"
-
-        if not worker_template.exists():
-            print(f"✗ worker.html not found at {worker_template}")
-            return False
-
-        with open(worker_template, 'r', encoding='utf-8') as f:
-            content = f.read()
-
-        if 'data-i18n=' in content:
-            print("✓ worker.html already patched")
-            return True
-
-        # Add data-i18n attributes
-        replacements = {
-            # Tab titles
-            'aria-selected="true">Pool</a>': 'aria-selected="true" data-i18n="worker.pool">Pool</a>',
-            'aria-selected="false">Broker</a>': 'aria-selected="false" data-i18n="worker.broker">Broker</a>',
-            'aria-selected="false">Queues</a>': 'aria-selected="false" data-i18n="worker.queues">Queues</a>',
-            'aria-selected="false">Tasks</a>': 'aria-selected="false" data-i18n="worker.tasks">Tasks</a>',
-            'aria-selected="false">Limits</a>': 'aria-selected="false" data-i18n="worker.limits">Limits</a>',
-            'aria-selected="false">Config</a>': 'aria-selected="false" data-i18n="worker.config">Config</a>',
-            'aria-selected="false">System</a>': 'aria-selected="false" data-i18n="worker.system">System</a>',
-            'aria-selected="false">Other</a>': 'aria-selected="false" data-i18n="worker.other">Other</a>',
-            # Dropdown actions
-            '>Shut Down</a>': ' data-i18n="worker.shutdown">Shut Down</a>',
-            '>Restart Pool</a>': ' data-i18n="worker.restart_pool">Restart Pool</a>',
-            'data-bs-dismiss="dropdown">Refresh</a>': 'data-bs-dismiss="dropdown" data-i18n="worker.refresh">Refresh</a>',
-            'data-bs-dismiss="dropdown">Refresh All</a>': 'data-bs-dismiss="dropdown" data-i18n="worker.refresh_all">Refresh All</a>',
-            # Captions and legends
-            '<caption>Worker pool options</caption>': '<caption data-i18n="worker.pool_options">Worker pool options</caption>',
-            '<caption>Broker options</caption>': '<caption data-i18n="worker.broker_options">Broker options</caption>',
-            '<caption>Configuration options</caption>': '<caption data-i18n="worker.config_options">Configuration options</caption>',
-            '<caption>System usage statistics</caption>': '<caption data-i18n="worker.system_stats">System usage statistics</caption>',
-            '<caption>Other statistics</caption>': '<caption data-i18n="worker.other_stats">Other statistics</caption>',
-            '<legend class="form-label mt-md-5">Pool size control</legend>': '<legend class="form-label mt-md-5" data-i18n="worker.pool_size_control">Pool size control</legend>',
-            # Labels and buttons
-            '<label for="pool-size" class="col-sm-2 col-form-label text-nowrap">Pool size</label>': '<label for="pool-size" class="col-sm-2 col-form-label text-nowrap" data-i18n="worker.pool_size">Pool size</label>',
-            '>Grow</button>': ' data-i18n="worker.grow">Grow</button>',
-            '>Shrink</button>': ' data-i18n="worker.shrink">Shrink</button>',
-            '<label for="min-autoscale" class="col-sm-2 form-label text-nowrap">Auto scale</label>': '<label for="min-autoscale" class="col-sm-2 form-label text-nowrap" data-i18n="worker.auto_scale">Auto scale</label>',
-            # Table cells
-            '<td>Worker PID</td>': '<td data-i18n="worker.worker_pid">Worker PID</td>',
-            '<td>Prefetch Count</td>': '<td data-i18n="worker.prefetch_count">Prefetch Count</td>',
-            '<th>Queue arguments</th>': '<th data-i18n="worker.queue_arguments">Queue arguments</th>',
+        return self._patch_template("worker.html")
+
+    def template_states(self, verify: bool = False) -> Dict[str, str]:
+        """State of each template: patched, unpatched, changed or missing
+
+        Templates whose size and mtime match the manifest count as patched
+        unless ``verify`` is set, in which case every file is hashed.
+        """
+        states = {}
+        for name in PATCHED_TEMPLATES:
+            template = self.templates_path / name
+            if not template.exists():
+                states[name] = 'missing'
+                continue
+            entry = self.manifest['templates'].get(name)
+            if entry and not verify and entry['state'] == file_state(template):
+                states[name] = 'patched'
+                continue
+            data = template.read_bytes()
+            if entry and sha256_bytes(data) == entry['output']:
+                states[name] = 'patched'
+            elif entry:
+                # Replaced or edited since it was patched
+                states[name] = 'changed'
+            elif is_template_patched(name, data.decode('utf-8', 'replace')):
+                states[name] = 'patched'
+            else:
+                states[name] = 'unpatched'
+        return states
+
+    def static_state(self, verify: bool = False) -> str:
+        """State of the generated static files: generated, stale, changed or missing
+
+        ``stale`` means the runtime or a messages.json changed since they
+        were generated; only checked when ``verify`` is set.
+        """
+        outputs = self.manifest['static'].get('outputs')
+        if not outputs:
+            return 'generated' if (self.static_path / "js" / "i18n.js").exists() else 'missing'
+        for relative, entry in outputs.items():
+            path = self.static_path / relative
+            if not path.exists():
+                return 'missing'
+            if not verify and entry['state'] == file_state(path):
+                continue
+            if sha256_bytes(path.read_bytes()) != entry['output']:
+                return 'changed'
+        if verify and self.manifest['static'].get('inputs') != self._static_inputs():
+            return 'stale'
+        return 'generated'
+
+    def _static_inputs(self) -> Dict[str, Any]:
+        """Fingerprint of everything the generated static files are built from"""
+        from . import __version__
+
+        # Same files as bundle.RUNTIME_SOURCE and the locales; importing the
+        # bundle module would load the whole i18n runtime
+        package_dir = Path(__file__).parent
+        runtime = package_dir / "static" / "js" / "i18n.js"
+        sources = [runtime] + sorted((package_dir / "locales").glob("*/messages.json"))
+        return {
+            'package_version': __version__,
+            'files': {str(path.relative_to(package_dir)): file_state(path) for path in sources},
         }
 
-        for old, new in replacements.items():
-            content = content.replace(old, new)
-
-        with open(worker_template, 'w', encoding='utf-8') as f:
-            f.write(content)
-
-        print("✓ Patched worker.html")
+    def _static_up_to_date(self, inputs: Dict[str, Any]) -> bool:
+        """Check that generated static files match their inputs and were not touched"""
+        static = self.manifest['static']
+        if not static.get('outputs') or static.get('inputs') != inputs:
+            return False
+        for relative, entry in static['outputs'].items():
+            path = self.static_path / relative
+            if not path.exists():
+                return False
+            if self._trust_file_states and entry['state'] == file_state(path):
+                continue
+            if sha256_bytes(path.read_bytes()) != entry['output']:
+                return False
+            entry['state'] = file_state(path)
         return True
 
     def copy_static_files(self):
-        """Copy i18n static files to Flower's static directory"""
-        src_js = Path(__file__).parent / "static" / "js" / "i18n.js"
-        dest_js = self.static_path / "js" / "i18n.js"
-
-        if not dest_js.parent.exists():
-            dest_js.parent.mkdir(parents=True, exist_ok=True)
-
-        shutil.copy2(src_js, dest_js)
-        print(f"✓ Copied i18n.js to {dest_js}")
+        """Generate i18n.js and the per-locale catalogs in Flower's static directory"""
+        from .bundle import build_bundle
+
+        js_dir = self.static_path / "js"
+        inputs = self._static_inputs()
+        if self._static_up_to_date(inputs):
+            print(f"✓ i18n.js and catalogs in {js_dir} unchanged")
+            return
+
+        bundle = build_bundle()
+        written = bundle.write(js_dir)
+        self.manifest['static'] = {
+            'inputs': inputs,
+            'outputs': {
+                str(path.relative_to(self.static_path)): {
+                    'output': sha256_bytes(path.read_bytes()),
+                    'state': file_state(path),
+                }
+                for path in written
+            },
+        }
+        print(f"✓ Generated i18n.js in {js_dir}")
+        for locale, entry in sorted(bundle.manifest.items()):
+            print(f"✓ Generated {locale} catalog {entry['file']}")
 
     def patch(self):
         """Apply all patches"""
         print("Starting Flower template patching...")
         print(f"Flower installation path: {self.flower_path}")
 
+        # Nothing to stage or generate when the last run's output is intact
+        recorded = json.dumps(self.manifest, sort_keys=True)
+        if self._templates_up_to_date() and self._static_up_to_date(self._static_inputs()):
+            if json.dumps(self.manifest, sort_keys=True) != recorded:
+                # Only file states changed, e.g. after a copy that kept the contents
+                self.save_manifest()
+            print("✓ Templates and i18n.js are up to date; nothing to patch")
+            return
+
         # Backup original templates
-        self.backup_templates()
-
-        # Apply patches
-        self.patch_base_template()
-        self.patch_navbar_template()
-        self.patch_broker_template()
-        self.patch_workers_template()
-        self.patch_tasks_template()
-        self.patch_worker_template()
+        flower_version = self.flower_version
+        if self.manifest['templates'] and not self._trust_file_states:
+            print(f"↻ Flower version changed "
+                  f"({self.manifest['flower_version']} -> {flower_version})")
+            self.refresh_backup()
+        else:
+            self.backup_templates()
+
+        # Apply patches to a staged snapshot, then swap it in at once
+        staged = self._work_path = stage_tree(self.templates_path, self.templates_path)
+        self._work_changed = False
+        try:
+            self.patch_base_template()
+            self.patch_navbar_template()
+            self.patch_broker_template()
+            self.patch_workers_template()
+            self.patch_tasks_template()
+            self.patch_worker_template()
+        except BaseException:
+            shutil.rmtree(staged)
+            raise
+        finally:
+            self._work_path = self.templates_path
+
+        if self._work_changed:
+            swap_directory(self.templates_path, staged)
+            print(f"✓ Swapped patched templates into {self.templates_path}")
+        else:
+            shutil.rmtree(staged)
         self.copy_static_files()
 
+        self.manifest['flower_version'] = flower_version
+        self.save_manifest()
+
         print("\n✓ Patching complete!")
         print("\nNow restart Flower and open it in your browser.")
         print("You should see a language switcher in the navigation bar.")
@@ -318,11 +552,25 @@ class FlowerTemplatePatcher:
         print("Removing Flower i18n patches...")
         self.restore_templates()
 
-        # Remove i18n.js
-        i18n_js = self.static_path / "js" / "i18n.js"
-        if i18n_js.exists():
-            i18n_js.unlink()
-            print(f"✓ Removed {i18n_js}")
+        # Remove i18n.js, its precompressed copies and the catalogs
+        from .bundle import CATALOG_DIR, ENCODING_SUFFIXES, RUNTIME_NAME
+
+        js_dir = self.static_path / "js"
+        runtime_copies = [RUNTIME_NAME + suffix for suffix in ENCODING_SUFFIXES.values()]
+        for name in [RUNTIME_NAME] + runtime_copies:
+            path = js_dir / name
+            if path.exists():
+                path.unlink()
+                print(f"✓ Removed {path}")
+
+        catalog_dir = js_dir / CATALOG_DIR
+        if catalog_dir.exists():
+            shutil.rmtree(catalog_dir)
+            print(f"✓ Removed {catalog_dir}")
+
+        if self.manifest_path.exists():
+            self.manifest_path.unlink()
+        self._manifest = None
 
         print("\n✓ Unpatching complete!")
 
@@ -0,0 +1,45 @@
+"""
+Single-pass multi-pattern rewriting of template sources
+"""
+
+import re
+from typing import Dict, Mapping, Tuple
+
+
+def mark_i18n(match: str, key: str) -> str:
+    """Add a data-i18n attribute to the element whose text ends ``match``
+
+    The attribute goes right before the ``>`` that opens the element's text,
+    e.g. ``<th>Queue</th>`` becomes ``<th data-i18n="broker.queue">Queue</th>``.
+    """
+    position = match.rindex('>', 0, match.rindex('</'))
+    return f'{match[:position]} data-i18n="{key}"{match[position:]}'
+
+
+class RuleSet:
+    """Literal replacements compiled into one alternation regex
+
+    The source is scanned once, left to right, whatever the number of rules.
+    Patterns are tried longest first so the most specific rule wins where
+    several match at the same position, and replaced text is never rescanned,
+    so one rule cannot change what another one matches.
+    """
+
+    def __init__(self, replacements: Mapping[str, str]):
+        self.replacements = dict(replacements)
+        patterns = sorted(self.replacements, key=len, reverse=True)
+        self._regex = re.compile('|'.join(re.escape(pattern) for pattern in patterns))
+
+    def apply(self, content: str) -> Tuple[str, Dict[str, int]]:
+        """Rewrite content, returning it with the number of matches per pattern"""
+        counts = dict.fromkeys(self.replacements, 0)
+        replacements = self.replacements
+
+        def replace(match):
+            text = match.group(0)
+            counts[text] += 1
+            return replacements[text]
+
+        if not replacements:
+            return content, counts
+        return self._regex.sub(replace, content), counts
@@ -0,0 +1,173 @@
+"""
+Locale-in-URL routing, so proxies can cache pages per URL instead of per cookie
+
+Enabled with ``setup_i18n(app, locale_urls=...)`` in one of two modes::
+
+    path    /zh_CN/workers   (after Flower's --url_prefix, if any)
+    query   /workers?lang=zh_CN
+
+URLs carry the canonical locale code; other spellings such as ``zh-cn`` are
+redirected permanently to it. A browser load of a page rendered from a
+template, without a locale in its URL, is redirected to the URL of the locale
+negotiated from its ``flower_locale`` cookie or Accept-Language header, so
+only that redirect varies by cookie. API, metrics and other responses that are
+not rendered pages are served at their own URL.
+"""
+
+from typing import Dict, Optional
+from urllib.parse import parse_qsl, urlencode
+
+import tornado.web
+
+LOCALE_URL_MODES = ('path', 'query')
+
+# Query argument of the query mode
+LOCALE_ARGUMENT = 'lang'
+
+# Request headers a response depends on when the locale is not in the URL
+NEGOTIATED_VARY = 'Cookie, Accept-Language'
+
+
+def content_language(locale: str) -> str:
+    """Content-Language value of a locale code, e.g. zh_CN -> zh-CN"""
+    return locale.replace('_', '-')
+
+
+def merge_vary(current: str, tokens: str = NEGOTIATED_VARY) -> str:
+    """A Vary value with the ``tokens`` it does not list yet appended"""
+    present = {token.strip().lower() for token in current.split(',') if token.strip()}
+    if '*' in present:
+        return current
+    missing = [token.strip() for token in tokens.split(',')
+               if token.strip() and token.strip().lower() not in present]
+    return ', '.join(([current.strip()] if present else []) + missing)
+
+
+def locale_url(url: str, locale: str, mode: str, url_prefix: str = '') -> str:
+    """Rewrite a path, optionally with a query string, to carry a locale"""
+    path, sep, query = url.partition('?')
+    if mode == 'query':
+        arguments = [(name, value) for name, value in parse_qsl(query, keep_blank_values=True)
+                     if name != LOCALE_ARGUMENT]
+        arguments.append((LOCALE_ARGUMENT, locale))
+        return f'{path}?{urlencode(arguments)}'
+
+    if url_prefix and (path == url_prefix or path.startswith(url_prefix + '/')):
+        head, rest = url_prefix, path[len(url_prefix):]
+    else:
+        head, rest = '', path
+    return f'{head}/{locale}{rest or "/"}{sep}{query}'
+
+
+class LocaleRedirectHandler(tornado.web.RequestHandler):
+    """Permanent redirect to the canonical spelling of a locale URL"""
+
+    def initialize(self, url: str):
+        self.url = url
+
+    def get(self):
+        self.redirect(self.url, permanent=True)
+
+    head = get
+
+
+class LocaleRouter:
+    """Read the locale from request URLs before the application routes them
+
+    In path mode the locale segment is removed from ``request.path`` and
+    ``request.uri``, so Flower's handlers route and see the URL they expect.
+    The locale is left on the request as ``request.i18n_locale``.
+    """
+
+    def __init__(self, app, i18n, mode: str, url_prefix: str = ''):
+        self.app = app
+        self.mode = mode
+        self.url_prefix = url_prefix
+        self._find_handler = app.find_handler
+        self._codes = self._index(i18n)
+        i18n.add_reload_listener(lambda locales: setattr(self, '_codes', self._index(i18n)))
+
+    @staticmethod
+    def _index(i18n) -> Dict[str, str]:
+        return {code.lower(): code for code in i18n.get_available_locales()}
+
+    def canonical(self, value: str) -> Optional[str]:
+        """Canonical code of an available locale, however it is spelled"""
+        return self._codes.get(value.replace('-', '_').lower())
+
+    def find_handler(self, request, **kwargs):
+        if self.mode == 'path':
+            redirect = self._route_path(request)
+        else:
+            redirect = self._route_query(request)
+        if redirect is not None:
+            return self.app.get_handler_delegate(request, LocaleRedirectHandler, {'url': redirect})
+        return self._find_handler(request, **kwargs)
+
+    def _route_path(self, request) -> Optional[str]:
+        prefix = self.url_prefix
+        path = request.path
+        if prefix:
+            if not path.startswith(prefix + '/'):
+                return None
+            path = path[len(prefix):]
+        segment, _, rest = path[1:].partition('/')
+        locale = self.canonical(segment) if segment else None
+        if locale is None:
+            return None
+
+        path = f'{prefix}/{rest}'
+        query = f'?{request.query}' if request.query else ''
+        if segment != locale:
+            return locale_url(path + query, locale, 'path', prefix)
+        request.i18n_locale = locale
+        request.path = path
+        request.uri = path + query
+        return None
+
+    def _route_query(self, request) -> Optional[str]:
+        values = request.query_arguments.get(LOCALE_ARGUMENT)
+        if not values:
+            return None
+        value = values[-1].decode('utf-8', 'replace')
+        locale = self.canonical(value)
+        if locale is None:
+            # Unknown locales are ignored, as if the argument were absent
+            return None
+        if value != locale or len(values) > 1:
+            return locale_url(request.uri, locale, 'query')
+        request.i18n_locale = locale
+        return None
+
+
+def localize_response(handler):
+    """Set a handler's language headers"""
+    if getattr(handler.request, 'i18n_locale', None) is None:
+        handler.set_header('Vary', NEGOTIATED_VARY)
+    handler.set_header('Content-Language', content_language(handler.locale_code))
+
+
+def page_redirect_url(handler) -> Optional[str]:
+    """URL of the locale's page to send a browser to, None to render the page here
+
+    Called when a page is rendered, so only pages are redirected; API and
+    XHR clients get the negotiated response as before.
+    """
+    request = handler.request
+    if getattr(request, 'i18n_locale', None) is not None or request.method not in ('GET', 'HEAD') \
+            or 'text/html' not in request.headers.get('Accept', ''):
+        return None
+    return locale_url(request.uri, handler.locale_code, handler.settings['i18n_locale_urls'],
+                      handler.settings.get('i18n_url_prefix', ''))
+
+
+def install_locale_urls(app, i18n, mode: str, url_prefix: str = '') -> LocaleRouter:
+    """Route app requests by the locale in their URL; see the module docstring"""
+    if mode not in LOCALE_URL_MODES:
+        raise ValueError(f"locale_urls must be one of {', '.join(LOCALE_URL_MODES)}, not {mode!r}")
+    app.settings['i18n_locale_urls'] = mode
+    app.settings['i18n_url_prefix'] = url_prefix
+    router = LocaleRouter(app, i18n, mode, url_prefix)
+    # The HTTP server asks the application for handlers; answer through the router
+    app.find_handler = router.find_handler
+    return router
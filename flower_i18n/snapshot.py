@@ -0,0 +1,166 @@
+"""
+Copy-free directory snapshots and atomic directory swaps
+
+Snapshots share file data with their source instead of copying it: a reflink
+(copy-on-write clone) where the filesystem supports one, a hardlink
+otherwise, and a plain copy only across filesystems. Since hardlinked files
+share an inode, anything written into a snapshot must replace the file
+(``atomic_write``) rather than modify it in place.
+"""
+
+import ctypes
+import errno
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+# ioctl number of FICLONE from linux/fs.h
+FICLONE = 0x40049409
+
+# renameat2() arguments from linux/fcntl.h and linux/fs.h
+AT_FDCWD = -100
+RENAME_EXCHANGE = 2
+
+
+def _load_renameat2():
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        renameat2 = libc.renameat2
+    except (OSError, AttributeError):
+        return None
+    renameat2.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p,
+                          ctypes.c_uint]
+    renameat2.restype = ctypes.c_int
+    return renameat2
+
+
+_renameat2 = _load_renameat2()
+
+
+def reflink(src: Path, dst: Path) -> bool:
+    """Clone a file's data copy-on-write; False if the filesystem can't"""
+    if fcntl is None:
+        return False
+    with open(src, 'rb') as source, open(dst, 'wb') as target:
+        try:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+        except OSError:
+            cloned = False
+        else:
+            cloned = True
+    if cloned:
+        shutil.copystat(src, dst)
+    else:
+        os.unlink(dst)
+    return cloned
+
+
+def clone_file(src: Path, dst: Path) -> str:
+    """Make dst a snapshot of src as cheaply as possible
+
+    Returns how it was done: "reflink", "hardlink" or "copy".
+    """
+    if reflink(src, dst):
+        return 'reflink'
+    try:
+        os.link(src, dst)
+        return 'hardlink'
+    except OSError:
+        shutil.copy2(src, dst)
+        return 'copy'
+
+
+def clone_tree(src: Path, dst: Path):
+    """Snapshot a directory tree; dst must not exist"""
+    shutil.copytree(src, dst, copy_function=lambda s, d: clone_file(Path(s), Path(d)))
+
+
+def stage_tree(src: Path, live: Path) -> Path:
+    """Snapshot a directory tree into a new hidden sibling of ``live``"""
+    staging = Path(tempfile.mkdtemp(dir=live.parent, prefix=f'.{live.name}-'))
+    try:
+        staging.rmdir()
+        clone_tree(src, staging)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return staging
+
+
+def snapshot_tree(src: Path, dst: Path):
+    """Snapshot a directory tree so that dst appears complete or not at all"""
+    staging = stage_tree(src, dst)
+    try:
+        os.rename(staging, dst)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+
+def atomic_write(path: Path, data: bytes):
+    """Replace a file's contents without touching other links to it"""
+    fd, tmp = tempfile.mkstemp(dir=str(path.parent), prefix=f'.{path.name}-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        if path.exists():
+            shutil.copymode(path, tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def exchange_paths(a: Path, b: Path) -> bool:
+    """Atomically swap two paths with renameat2(RENAME_EXCHANGE)
+
+    Returns False when the platform or filesystem doesn't support it.
+    """
+    if _renameat2 is None:
+        return False
+    result = _renameat2(AT_FDCWD, os.fsencode(a), AT_FDCWD, os.fsencode(b), RENAME_EXCHANGE)
+    if result == 0:
+        return True
+    error = ctypes.get_errno()
+    if error in (errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+        return False
+    raise OSError(error, os.strerror(error), str(a), None, str(b))
+
+
+def swap_directory(live: Path, staged: Path) -> str:
+    """Put a staged directory in place of the live one and discard the old one
+
+    Readers of ``live`` see either the old or the new tree, never a mix:
+    a symlinked ``live`` is flipped to point at ``staged``, a real directory
+    is exchanged with it in one rename. Without renameat2 the fallback is two
+    renames, which leaves ``live`` missing for a moment.
+    Returns the method used: "symlink", "exchange" or "rename".
+    """
+    if live.is_symlink():
+        old = Path(os.path.realpath(live))
+        link = live.with_name(f'.{live.name}.link')
+        if link.is_symlink():
+            link.unlink()
+        os.symlink(staged.name if staged.parent == live.parent else staged, link)
+        os.replace(link, live)
+        if old != staged.resolve():
+            shutil.rmtree(old, ignore_errors=True)
+        return 'symlink'
+
+    if exchange_paths(live, staged):
+        shutil.rmtree(staged)
+        return 'exchange'
+
+    old = live.with_name(f'.{live.name}.old')
+    if old.exists():
+        shutil.rmtree(old)
+    os.rename(live, old)
+    os.rename(staged, live)
+    shutil.rmtree(old)
+    return 'rename'
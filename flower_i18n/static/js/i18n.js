@@ -1,185 +1,33 @@
 /**
  * Flower i18n - Language switching functionality
+ *
+ * Translation tables are not part of this file: `flower-i18n-patch` generates
+ * one content-hashed catalog per locale from locales/<locale>/messages.json
+ * and fills in the manifest below, so browsers only fetch their own language.
+ *
+ * Elements are marked with data-i18n (text), data-i18n-title and
+ * data-i18n-placeholder. Content added after load, such as DataTables rows,
+ * is picked up by a MutationObserver and translated once per animation frame.
+ *
+ * With setup_i18n(translate_feeds=True), rows of the tasks and workers feeds
+ * carry localized labels such as state_label; they replace the text Flower's
+ * column renderers produced from the raw values after every table draw.
  */
 
 (function() {
     'use strict';
 
-    // Translation data
-    const translations = {
-        'en_US': {
-            'nav.workers': 'Workers',
-            'nav.tasks': 'Tasks',
-            'nav.broker': 'Broker',
-            'nav.documentation': 'Documentation',
-            'workers.title': 'Workers',
-            'workers.worker': 'Worker',
-            'workers.name': 'Name',
-            'workers.status': 'Status',
-            'workers.active': 'Active',
-            'workers.processed': 'Processed',
-            'workers.failed': 'Failed',
-            'workers.succeeded': 'Succeeded',
-            'workers.retried': 'Retried',
-            'workers.load_average': 'Load Average',
-            'tasks.title': 'Tasks',
-            'tasks.name': 'Name',
-            'tasks.uuid': 'UUID',
-            'tasks.state': 'State',
-            'tasks.args': 'args',
-            'tasks.kwargs': 'kwargs',
-            'tasks.result': 'Result',
-            'tasks.received': 'Received',
-            'tasks.started': 'Started',
-            'tasks.runtime': 'Runtime',
-            'tasks.worker': 'Worker',
-            'tasks.exchange': 'Exchange',
-            'tasks.routing_key': 'Routing Key',
-            'tasks.retries': 'Retries',
-            'tasks.revoked': 'Revoked',
-            'tasks.exception': 'Exception',
-            'tasks.expires': 'Expires',
-            'tasks.eta': 'ETA',
-            'broker.title': 'Broker',
-            'broker.url': 'URL',
-            'broker.transport': 'Transport',
-            'broker.queue': 'Queue',
-            'broker.messages': 'Messages',
-            'broker.unacked': 'Unacked',
-            'broker.ready': 'Ready',
-            'broker.consumers': 'Consumers',
-            'broker.idle_since': 'Idle since',
-            'state.pending': 'Pending',
-            'state.started': 'Started',
-            'state.success': 'Success',
-            'state.failure': 'Failure',
-            'state.retry': 'Retry',
-            'state.revoked': 'Revoked',
-            'common.refresh': 'Refresh',
-            'common.search': 'Search',
-            'common.filter': 'Filter',
-            'common.export': 'Export',
-            'common.settings': 'Settings',
-            'common.language': 'Language',
-            'common.loading': 'Loading...',
-            'common.no_data': 'No data available',
-            'common.error': 'Error',
-            'common.close': 'Close',
-            'common.total': 'Total',
-            'worker.pool': 'Pool',
-            'worker.broker': 'Broker',
-            'worker.queues': 'Queues',
-            'worker.tasks': 'Tasks',
-            'worker.limits': 'Limits',
-            'worker.config': 'Config',
-            'worker.system': 'System',
-            'worker.other': 'Other',
-            'worker.shutdown': 'Shut Down',
-            'worker.restart_pool': 'Restart Pool',
-            'worker.refresh': 'Refresh',
-            'worker.refresh_all': 'Refresh All',
-            'worker.pool_size_control': 'Pool size control',
-            'worker.pool_size': 'Pool size',
-            'worker.grow': 'Grow',
-            'worker.shrink': 'Shrink',
-            'worker.auto_scale': 'Auto scale',
-            'worker.autoscale': 'Autoscale',
-            'worker.worker_pid': 'Worker PID',
-            'worker.prefetch_count': 'Prefetch Count',
-            'worker.pool_options': 'Worker pool options',
-            'worker.broker_options': 'Broker options',
-            'worker.config_options': 'Configuration options',
-            'worker.system_stats': 'System usage statistics',
-            'worker.other_stats': 'Other statistics',
-            'worker.queue_arguments': 'Queue arguments'
-        },
-        'zh_CN': {
-            'nav.workers': '工作进程',
-            'nav.tasks': '任务',
-            'nav.broker': '消息代理',
-            'nav.documentation': '文档',
-            'workers.title': '工作进程',
-            'workers.worker': '工作进程',
-            'workers.name': '名称',
-            'workers.status': '状态',
-            'workers.active': '活跃',
-            'workers.processed': '已处理',
-            'workers.failed': '失败',
-            'workers.succeeded': '成功',
-            'workers.retried': '重试',
-            'workers.load_average': '负载平均值',
-            'tasks.title': '任务',
-            'tasks.name': '名称',
-            'tasks.uuid': 'UUID',
-            'tasks.state': '状态',
-            'tasks.args': '参数',
-            'tasks.kwargs': '关键字参数',
-            'tasks.result': '结果',
-            'tasks.received': '接收时间',
-            'tasks.started': '开始时间',
-            'tasks.runtime': '运行时间',
-            'tasks.worker': '工作进程',
-            'tasks.exchange': '交换机',
-            'tasks.routing_key': '路由键',
-            'tasks.retries': '重试次数',
-            'tasks.revoked': '已撤销',
-            'tasks.exception': '异常',
-            'tasks.expires': '过期时间',
-            'tasks.eta': '预计时间',
-            'broker.title': '消息代理',
-            'broker.url': '地址',
-            'broker.transport': '传输方式',
-            'broker.queue': '队列',
-            'broker.messages': '消息数',
-            'broker.unacked': '未确认',
-            'broker.ready': '就绪',
-            'broker.consumers': '消费者',
-            'broker.idle_since': '空闲时长',
-            'state.pending': '等待中',
-            'state.started': '运行中',
-            'state.success': '成功',
-            'state.failure': '失败',
-            'state.retry': '重试',
-            'state.revoked': '已撤销',
-            'common.refresh': '刷新',
-            'common.search': '搜索',
-            'common.filter': '筛选',
-            'common.export': '导出',
-            'common.settings': '设置',
-            'common.language': '语言',
-            'common.loading': '加载中...',
-            'common.no_data': '暂无数据',
-            'common.error': '错误',
-            'common.close': '关闭',
-            'common.total': '总计',
-            'worker.pool': '进程池',
-            'worker.broker': '消息代理',
-            'worker.queues': '队列',
-            'worker.tasks': '任务',
-            'worker.limits': '限制',
-            'worker.config': '配置',
-            'worker.system': '系统',
-            'worker.other': '其他',
-            'worker.shutdown': '关闭',
-            'worker.restart_pool': '重启进程池',
-            'worker.refresh': '刷新',
-            'worker.refresh_all': '全部刷新',
-            'worker.pool_size_control': '进程池大小控制',
-            'worker.pool_size': '进程池大小',
-            'worker.grow': '增加',
-            'worker.shrink': '减少',
-            'worker.auto_scale': '自动伸缩',
-            'worker.autoscale': '自动伸缩',
-            'worker.worker_pid': '工作进程 PID',
-            'worker.prefetch_count': '预取数量',
-            'worker.pool_options': '工作进程池选项',
-            'worker.broker_options': '消息代理选项',
-            'worker.config_options': '配置选项',
-            'worker.system_stats': '系统使用统计',
-            'worker.other_stats': '其他统计',
-            'worker.queue_arguments': '队列参数'
-        }
-    };
+    // Locale -> {name, file, hash}; generated at build time
+    const manifest = /*@@FLOWER_I18N_MANIFEST@@*/{};
+    const defaultLocale = 'en_US';
+
+    // Loaded catalogs and in-flight catalog requests
+    const translations = {};
+    const pending = {};
+
+    // Catalog files live next to this script
+    const script = document.currentScript;
+    const baseUrl = script ? script.src.replace(/[^/]*([?#].*)?$/, '') : '';
 
     // Get current locale from cookie
     function getCookie(name) {
@@ -197,6 +45,66 @@
         document.cookie = `${name}=${value};${expires};path=/`;
     }
 
+    // Query argument carrying the locale when the server routes locales by URL
+    const LOCALE_ARGUMENT = 'lang';
+
+    // Locale in the page URL (/zh_CN/tasks or /tasks?lang=zh_CN), if any
+    function urlLocale() {
+        const locales = Object.keys(manifest).concat(defaultLocale);
+        const argument = new URLSearchParams(window.location.search).get(LOCALE_ARGUMENT);
+        if (argument && locales.includes(argument)) return argument;
+        return window.location.pathname.split('/').find(segment => locales.includes(segment)) || null;
+    }
+
+    // Locale of the page: the URL's, then the cookie's
+    function currentLocale() {
+        return urlLocale() || getCookie('flower_locale') || defaultLocale;
+    }
+
+    // URL of this page in another locale, or null if the URL carries none
+    function localizedUrl(locale) {
+        const current = urlLocale();
+        if (!current) return null;
+        const url = new URL(window.location.href);
+        if (url.searchParams.get(LOCALE_ARGUMENT) === current) {
+            url.searchParams.set(LOCALE_ARGUMENT, locale);
+        } else {
+            const segments = url.pathname.split('/');
+            segments[segments.indexOf(current)] = locale;
+            url.pathname = segments.join('/');
+        }
+        return url.href;
+    }
+
+    // Called by the generated catalog files
+    function registerCatalog(locale, messages) {
+        translations[locale] = messages;
+    }
+
+    // Load a locale's catalog once; resolves to false if it is not available
+    function loadCatalog(locale) {
+        if (translations[locale]) {
+            return Promise.resolve(true);
+        }
+        if (!manifest[locale]) {
+            return Promise.resolve(false);
+        }
+        if (!pending[locale]) {
+            pending[locale] = new Promise(resolve => {
+                const tag = document.createElement('script');
+                // The hash in ?v= lets the static handler serve it with a far-future expiry
+                tag.src = `${baseUrl}${manifest[locale].file}?v=${manifest[locale].hash}`;
+                tag.onload = () => resolve(!!translations[locale]);
+                tag.onerror = () => {
+                    delete pending[locale];
+                    resolve(false);
+                };
+                document.head.appendChild(tag);
+            });
+        }
+        return pending[locale];
+    }
+
     // Get translation
     function translate(key, locale) {
         if (translations[locale] && translations[locale][key]) {
@@ -205,20 +113,199 @@
         return key;
     }
 
-    // Apply translations to all elements with data-i18n attribute
+    // Get the display name of a locale
+    function localeName(locale) {
+        return manifest[locale] ? manifest[locale].name : locale;
+    }
+
+    // Marker attributes and the element attribute each one translates
+    const ATTRIBUTE_TARGETS = {
+        'data-i18n-title': 'title',
+        'data-i18n-placeholder': 'placeholder'
+    };
+    const MARKERS = ['data-i18n'].concat(Object.keys(ATTRIBUTE_TARGETS));
+    const SELECTOR = MARKERS.map(marker => `[${marker}]`).join(',');
+
+    // Locale whose catalog is applied to the page, once one has loaded
+    let activeLocale = null;
+
+    // Queue the DOM writes needed to translate one element, skipping
+    // text and attributes that already hold the right value
+    function collectWrites(element, locale, writes) {
+        const key = element.getAttribute('data-i18n');
+        if (key !== null) {
+            const text = translate(key, locale);
+            if (element.textContent !== text) {
+                writes.push(() => { element.textContent = text; });
+            }
+        }
+        for (const marker in ATTRIBUTE_TARGETS) {
+            const attrKey = element.getAttribute(marker);
+            if (attrKey === null) continue;
+            const attribute = ATTRIBUTE_TARGETS[marker];
+            const value = translate(attrKey, locale);
+            if (element.getAttribute(attribute) !== value) {
+                writes.push(() => { element.setAttribute(attribute, value); });
+            }
+        }
+    }
+
+    // Translate the marked elements in a set of subtrees; all reads happen
+    // before the first write
+    function translateSubtrees(roots, locale) {
+        const elements = new Set();
+        roots.forEach(root => {
+            if (root.nodeType !== 1 || !root.isConnected) return;
+            if (root.matches(SELECTOR)) elements.add(root);
+            root.querySelectorAll(SELECTOR).forEach(element => elements.add(element));
+        });
+
+        const writes = [];
+        elements.forEach(element => collectWrites(element, locale, writes));
+        writes.forEach(write => write());
+        return writes.length;
+    }
+
+    // Apply translations to the whole document
     function applyTranslations(locale) {
-        document.querySelectorAll('[data-i18n]').forEach(element => {
-            const key = element.getAttribute('data-i18n');
-            const translation = translate(key, locale);
-            element.textContent = translation;
+        activeLocale = locale;
+        return translateSubtrees([document.documentElement], locale);
+    }
+
+    // Subtrees added since the last animation frame
+    let pendingRoots = [];
+    let flushScheduled = false;
+    const nextFrame = window.requestAnimationFrame
+        ? callback => window.requestAnimationFrame(callback)
+        : callback => setTimeout(callback, 16);
+
+    function flushPending() {
+        const roots = pendingRoots;
+        pendingRoots = [];
+        flushScheduled = false;
+        if (activeLocale) {
+            translateSubtrees(roots, activeLocale);
+        }
+    }
+
+    function scheduleSubtree(root) {
+        pendingRoots.push(root);
+        if (!flushScheduled) {
+            flushScheduled = true;
+            nextFrame(flushPending);
+        }
+    }
+
+    // Translate content rendered after page load, e.g. DataTables rows and
+    // cloned headers, one batch per animation frame
+    let observer = null;
+
+    function handleMutations(records) {
+        records.forEach(record => {
+            if (record.type === 'attributes') {
+                scheduleSubtree(record.target);
+                return;
+            }
+            record.addedNodes.forEach(node => {
+                if (node.nodeType === 1) {
+                    scheduleSubtree(node);
+                } else if (node.parentElement && node.parentElement.matches(SELECTOR)) {
+                    // Text of a marked element was replaced
+                    scheduleSubtree(node.parentElement);
+                }
+            });
+        });
+    }
+
+    function observeMutations(root) {
+        if (observer || typeof MutationObserver === 'undefined') return;
+        observer = new MutationObserver(handleMutations);
+        observer.observe(root || document.body || document.documentElement, {
+            childList: true,
+            subtree: true,
+            attributes: true,
+            attributeFilter: MARKERS
+        });
+    }
+
+    function disconnectMutations() {
+        if (observer) {
+            observer.disconnect();
+            observer = null;
+        }
+        pendingRoots = [];
+    }
+
+    // Suffix of the labels the server adds to feed rows; see feeds.LABEL_SUFFIX
+    const LABEL_SUFFIX = '_label';
+    // Shown as relative times ("3 minutes ago") when Flower's natural time is on
+    const TIME_FIELDS = ['received', 'started'];
+
+    function usesNaturalTime() {
+        const input = document.getElementById('time');
+        return !!input && input.value.startsWith('natural-time');
+    }
+
+    // Element holding a cell's text: the badge, link or <time> inside it, if any
+    function labelTarget(cell) {
+        let node = cell;
+        while (node.children.length === 1) node = node.children[0];
+        return node;
+    }
+
+    // Put the server's labels into the cells of the rows on screen
+    function applyRowLabels(api) {
+        const natural = usesNaturalTime();
+        const columns = api.columns().indexes().toArray()
+            .map(index => ({index: index, field: api.column(index).dataSrc()}))
+            .filter(column => typeof column.field === 'string' &&
+                !(natural && TIME_FIELDS.includes(column.field)));
+        let written = 0;
+        api.rows({page: 'current'}).every(function() {
+            const data = this.data();
+            const row = this.index();
+            columns.forEach(column => {
+                const label = data[column.field + LABEL_SUFFIX];
+                if (typeof label !== 'string' || !label) return;
+                const cell = api.cell(row, column.index).node();
+                if (!cell) return;
+                const target = labelTarget(cell);
+                if (target.textContent !== label) {
+                    target.textContent = label;
+                    written++;
+                }
+            });
+        });
+        return written;
+    }
+
+    function observeTableDraws() {
+        const $ = window.jQuery;
+        if (!$ || !$.fn || !$.fn.dataTable) return;
+        // DataTables events bubble, so one handler covers every table
+        $(document).on('draw.dt', (event, settings) => {
+            applyRowLabels(new $.fn.dataTable.Api(settings));
         });
     }
 
     // Switch language
     function switchLanguage(locale) {
         setCookie('flower_locale', locale, 365);
-        applyTranslations(locale);
+        // Pages routed by URL keep the old locale until the URL changes
+        const url = localizedUrl(locale);
+        if (url) {
+            window.location.assign(url);
+            return;
+        }
         updateLanguageSwitcher(locale);
+        loadCatalog(locale).then(loaded => {
+            if (loaded) {
+                applyTranslations(locale);
+            } else {
+                // No client-side catalog; let the server render the new language
+                window.location.reload();
+            }
+        });
     }
 
     // Update language switcher display
@@ -227,7 +314,7 @@
         if (dropdownToggle) {
             const icon = dropdownToggle.querySelector('svg');
             const iconHTML = icon ? icon.outerHTML : '';
-            dropdownToggle.innerHTML = iconHTML + (locale === 'zh_CN' ? ' 中文' : ' English');
+            dropdownToggle.innerHTML = iconHTML + ' ' + localeName(locale);
         }
 
         // Update active state
@@ -242,10 +329,19 @@
 
     // Initialize language switcher
     function initLanguageSwitcher() {
-        const currentLocale = getCookie('flower_locale') || 'en_US';
+        const pageLocale = currentLocale();
 
-        // Apply translations immediately
-        applyTranslations(currentLocale);
+        // Apply translations as soon as this locale's catalog arrives
+        loadCatalog(pageLocale).then(loaded => {
+            if (loaded) {
+                applyTranslations(pageLocale);
+            }
+        });
+        observeMutations();
+
+        const items = Object.keys(manifest).map(locale => `
+                    <li><a class="dropdown-item ${pageLocale === locale ? 'active' : ''}"
+                           href="#" data-locale="${locale}">${localeName(locale)}</a></li>`).join('');
 
         // Create language switcher dropdown
         const languageSwitcher = `
@@ -257,13 +353,9 @@
                         <path d="M4.545 6.714 4.11 8H3l1.862-5h1.284L8 8H6.833l-.435-1.286H4.545zm1.634-.736L5.5 3.956h-.049l-.679 2.022H6.18z"/>
                         <path d="M0 2a2 2 0 0 1 2-2h7a2 2 0 0 1 2 2v3h3a2 2 0 0 1 2 2v7a2 2 0 0 1-2 2H7a2 2 0 0 1-2-2v-3H2a2 2 0 0 1-2-2V2zm2-1a1 1 0 0 0-1 1v7a1 1 0 0 0 1 1h7a1 1 0 0 0 1-1V2a1 1 0 0 0-1-1H2zm7.138 9.995c.193.301.402.583.63.846-.748.575-1.673 1.001-2.768 1.292.178.217.451.635.555.867 1.125-.359 2.08-.844 2.886-1.494.777.665 1.739 1.165 2.93 1.472.133-.254.414-.673.629-.89-1.125-.253-2.057-.694-2.82-1.284.681-.747 1.222-1.651 1.621-2.757H14V8h-3v1.047h.765c-.318.844-.74 1.546-1.272 2.13a6.066 6.066 0 0 1-.415-.492 1.988 1.988 0 0 1-.94.31z"/>
                     </svg>
-                    ${currentLocale === 'zh_CN' ? ' 中文' : ' English'}
+                    ${localeName(pageLocale)}
                 </a>
-                <ul class="dropdown-menu" aria-labelledby="languageDropdown">
-                    <li><a class="dropdown-item ${currentLocale === 'en_US' ? 'active' : ''}"
-                           href="#" data-locale="en_US">English</a></li>
-                    <li><a class="dropdown-item ${currentLocale === 'zh_CN' ? 'active' : ''}"
-                           href="#" data-locale="zh_CN">中文</a></li>
+                <ul class="dropdown-menu" aria-labelledby="languageDropdown">${items}
                 </ul>
             </li>
         `;
@@ -284,19 +376,32 @@
         }
     }
 
+    // Export to global scope before any catalog can load
+    window.FlowerI18n = {
+        switchLanguage: switchLanguage,
+        getCurrentLocale: function() {
+            return currentLocale();
+        },
+        getAvailableLocales: function() {
+            return Object.keys(manifest);
+        },
+        loadCatalog: loadCatalog,
+        registerCatalog: registerCatalog,
+        translate: translate,
+        applyTranslations: applyTranslations,
+        translateSubtrees: function(roots) {
+            return activeLocale ? translateSubtrees(roots, activeLocale) : 0;
+        },
+        observeMutations: observeMutations,
+        disconnectMutations: disconnectMutations,
+        applyRowLabels: applyRowLabels
+    };
+    observeTableDraws();
+
     // Initialize when DOM is ready
     if (document.readyState === 'loading') {
         document.addEventListener('DOMContentLoaded', initLanguageSwitcher);
     } else {
         initLanguageSwitcher();
     }
-
-    // Export to global scope if needed
-    window.FlowerI18n = {
-        switchLanguage: switchLanguage,
-        getCurrentLocale: function() {
-            return getCookie('flower_locale') || 'en_US';
-        },
-        translate: translate
-    };
-})();
\ No newline at end of file
+})();
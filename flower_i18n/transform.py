@@ -0,0 +1,278 @@
+"""
+Translate ``data-i18n`` elements of any HTML response as it streams out
+
+``setup_i18n(app, translate_responses=True)`` registers an output transform
+translating every ``text/html`` response, including pages from Flower views
+the patcher does not know and from plugin handlers. Chunks are translated as
+they are flushed: only the last, possibly unfinished element of a chunk is
+held back, and at most ``max_lookahead`` bytes of it.
+
+Responses with a strong ETag, such as static files, are identified by it: the
+translated body of one seen twice is kept per locale, so later requests send
+it without parsing or copying the document again.
+"""
+
+import html
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from tornado.httputil import HTTPHeaders, HTTPServerRequest
+from tornado.web import OutputTransform
+
+from .i18n import I18n, Translator
+from .routing import content_language, merge_vary
+
+# Text content directly following an element marked with data-i18n,
+# like loader.I18N_TEXT_RE but on encoded bodies
+MARKED_TEXT_RE = re.compile(rb'(data-i18n="([^"<>]+)"[^>]*>)([^<]*)')
+MARKER = b'data-i18n="'
+
+# Longest unfinished element held back between chunks
+MAX_LOOKAHEAD = 16 * 1024
+
+# Headers describing a body, dropped from bodyless 304 responses
+REPRESENTATION_HEADERS = ('Content-Encoding', 'Content-Language', 'Content-Type', 'Content-Length')
+
+
+class StreamTranslator:
+    """Incremental translation of an HTML byte stream
+
+    Text of a marked element ends at the next ``<``, so everything before the
+    last ``<`` of the data seen so far can be translated and sent; the rest is
+    carried over to the next chunk, unless it grows beyond ``max_lookahead``.
+    """
+
+    def __init__(self, translate: Callable[[bytes], Optional[bytes]],
+                 max_lookahead: int = MAX_LOOKAHEAD):
+        self.translate = translate
+        self.max_lookahead = max_lookahead
+        self._carry = b''
+
+    def _replace(self, match) -> bytes:
+        text = match.group(3)
+        stripped = text.strip()
+        if not stripped:
+            return match.group(0)
+        translation = self.translate(match.group(2))
+        if translation is None:
+            return match.group(0)
+        return match.group(1) + text.replace(stripped, translation, 1)
+
+    def _translate_complete(self, data: bytes) -> bytes:
+        if MARKER not in data:
+            return data
+        return MARKED_TEXT_RE.sub(self._replace, data)
+
+    def feed(self, chunk: bytes, finishing: bool = False) -> bytes:
+        """Translate a chunk, returning what can be sent so far"""
+        data = self._carry + chunk if self._carry else chunk
+        self._carry = b''
+        if finishing:
+            return self._translate_complete(data)
+
+        cut = data.rfind(b'<')
+        if cut < 0:
+            cut = 0
+        tail = data[cut:]
+        if len(tail) > self.max_lookahead:
+            # Too long to wait for: send the unfinished element as it is
+            return self._translate_complete(data[:cut]) + tail
+        self._carry = tail
+        return self._translate_complete(data[:cut])
+
+
+class EncodedTranslations:
+    """Translations of one catalog, HTML-escaped and UTF-8 encoded on first use"""
+
+    def __init__(self, translator: Translator):
+        self.catalog = translator.catalog
+        self._lookup = translator.catalog.get
+        self._encoded: Dict[bytes, Optional[bytes]] = {}
+
+    def get(self, key: bytes) -> Optional[bytes]:
+        """Encoded translation of a key, None if the catalog has none"""
+        try:
+            return self._encoded[key]
+        except KeyError:
+            pass
+        value = self._lookup(key.decode('utf-8', 'replace'))
+        encoded = None if value is None else html.escape(value, quote=False).encode('utf-8')
+        self._encoded[key] = encoded
+        return encoded
+
+
+class TranslatedBodyCache:
+    """Bounded cache of translated bodies by (locale, ETag)
+
+    A body is only stored the second time its key is seen, so responses
+    that never repeat, such as live dashboards, do not churn the cache.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, max_seen: int = 4096):
+        self.max_bytes = max_bytes
+        self.max_seen = max_seen
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[object, bytes]]" = OrderedDict()
+        self._seen: "OrderedDict[Tuple[str, str], None]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, str], catalog) -> Optional[bytes]:
+        """Cached body for a key, if it was translated with this catalog"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] is not catalog:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def wants(self, key: Tuple[str, str]) -> bool:
+        """Record a sighting of a key; True if its body should be stored"""
+        with self._lock:
+            if key in self._seen:
+                return True
+            self._seen[key] = None
+            if len(self._seen) > self.max_seen:
+                self._seen.popitem(last=False)
+            return False
+
+    def put(self, key: Tuple[str, str], catalog, body: bytes):
+        if len(body) > self.max_bytes // 8:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous[1])
+            self._entries[key] = (catalog, body)
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+
+def request_locale(request: HTTPServerRequest, i18n: I18n) -> str:
+    """Locale of a request not handled by an I18nHandler: URL, cookie, then header"""
+    locale = getattr(request, 'i18n_locale', None)
+    if locale is not None:
+        return locale
+    morsel = request.cookies.get('flower_locale')
+    if morsel is not None and i18n.has_locale(morsel.value):
+        return morsel.value
+    return i18n.negotiator.negotiate(request.headers.get('Accept-Language', ''))
+
+
+def _translatable(headers: HTTPHeaders) -> bool:
+    if 'Content-Encoding' in headers:
+        return False
+    content_type = headers.get('Content-Type', '').lower()
+    if not content_type.startswith('text/html'):
+        return False
+    charset = content_type.partition('charset=')[2].strip(' "')
+    return not charset or charset in ('utf-8', 'utf8')
+
+
+def _etag_matches(request: HTTPServerRequest, etag: str) -> bool:
+    value = request.headers.get('If-None-Match', '')
+    return value.strip() == '*' or etag in (tag.strip() for tag in value.split(','))
+
+
+class HTMLTranslator:
+    """Shared state of the translating transform: encoded catalogs and cached bodies"""
+
+    def __init__(self, i18n: I18n, cache: Optional[TranslatedBodyCache] = None,
+                 max_lookahead: int = MAX_LOOKAHEAD):
+        self.i18n = i18n
+        self.cache = cache or TranslatedBodyCache()
+        self.max_lookahead = max_lookahead
+        self._tables: Dict[str, EncodedTranslations] = {}
+
+    def translations(self, translator: Translator) -> EncodedTranslations:
+        """Encoded translations of a translator's catalog, rebuilt after a reload"""
+        table = self._tables.get(translator.locale)
+        if table is None or table.catalog is not translator.catalog:
+            table = self._tables[translator.locale] = EncodedTranslations(translator)
+        return table
+
+    def transform(self, request: HTTPServerRequest) -> 'I18nTransform':
+        """Create the transform of one response; registered in ``app.transforms``"""
+        return I18nTransform(request, self)
+
+
+class I18nTransform(OutputTransform):
+    """Translate a text/html response chunk by chunk"""
+
+    def __init__(self, request: HTTPServerRequest, html_translator: HTMLTranslator):
+        self.request = request
+        self.html_translator = html_translator
+        self._stream: Optional[StreamTranslator] = None
+        # Body already sent in full (cached or 304); later chunks are dropped
+        self._done = False
+        self._cache_key: Optional[Tuple[str, str]] = None
+        self._catalog = None
+        self._parts: Optional[List[bytes]] = None
+
+    def transform_first_chunk(self, status_code: int, headers: HTTPHeaders, chunk: bytes,
+                              finishing: bool) -> Tuple[int, HTTPHeaders, bytes]:
+        request = self.request
+        # Pages rendered by the I18nTemplateLoader are translated already
+        if status_code != 200 or getattr(request, 'i18n_translated', False) \
+                or not _translatable(headers):
+            return status_code, headers, chunk
+
+        owner = self.html_translator
+        translator = getattr(request, 'i18n_translator', None)
+        if translator is None:
+            translator = owner.i18n.get_translator(request_locale(request, owner.i18n))
+        locale = translator.locale
+
+        headers['Content-Language'] = content_language(locale)
+        if getattr(request, 'i18n_locale', None) is None:
+            headers['Vary'] = merge_vary(headers.get('Vary', ''))
+
+        etag = headers.get('Etag', '')
+        if etag.startswith('"'):
+            # The body now differs per locale, and so must its ETag
+            etag = headers['Etag'] = f'{etag[:-1]}-{locale}"'
+            if _etag_matches(request, etag):
+                self._done = True
+                # Like RequestHandler.finish() for a 304: without a Content-Type,
+                # GZipContentEncoding later in app.transforms adds no gzip framing
+                for name in REPRESENTATION_HEADERS:
+                    headers.pop(name, None)
+                return 304, headers, b''
+
+            key = (locale, etag)
+            cached = owner.cache.get(key, translator.catalog)
+            if cached is not None:
+                self._done = True
+                headers['Content-Length'] = str(len(cached))
+                return status_code, headers, cached
+            # HEAD responses of static files have no body to cache
+            if request.method == 'GET' and owner.cache.wants(key):
+                self._cache_key = key
+                self._catalog = translator.catalog
+                self._parts = []
+
+        self._stream = StreamTranslator(owner.translations(translator).get, owner.max_lookahead)
+        chunk = self.transform_chunk(chunk, finishing)
+        if 'Content-Length' in headers:
+            if finishing and request.method != 'HEAD':
+                headers['Content-Length'] = str(len(chunk))
+            else:
+                del headers['Content-Length']
+        return status_code, headers, chunk
+
+    def transform_chunk(self, chunk: bytes, finishing: bool) -> bytes:
+        if self._done:
+            return b''
+        if self._stream is None:
+            return chunk
+        chunk = self._stream.feed(chunk, finishing)
+        if self._parts is not None:
+            self._parts.append(chunk)
+            if finishing:
+                body = b''.join(self._parts)
+                self.html_translator.cache.put(self._cache_key, self._catalog, body)
+                self._parts = None
+        return chunk
@@ -0,0 +1,87 @@
+"""
+Hot reload of translation catalogs
+"""
+
+import logging
+import os
+from typing import Dict, Optional, Tuple
+
+from tornado.ioloop import IOLoop, PeriodicCallback
+
+from .i18n import I18n
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogWatcher:
+    """Poll messages.json files on the IOLoop and hot-reload changed locales
+
+    Directory scans and catalog rebuilds run in the IOLoop's executor, so the
+    loop only compares a few stat results per tick. Changed catalogs are
+    published by ``I18n.reload`` with an atomic reference swap.
+    """
+
+    def __init__(self, i18n: I18n, interval: float = 2.0):
+        self.i18n = i18n
+        self.interval = interval
+        self._mtimes: Dict[str, Tuple[int, int]] = {}
+        self._callback: Optional[PeriodicCallback] = None
+        self._checking = False
+
+    def scan(self) -> Dict[str, Tuple[int, int]]:
+        """Get (mtime, size) of every locale's messages.json"""
+        mtimes = {}
+        locales_dir = self.i18n.locales_dir
+        if not locales_dir.is_dir():
+            return mtimes
+
+        for entry in os.scandir(locales_dir):
+            if not entry.is_dir():
+                continue
+            try:
+                stat = os.stat(os.path.join(entry.path, "messages.json"))
+            except OSError:
+                continue
+            mtimes[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        return mtimes
+
+    def start(self):
+        """Start polling on the current IOLoop"""
+        self._mtimes = self.scan()
+        self._callback = PeriodicCallback(self.check, self.interval * 1000)
+        self._callback.start()
+
+    def stop(self):
+        """Stop polling"""
+        if self._callback is not None:
+            self._callback.stop()
+            self._callback = None
+
+    async def check(self):
+        """Reload the locales whose messages.json changed since the last check"""
+        if self._checking:
+            return
+        self._checking = True
+        try:
+            io_loop = IOLoop.current()
+            mtimes = await io_loop.run_in_executor(None, self.scan)
+            changed = {
+                locale for locale in set(mtimes) | set(self._mtimes)
+                if mtimes.get(locale) != self._mtimes.get(locale)
+            }
+            if not changed:
+                return
+
+            try:
+                reloaded = await io_loop.run_in_executor(None, self.i18n.reload, changed)
+            except ValueError as e:
+                # Most likely a file caught mid-write; retry on the next tick
+                logger.warning("Failed to reload locales %s: %s", sorted(changed), e)
+                return
+
+            self._mtimes = mtimes
+            logger.info("Reloaded translations for %s", ", ".join(sorted(changed)))
+            if reloaded:
+                logger.debug("Swapped compiled catalogs: %s", ", ".join(reloaded))
+        finally:
+            self._checking = False
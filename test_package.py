@@ -57,8 +57,8 @@ def test_basic_functionality():
     # Test all translation keys
     print("\n--- Testing All Translation Keys ---")
     i18n.set_locale('zh_CN')
-    en_translations = i18n.translations.get('en_US', {})
-    zh_translations = i18n.translations.get('zh_CN', {})
+    en_translations = i18n.get_messages('en_US')
+    zh_translations = i18n.get_messages('zh_CN')
 
     print(f"  English keys: {len(en_translations)}")
     print(f"  Chinese keys: {len(zh_translations)}")
@@ -83,6 +83,1130 @@ def test_basic_functionality():
     print("=" * 60)
 
 
+def _write_locales(root, catalogs):
+    """Write a locales directory with one messages.json per locale"""
+    import json
+    for locale, messages in catalogs.items():
+        (root / locale).mkdir(parents=True)
+        with open(root / locale / 'messages.json', 'w', encoding='utf-8') as f:
+            json.dump(messages, f, ensure_ascii=False)
+
+
+def _serve_and_fetch(app, requests, **fetch_kwargs):
+    """Serve an app on a free port and fetch each path, or (path, headers) pair, in order"""
+    import asyncio
+    from tornado.httpclient import AsyncHTTPClient
+    from tornado.httpserver import HTTPServer
+    from tornado.testing import bind_unused_port
+
+    async def fetch_all():
+        sock, port = bind_unused_port()
+        server = HTTPServer(app)
+        server.add_sockets([sock])
+        client = AsyncHTTPClient(force_instance=True)
+        try:
+            responses = []
+            for request in requests:
+                path, headers = (request, {}) if isinstance(request, str) else request
+                responses.append(await client.fetch(
+                    f'http://127.0.0.1:{port}{path}', headers=headers, raise_error=False,
+                    **fetch_kwargs))
+            return responses
+        finally:
+            client.close()
+            server.stop()
+
+    return asyncio.run(fetch_all())
+
+
+def test_fallback_chain():
+    """Test compiled catalogs with configured fallback chains"""
+    print("\n--- Testing Fallback Chains ---")
+    import tempfile
+    from flower_i18n.i18n import I18n
+
+    with tempfile.TemporaryDirectory() as tmp:
+        _write_locales(Path(tmp), {
+            'en_US': {'nav.workers': 'Workers', 'nav.tasks': 'Tasks', 'nav.broker': 'Broker'},
+            'zh_Hant': {'nav.workers': '工作節點', 'nav.tasks': ''},
+            'zh': {'nav.tasks': '任务'},
+        })
+        i18n = I18n(fallbacks={'zh_TW': ['zh_Hant', 'zh']}, locales_dir=Path(tmp))
+        assert i18n.get_fallback_chain('zh_TW') == ['zh_TW', 'zh_Hant', 'zh', 'en_US']
+        assert i18n.get_fallback_chain('zh_Hant_HK') == ['zh_Hant_HK', 'zh_Hant', 'zh', 'en_US']
+
+        assert i18n.get('nav.workers', 'zh_TW') == '工作節點'
+        assert i18n.get('nav.tasks', 'zh_TW') == '任务'
+        assert i18n.get('nav.broker', 'zh_TW') == 'Broker'
+        assert i18n.get('nav.broker', 'xx_XX') == 'Broker'
+        assert i18n.get('missing.key', 'zh_TW') == 'missing.key'
+    print("  ✓ Fallback chains resolve correctly")
+
+
+def test_lazy_loading():
+    """Test on-demand catalog loading with bounded residency"""
+    print("\n--- Testing Lazy Loading ---")
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+    from flower_i18n.i18n import I18n
+
+    with tempfile.TemporaryDirectory() as tmp:
+        catalogs = {'en_US': {'common.total': 'Total'}}
+        for i in range(5):
+            catalogs[f'x{i}_XX'] = {'common.total': f'Total {i}'}
+        _write_locales(Path(tmp), catalogs)
+
+        i18n = I18n(max_resident=2, locales_dir=Path(tmp))
+        assert len(i18n.get_available_locales()) == 6
+        assert not i18n.translations, "Nothing should be loaded up front"
+
+        i18n.preload(['x0_XX', 'x1_XX'])
+        assert set(i18n.translations) == {'x0_XX', 'x1_XX'}
+
+        assert i18n.get('common.total', 'x2_XX') == 'Total 2'
+        assert set(i18n.translations) == {'x1_XX', 'x2_XX'}
+        assert i18n.get('common.total', 'x0_XX') == 'Total 0'
+        assert i18n.get('common.total', 'nope') == 'Total'
+        print("  ✓ Catalogs load on demand and evict least recently used")
+
+        i18n = I18n(max_resident=1, locales_dir=Path(tmp))
+        locales = [f'x{i}_XX' for i in range(5)]
+
+        def lookups(offset):
+            indexes = [(offset + n) % 5 for n in range(300)]
+            return [i18n.get('common.total', locales[i]) == f'Total {i}' for i in indexes]
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lookups, range(8)))
+        assert all(all(ok) for ok in results)
+        assert len([name for name in i18n._catalogs if name != 'en_US']) <= 1
+    print("  ✓ Concurrent lookups and evictions keep the LRU consistent")
+
+
+def test_negotiation():
+    """Test Accept-Language negotiation"""
+    print("\n--- Testing Accept-Language Negotiation ---")
+    from flower_i18n.negotiation import LocaleNegotiator, parse_accept_language
+
+    assert parse_accept_language('fr;q=0.5, zh-CN, de;q=0, en;q=0.8') == [
+        ('zh_cn', 1.0), ('en', 0.8), ('fr', 0.5)]
+
+    negotiator = LocaleNegotiator(['en_US', 'zh_CN', 'zh_TW'], 'en_US')
+    assert negotiator.negotiate('zh-CN,zh;q=0.9,en;q=0.8') == 'zh_CN'
+    assert negotiator.negotiate('zh-TW') == 'zh_TW'
+    assert negotiator.negotiate('zh-Hans-SG') == 'zh_CN'
+    assert negotiator.negotiate('fr-FR, en-GB;q=0.7') == 'en_US'
+    assert negotiator.negotiate('de, zh;q=0.1') == 'zh_CN'
+    assert negotiator.negotiate('de') == 'en_US'
+    assert negotiator.negotiate('') == 'en_US'
+
+    negotiator.negotiate('de')
+    assert negotiator.negotiate.cache_info().hits >= 1
+    print("  ✓ Negotiation honours q-values and prefixes")
+
+
+def test_handler_translator():
+    """Test that I18nHandler resolves the locale once per request"""
+    print("\n--- Testing Request-Scoped Translator ---")
+    from flower_i18n.i18n import I18nHandler
+
+    class FakeRequest:
+        headers = {'Accept-Language': 'zh-CN,zh;q=0.9'}
+
+    class FakeHandler(I18nHandler):
+        request = FakeRequest()
+        cookie_reads = 0
+
+        def get_cookie(self, name, default=None):
+            self.cookie_reads += 1
+            return default
+
+    handler = FakeHandler()
+    handler.bind_translator()
+    for _ in range(80):
+        assert handler._('nav.workers') == '工作进程'
+    assert handler.cookie_reads == 1
+    assert handler.locale_code == 'zh_CN'
+    print("  ✓ Locale resolved once per request")
+
+
+def test_context_locale():
+    """Test that the current locale is per context and translators are shared"""
+    print("\n--- Testing Context Locale ---")
+    import asyncio
+    import contextvars
+    from concurrent.futures import ThreadPoolExecutor
+    from flower_i18n.i18n import I18n
+
+    i18n = I18n()
+    translator = i18n.get_translator('zh_CN')
+    assert i18n.get_translator('zh_CN') is translator
+    try:
+        translator.locale = 'en_US'
+        raise AssertionError("Translators must be immutable")
+    except AttributeError:
+        pass
+
+    def translate_in(locale):
+        i18n.set_locale(locale)
+        return i18n.get('nav.tasks')
+
+    # Each context keeps its own locale, nothing leaks into the caller's
+    with ThreadPoolExecutor(4) as pool:
+        results = list(pool.map(
+            lambda locale: contextvars.copy_context().run(translate_in, locale),
+            ['zh_CN', 'en_US'] * 50))
+    assert results == ['任务', 'Tasks'] * 50
+    assert contextvars.copy_context().run(lambda: i18n.current_locale) == i18n.current_locale
+
+    async def request(locale):
+        with i18n.use_locale(locale):
+            await asyncio.sleep(0)
+            return i18n.get('nav.tasks')
+
+    async def requests():
+        return await asyncio.gather(*(request(locale) for locale in ['zh_CN', 'en_US'] * 5))
+
+    assert asyncio.run(requests()) == ['任务', 'Tasks'] * 5
+    print("  ✓ Concurrent tasks and threads never see each other's locale")
+
+
+def test_message_format():
+    """Test placeholders and plurals with cached per-(locale, key) formatters"""
+    print("\n--- Testing Message Format ---")
+    import tempfile
+    from flower_i18n.i18n import I18n
+
+    failed = '{count, plural, =0 {No failures} one {# task failed} other {# tasks failed}}'
+    with tempfile.TemporaryDirectory() as tmp:
+        _write_locales(Path(tmp), {
+            'en_US': {'tasks.failed': failed, 'broker.idle': 'Idle since {minutes} minutes'},
+            'zh_CN': {
+                'tasks.failed': '{count} 个任务失败',
+                'broker.idle': "空闲 {minutes} 分钟 '{'",
+            },
+            'ru_RU': {'tasks.failed': '{count, plural, one {# задача} few {# задачи} '
+                                      'many {# задач} other {# задачи}}'},
+        })
+        i18n = I18n(locales_dir=Path(tmp))
+        assert [i18n.get('tasks.failed', 'en_US', count=n) for n in (0, 1, 3)] == [
+            'No failures', '1 task failed', '3 tasks failed']
+        assert i18n.get('tasks.failed', 'zh_CN', count=3) == '3 个任务失败'
+        assert i18n.get('broker.idle', 'zh_CN', minutes=5) == '空闲 5 分钟 {'
+        assert [i18n.get('tasks.failed', 'ru_RU', count=n) for n in (1, 3, 5, 21)] == [
+            '1 задача', '3 задачи', '5 задач', '21 задача']
+        assert i18n.get('tasks.failed', 'en_US') == failed
+        assert i18n.get('no.such.key', 'en_US', count=1) == 'no.such.key'
+
+        translator = i18n.get_translator('en_US')
+        assert translator('broker.idle', minutes=2) == 'Idle since 2 minutes'
+        formatter = translator._formatters['broker.idle']
+        translator('broker.idle', minutes=3)
+        assert translator._formatters['broker.idle'] is formatter
+
+        assert i18n.get('tasks.failed', 'en_US', count='3') == '3 tasks failed'
+        assert i18n.get('tasks.failed', 'en_US', count='1') == '1 task failed'
+        try:
+            i18n.get('tasks.failed', 'en_US', count='many')
+        except ValueError as e:
+            assert "'count'" in str(e), e
+        else:
+            raise AssertionError("Non-numeric plural arguments must be rejected")
+    print("  ✓ Messages are parsed once and rendered with plural rules")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        _write_locales(Path(tmp), {
+            'en_US': {'tasks.count': '{count, plural, one {# task} other {# tasks}}'},
+            'zh_CN': {'nav.tasks': '任务'},
+        })
+        I18n(locales_dir=Path(tmp), catalog_format='json').compile_catalogs()
+        for catalog_format in ('json', 'compact', 'auto'):
+            i18n = I18n(locales_dir=Path(tmp), catalog_format=catalog_format)
+            assert i18n.get_translator('zh_CN').sources == {'tasks.count': 'en_US'}
+            assert i18n.get('tasks.count', 'zh_CN', count=1) == '1 task', catalog_format
+    print("  ✓ Fallback messages use the plural rules of their own locale")
+
+
+def test_metrics():
+    """Test translation counters and their Prometheus export"""
+    print("\n--- Testing Metrics ---")
+    from flower_i18n.i18n import I18n
+    from flower_i18n.metrics import OTHER, BoundedCounter, WarningLimiter, register_collector
+
+    i18n = I18n()
+    assert 'get' not in vars(i18n), "Disabled metrics must not wrap lookups"
+    metrics = i18n.enable_metrics()
+    assert i18n.get('nav.tasks', 'zh_CN') == '任务'
+    assert i18n.get('nav.tasks', 'de_DE') == 'Tasks'
+    assert i18n.get('no.such.key', 'zh_CN') == 'no.such.key'
+    assert i18n.get_translator('zh_CN')('no.such.key') == 'no.such.key'
+    assert metrics.lookups == {'zh_CN': 3, 'de_DE': 1}
+    assert metrics.fallbacks == {'de_DE': 1}
+    assert metrics.missing == {('zh_CN', 'no.such.key'): 2}
+
+    counter = BoundedCounter(2)
+    for label in 'abcd':
+        counter.add(label)
+    assert counter == {'a': 1, 'b': 1, OTHER: 2}
+
+    limiter = WarningLimiter(rate=2, per=60)
+    assert [limiter.allow()[0] for _ in range(4)] == [True, True, False, False]
+
+    try:
+        from prometheus_client import CollectorRegistry, generate_latest
+    except ImportError:
+        print("  ⚠ Prometheus export skipped (prometheus_client not installed)")
+    else:
+        registry = CollectorRegistry()
+        register_collector(metrics, registry)
+        text = generate_latest(registry).decode()
+        assert 'flower_i18n_lookups_total{locale="zh_CN"} 3.0' in text, text
+
+    i18n.disable_metrics()
+    assert 'get' not in vars(i18n)
+    print("  ✓ Lookups, fallbacks and missing keys are counted when enabled")
+
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        _write_locales(Path(tmp), {
+            'en_US': {'nav.tasks': 'Tasks', 'nav.broker': 'Broker'},
+            'zh_CN': {'nav.tasks': '任务', 'nav.broker': ''},
+        })
+        for catalog_format in ('json', 'compact'):
+            i18n = I18n(locales_dir=Path(tmp), catalog_format=catalog_format)
+            metrics = i18n.enable_metrics()
+            assert i18n.get('nav.tasks', 'zh_CN') == '任务'
+            assert i18n.get('nav.broker', 'zh_CN') == 'Broker'
+            assert i18n.get_translator('zh_CN')('nav.broker') == 'Broker'
+            assert i18n.get('nav.broker', 'en_US') == 'Broker'
+            assert metrics.fallbacks == {'zh_CN': 2}, (catalog_format, metrics.fallbacks)
+
+        i18n = I18n(locales_dir=Path(tmp))
+        metrics = i18n.enable_metrics()
+        column = ['nav.tasks', 'nav.broker', 'nav.broker', 'no.such.key']
+        assert i18n.translate_many(column, 'zh_CN') == ['任务', 'Broker', 'Broker', 'no.such.key']
+        assert i18n.translate_many(iter(['nav.tasks']), 'de_DE') == ['Tasks']
+        assert metrics.lookups == {'zh_CN': 4, 'de_DE': 1}
+        assert metrics.fallbacks == {'zh_CN': 2, 'de_DE': 1}
+        assert metrics.missing == {('zh_CN', 'no.such.key'): 1}
+    print("  ✓ Keys served by a fallback locale are counted")
+    print("  ✓ Batched feed lookups are counted like single ones")
+
+
+def test_feed_labels():
+    """Test batch translation and localized labels in the JSON feeds"""
+    print("\n--- Testing Feed Labels ---")
+    import json
+    from unittest import mock
+    import tornado.web
+    from tornado.httputil import HTTPHeaders, HTTPServerRequest
+    from flower_i18n.bundle import build_bundle
+    from flower_i18n.feeds import LABEL_SUFFIX, localize_feeds
+    from flower_i18n.i18n import get_i18n
+
+    i18n = get_i18n()
+    states = ['state.success', 'state.failure'] * 3000
+    translated = i18n.translate_many(states, 'zh_CN')
+    assert translated[:2] == ['成功', '失败'] and len(translated) == 6000
+
+    class TasksDataTable(tornado.web.RequestHandler):
+        pass
+
+    app = tornado.web.Application([(r'/tasks/datatable', TasksDataTable)])
+    localize_feeds(app)
+    request = HTTPServerRequest(
+        method='GET', uri='/tasks/datatable', connection=mock.Mock(),
+        headers=HTTPHeaders({'Accept-Language': 'zh-CN'}))
+    handler = app.wildcard_router.rules[0].target(app, request)
+    handler.write({'data': [{'state': 'SUCCESS'}, {'state': 'CUSTOM'}, {'uuid': 'x'}]})
+    rows = json.loads(b''.join(handler._write_buffer))['data']
+    assert rows[0] == {'state': 'SUCCESS', 'state_label': '成功'}
+    assert rows[1]['state_label'] == 'CUSTOM' and 'state_label' not in rows[2]
+    print("  ✓ Feed rows carry labels translated once per distinct value")
+
+    # Timestamps follow Celery's timezone, like Flower's tasks page
+    app.capp = mock.Mock(conf=mock.Mock(timezone='Asia/Shanghai'))
+    handler = app.wildcard_router.rules[0].target(app, request)
+    handler.write({'data': [{'received': 0.0, 'runtime': 2.5}]})
+    row = json.loads(b''.join(handler._write_buffer))['data'][0]
+    assert row['received_label'] == '1970/01/01 08:00:00' and row['runtime_label'] == '2.50秒'
+
+    runtime = build_bundle().files['i18n.js'].decode('utf-8')
+    assert f"const LABEL_SUFFIX = '{LABEL_SUFFIX}';" in runtime and 'applyRowLabels' in runtime
+    print("  ✓ Formatted columns use the feed's time zone and are shown by i18n.js")
+
+
+def test_formatting():
+    """Test cached locale formatters and their column APIs"""
+    print("\n--- Testing Formatting ---")
+    import calendar
+    import os
+    import time
+    from datetime import timedelta, timezone
+    from flower_i18n.feeds import FEED_FORMATS
+    from flower_i18n.formatting import format_columns, get_formatter
+    from flower_i18n.i18n import get_i18n
+
+    zh = get_i18n().get_formatter('zh_CN')
+    assert zh is get_formatter('zh_CN') and get_i18n().get_formatter('xx_XX').locale == 'en_US'
+    assert zh.format_integers([1200, None, 35000.0]) == ['1,200', '', '35,000']
+    assert zh.format_durations([0.042, 3.5, 3725]) == ['42毫秒', '3.50秒', '1小时2分5秒']
+    print("  ✓ Formatters are shared per locale")
+
+    de = get_formatter('de_DE')
+    assert de.format_integer(1234567) == '1.234.567'
+    assert de.format_decimals([1234.5, 0.25], digits=2) == ['1.234,50', '0,25']
+    assert get_formatter('en_US').format_duration(7265.5) == '2 h 1 min 5 s'
+    print("  ✓ Separators and units follow the locale")
+
+    # The server's own time zone must not matter
+    saved_tz = os.environ.get('TZ')
+    os.environ['TZ'] = 'Asia/Tokyo'
+    time.tzset()
+    try:
+        epoch = calendar.timegm((2024, 3, 5, 14, 7, 9, 0, 0, 0))
+        expected = ['2024/03/05 14:07:09'] * 2 + ['']
+        assert zh.format_timestamps([epoch, epoch + 0.5, None]) == expected
+        assert get_formatter('en_US').format_timestamp(epoch) == '03/05/2024, 02:07:09 PM'
+        assert de.format_timestamp(0) == '01.01.1970, 00:00:00'
+        plus_two = timezone(timedelta(hours=2))
+        assert de.format_timestamp(0, plus_two) == '01.01.1970, 02:00:00'
+
+        rows = [{'runtime': 0.5, 'received': epoch}, {'runtime': None}, {'uuid': 'x'}]
+        format_columns(rows, FEED_FORMATS['TasksDataTable'], zh, '_label')
+        assert rows[0]['runtime_label'] == '500毫秒' and rows[1]['runtime_label'] == ''
+        assert rows[0]['received_label'] == '2024/03/05 14:07:09'
+        assert 'runtime_label' not in rows[2]
+        format_columns(rows, FEED_FORMATS['TasksDataTable'], zh, '_label', plus_two)
+        assert rows[0]['received_label'] == '2024/03/05 16:07:09'
+    finally:
+        if saved_tz is None:
+            os.environ.pop('TZ', None)
+        else:
+            os.environ['TZ'] = saved_tz
+        time.tzset()
+    print("  ✓ Timestamps and feed columns are formatted in one pass, in UTC by default")
+
+
+def test_locale_urls():
+    """Test locale-in-URL routing, canonical redirects and cache headers"""
+    print("\n--- Testing Locale URLs ---")
+    import tempfile
+    import tornado.web
+    from flower_i18n.i18n import setup_i18n
+    from flower_i18n.routing import locale_url, merge_vary
+
+    assert locale_url('/flower/tasks?x=1', 'zh_CN', 'path', '/flower') == '/flower/zh_CN/tasks?x=1'
+    assert locale_url('/tasks?lang=en_US&x=1', 'zh_CN', 'query') == '/tasks?x=1&lang=zh_CN'
+    assert merge_vary('') == 'Cookie, Accept-Language'
+    assert merge_vary('accept-encoding, cookie') == 'accept-encoding, cookie, Accept-Language'
+    assert merge_vary('Cookie, Accept-Language') == 'Cookie, Accept-Language'
+    assert merge_vary('*') == '*'
+
+    class TasksView(tornado.web.RequestHandler):
+        def get(self):
+            self.render('tasks.html')
+
+    class TasksAPI(tornado.web.RequestHandler):
+        def get(self):
+            self.write({'locale': self.locale_code})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        (Path(tmp) / 'tasks.html').write_text(
+            "{{ locale_code }} {{ reverse_url('tasks') }} {{ request.path }}", encoding='utf-8')
+
+        def fetch_all(mode, requests, **settings):
+            app = tornado.web.Application([
+                tornado.web.url(r'/tasks', TasksView, name='tasks'), (r'/api/tasks', TasksAPI),
+            ], template_path=tmp)
+            setup_i18n(app, locale_urls=mode, **settings)
+            return _serve_and_fetch(app, requests, follow_redirects=False)
+
+        page = {'Accept': 'text/html', 'Cookie': 'flower_locale=zh_CN'}
+        negotiated, respelled, localized, xhr, api = fetch_all('path', [
+            ('/tasks?x=1', page), '/zh-cn/tasks', ('/zh_CN/tasks', page),
+            ('/tasks', {'Accept': 'application/json', 'Accept-Language': 'zh-CN'}),
+            ('/api/tasks', page),
+        ], translate_responses=True)
+        assert negotiated.code == 302 and negotiated.headers['Location'] == '/zh_CN/tasks?x=1'
+        assert negotiated.headers['Vary'] == 'Cookie, Accept-Language'
+        assert respelled.code == 301 and respelled.headers['Location'] == '/zh_CN/tasks'
+        assert localized.body == b'zh_CN /zh_CN/tasks /tasks'
+        assert localized.headers['Content-Language'] == 'zh-CN' and 'Vary' not in localized.headers
+        # Translated by the response transform without repeating the Vary tokens
+        assert xhr.code == 200 and xhr.headers['Vary'] == 'Cookie, Accept-Language'
+        print("  ✓ Path mode redirects to canonical /<locale>/ URLs")
+
+        assert api.code == 200 and api.body == b'{"locale": "zh_CN"}'
+        assert api.headers['Vary'] == 'Cookie, Accept-Language'
+        print("  ✓ Only rendered pages are redirected, not API responses")
+
+        negotiated, respelled, localized = fetch_all('query', [
+            ('/tasks', page), '/tasks?lang=zh-cn', '/tasks?lang=zh_CN',
+        ])
+        assert negotiated.headers['Location'] == '/tasks?lang=zh_CN'
+        assert respelled.code == 301 and respelled.headers['Location'] == '/tasks?lang=zh_CN'
+        assert localized.body == b'zh_CN /tasks?lang=zh_CN /tasks'
+    print("  ✓ Query mode normalizes ?lang= to one canonical form")
+
+
+def test_response_transform():
+    """Test streaming translation of HTML responses and the per-locale body cache"""
+    print("\n--- Testing Response Transform ---")
+    import tempfile
+    import tornado.web
+    from flower_i18n.i18n import get_i18n, setup_i18n
+    from flower_i18n.transform import HTMLTranslator, StreamTranslator
+
+    table = HTMLTranslator(get_i18n()).translations(get_i18n().get_translator('zh_CN'))
+    page = ('<ul>' + '<li><a data-i18n="nav.tasks" href="#"> Tasks </a></li>'
+            '<th data-i18n="no.such.key">Raw</th><p data-i18n="nav.broker">\n</p>' * 50
+            + '</ul>').encode()
+    expected = StreamTranslator(table.get).feed(page, finishing=True)
+    assert b'<a data-i18n="nav.tasks" href="#"> \xe4' in expected and b'>Raw<' in expected
+    for size in (1, 7, 64, 1000):
+        stream = StreamTranslator(table.get, max_lookahead=4096)
+        chunks = [page[i:i + size] for i in range(0, len(page), size)]
+        out = b''.join(stream.feed(chunk) for chunk in chunks) + stream.feed(b'', finishing=True)
+        assert out == expected, size
+    print("  ✓ Chunk boundaries do not change the translation")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        (Path(tmp) / 'help.html').write_bytes(
+            b'<html><h1 data-i18n="nav.workers">Workers</h1></html>')
+
+        class PluginView(tornado.web.RequestHandler):
+            async def get(self):
+                self.set_header('Content-Type', 'text/html; charset=UTF-8')
+                for _ in range(3):
+                    self.write('<span data-i18n="nav.tasks">Tas')
+                    await self.flush()
+                    self.write('ks</span>')
+                self.finish()
+
+        def fetch_all(requests, **settings):
+            app = tornado.web.Application([
+                (r'/plugin', PluginView),
+                (r'/docs/(.*)', tornado.web.StaticFileHandler, {'path': tmp}),
+            ], **settings)
+            setup_i18n(app, translate_responses=True)
+            return _serve_and_fetch(app, requests)
+
+        zh = {'Accept-Language': 'zh-CN'}
+        plugin, first, second, third, english = fetch_all([
+            ('/plugin', zh), ('/docs/help.html', zh), ('/docs/help.html', zh),
+            ('/docs/help.html', zh), '/docs/help.html',
+        ])
+        assert plugin.body.decode() == '<span data-i18n="nav.tasks">任务</span>' * 3
+        assert plugin.headers['Content-Language'] == 'zh-CN'
+        assert 'Accept-Language' in plugin.headers['Vary']
+        print("  ✓ Streamed responses from unpatched handlers are translated")
+
+        assert first.body == second.body == third.body
+        assert third.body.decode() == '<html><h1 data-i18n="nav.workers">工作进程</h1></html>'
+        assert int(third.headers['Content-Length']) == len(third.body)
+        assert third.headers['Etag'].endswith('-zh_CN"')
+        assert english.body.endswith(b'>Workers</h1></html>')
+        not_modified, = fetch_all([
+            ('/docs/help.html', dict(zh, **{'If-None-Match': third.headers['Etag']}))])
+        assert not_modified.code == 304
+        print("  ✓ Static bodies are cached per locale with per-locale ETags")
+
+        gzip = dict(zh, **{'Accept-Encoding': 'gzip'})
+        compressed, not_modified = fetch_all([
+            ('/docs/help.html', gzip),
+            ('/docs/help.html', dict(gzip, **{'If-None-Match': third.headers['Etag']})),
+        ], compress_response=True)
+        assert compressed.body == third.body
+        assert not_modified.code == 304 and not_modified.body == b''
+        print("  ✓ 304 responses carry no body with compress_response")
+
+
+def test_template_loader():
+    """Test in-memory rewriting and translation of templates"""
+    print("\n--- Testing Template Loader ---")
+    import tempfile
+    from flower_i18n.loader import I18nTemplateLoader
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(Path(tmp) / 'broker.html', 'w', encoding='utf-8') as f:
+            f.write('<table><tr><th>Queue</th><th>{{ name }}</th></tr></table>')
+
+        loader = I18nTemplateLoader(tmp)
+        zh = loader.load('broker.html', 'zh_CN').generate(name='x').decode()
+        en = loader.load('broker.html', 'en_US').generate(name='x').decode()
+        assert '<th data-i18n="broker.queue">队列</th><th>x</th>' in zh, zh
+        assert '<th data-i18n="broker.queue">Queue</th>' in en, en
+        assert loader.load('broker.html', 'zh_CN') is loader.load('broker.html', 'zh_CN')
+    print("  ✓ Templates are translated and cached per locale")
+
+
+def test_server_rendering():
+    """Test pages rendered translated by setup_i18n(render_templates=True)"""
+    print("\n--- Testing Server Rendering ---")
+    import json
+    import logging
+    import tempfile
+    import tornado.web
+    from flower_i18n.i18n import setup_i18n
+
+    class PageView(tornado.web.RequestHandler):
+        def get(self):
+            self.render('page.html')
+
+    class FragmentView(tornado.web.RequestHandler):
+        def get(self):
+            fragment = self.render_string('fragment.html').decode()
+            self.write({'html': fragment,
+                        'translated': getattr(self.request, 'i18n_translated', False)})
+
+    class PluginView(tornado.web.RequestHandler):
+        def get_template_path(self):
+            return self.settings['plugin_templates']
+
+        def get(self):
+            self.render('page.html')
+
+    class Errors(logging.Handler):
+        def __init__(self):
+            super().__init__(logging.ERROR)
+            self.messages = []
+
+        def emit(self, record):
+            self.messages.append(record.getMessage())
+
+    def fetch_all(app, paths):
+        return _serve_and_fetch(app, [(path, {'Accept-Language': 'zh-CN'}) for path in paths])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        (Path(tmp) / 'templates').mkdir()
+        (Path(tmp) / 'static').mkdir()
+        (Path(tmp) / 'plugin').mkdir()
+        (Path(tmp) / 'templates' / 'page.html').write_text(
+            '<script src="{{ static_url(\'js/i18n.js\') }}"></script>', encoding='utf-8')
+        (Path(tmp) / 'templates' / 'fragment.html').write_text(
+            '<b data-i18n="nav.tasks">Tasks</b>', encoding='utf-8')
+        (Path(tmp) / 'plugin' / 'page.html').write_text('<p>plugin</p>', encoding='utf-8')
+        app = tornado.web.Application([
+            (r'/page', PageView), (r'/fragment', FragmentView), (r'/plugin', PluginView),
+        ], template_path=str(Path(tmp) / 'templates'), static_path=str(Path(tmp) / 'static'),
+            plugin_templates=str(Path(tmp) / 'plugin'))
+        setup_i18n(app, render_templates=True)
+        version = app.settings['i18n_static_bundle'].version('i18n.js')
+
+        errors = Errors()
+        logging.getLogger('tornado').addHandler(errors)
+        try:
+            page, = fetch_all(app, ['/page'])
+            script, = fetch_all(app, [f'/static/js/i18n.js?v={version}'])
+        finally:
+            logging.getLogger('tornado').removeHandler(errors)
+        assert page.body.decode() == f'<script src="/static/js/i18n.js?v={version}"></script>'
+        assert script.code == 200 and b'FlowerI18n' in script.body
+        assert not errors.messages, errors.messages
+        print("  ✓ The in-memory i18n.js is linked by its content hash")
+
+        fragment, plugin = fetch_all(app, ['/fragment', '/plugin'])
+        assert json.loads(fragment.body) == {'html': '<b data-i18n="nav.tasks">任务</b>',
+                                             'translated': False}
+        assert plugin.body == b'<p>plugin</p>'
+    print("  ✓ Only pages from the app's template directory are rendered in memory")
+
+
+def test_static_bundle():
+    """Test generation of the per-locale catalog bundles"""
+    print("\n--- Testing Static Bundle ---")
+    import json
+    import tempfile
+    from flower_i18n.bundle import MANIFEST_PLACEHOLDER, build_bundle, content_hash
+    from flower_i18n.i18n import get_i18n
+
+    bundle = build_bundle()
+    entry = bundle.manifest['zh_CN']
+    assert entry['name'] == '中文'
+    assert entry['hash'] in entry['file']
+    assert b'registerCatalog("zh_CN"' in bundle.files[entry['file']]
+    assert entry['file'].encode() in bundle.files['i18n.js']
+    assert b"'en_US': {" not in bundle.files['i18n.js'], "Tables must not be inlined"
+
+    # The manifest the runtime loads catalogs from is the bundle's own
+    runtime = bundle.files['i18n.js'].decode('utf-8')
+    assert MANIFEST_PLACEHOLDER not in runtime
+    embedded = runtime.split('const manifest = ', 1)[1]
+    assert json.JSONDecoder().raw_decode(embedded)[0] == bundle.manifest
+    for locale, entry in bundle.manifest.items():
+        data = bundle.files[entry['file']]
+        assert content_hash(data) == entry['hash']
+        prefix = f'window.FlowerI18n.registerCatalog("{locale}",'.encode()
+        assert data.startswith(prefix) and data.endswith(b');')
+        assert json.loads(data[len(prefix):-2]) == dict(get_i18n().get_catalog(locale))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        written = bundle.write(Path(tmp))
+        assert Path(tmp) / (entry['file'] + '.gz') in written
+    print("  ✓ One hashed catalog per locale")
+
+
+# Runs the generated i18n.js in jsdom; argv[1] is the runtime's path
+DOM_TRANSLATION_SCRIPT = r"""
+const assert = require('assert');
+const fs = require('fs');
+const { JSDOM } = require('jsdom');
+
+const dom = new JSDOM(
+    '<table><thead><tr><th data-i18n="tasks.name">Name</th></tr></thead><tbody></tbody></table>' +
+    '<input data-i18n-placeholder="common.search">',
+    { runScripts: 'outside-only', pretendToBeVisual: true });
+const { window } = dom;
+const { document } = window;
+const frame = () => new Promise(
+    resolve => window.requestAnimationFrame(() => setTimeout(resolve, 0)));
+
+(async () => {
+    window.eval(fs.readFileSync(process.argv[1], 'utf8'));
+    const i18n = window.FlowerI18n;
+    i18n.registerCatalog('zh_CN', {
+        'tasks.name': '名称', 'tasks.state': '状态', 'common.search': '搜索',
+    });
+    i18n.switchLanguage('zh_CN');
+    await frame();
+    assert.strictEqual(document.querySelector('th').textContent, '名称');
+    assert.strictEqual(document.querySelector('input').placeholder, '搜索');
+
+    // Rows rendered later are translated on the next frame, already
+    // translated nodes are left alone
+    let rewrites = 0;
+    new window.MutationObserver(records => { rewrites += records.length; })
+        .observe(document.querySelector('th'), { childList: true });
+    document.querySelector('tbody').insertAdjacentHTML('beforeend',
+        '<tr><td data-i18n="tasks.state" title="x" data-i18n-title="tasks.name">State</td></tr>');
+    await frame();
+    const cell = document.querySelector('td');
+    assert.strictEqual(cell.textContent, '状态');
+    assert.strictEqual(cell.title, '名称');
+    assert.strictEqual(rewrites, 0);
+    console.log('ok');
+})().catch(error => { console.error(error); process.exit(1); });
+"""
+
+
+# Runs the generated i18n.js against a minimal stand-in DOM, so the batching
+# logic is exercised wherever node is installed; argv[1] is the runtime's path
+MUTATION_BATCHING_SCRIPT = r"""
+const assert = require('assert');
+const fs = require('fs');
+
+let writes = 0;
+class Element {
+    constructor(attributes, text, children = []) {
+        this.nodeType = 1;
+        this.isConnected = true;
+        this.attributes = attributes;
+        this.text = text;
+        this.children = children;
+    }
+    getAttribute(name) { return name in this.attributes ? this.attributes[name] : null; }
+    setAttribute(name, value) { this.attributes[name] = value; writes++; }
+    get textContent() { return this.text; }
+    set textContent(value) { this.text = value; writes++; }
+    // Selectors are lists of [attribute] tests
+    matches(selector) {
+        return selector.split(',').some(test => test.slice(1, -1) in this.attributes);
+    }
+    querySelectorAll(selector) {
+        const found = [];
+        const walk = element => element.children.forEach(child => {
+            if (child.matches(selector)) found.push(child);
+            walk(child);
+        });
+        walk(this);
+        return found;
+    }
+}
+
+const header = new Element({'data-i18n': 'tasks.name'}, 'Name');
+const root = new Element({}, '', [header]);
+const frames = [];
+let observer = null;
+global.MutationObserver = class {
+    constructor(callback) { observer = this; this.callback = callback; }
+    observe() {}
+    disconnect() {}
+};
+global.window = {
+    location: {search: '', pathname: '/tasks', href: 'http://flower/tasks'},
+    requestAnimationFrame: callback => frames.push(callback),
+};
+global.document = {
+    readyState: 'complete', cookie: 'flower_locale=zh_CN', currentScript: null,
+    body: root, documentElement: root,
+    getElementById: () => null, querySelector: () => null, querySelectorAll: () => [],
+    createElement: () => ({}),
+    head: {appendChild(tag) {
+        window.FlowerI18n.registerCatalog('zh_CN', {
+            'tasks.name': '名称', 'tasks.state': '状态', 'common.search': '搜索',
+        });
+        setTimeout(tag.onload, 0);
+    }},
+};
+
+(async () => {
+    eval(fs.readFileSync(process.argv[1], 'utf8'));
+    await new Promise(resolve => setTimeout(resolve, 10));
+    assert.strictEqual(header.textContent, '名称');
+    assert.ok(observer, 'The runtime must observe the document');
+
+    // Three subtrees added at once: one frame, no writes before it runs,
+    // and no write for the element that is already translated
+    const cell = new Element(
+        {'data-i18n': 'tasks.state', 'data-i18n-title': 'tasks.name'}, 'State');
+    const row = new Element({}, '', [cell]);
+    const search = new Element({'data-i18n-placeholder': 'common.search'}, '');
+    const done = new Element({'data-i18n': 'tasks.name'}, '名称');
+    writes = 0;
+    observer.callback([{type: 'childList', addedNodes: [row, search]},
+                       {type: 'childList', addedNodes: [done]}]);
+    assert.strictEqual(frames.length, 1);
+    assert.strictEqual(writes, 0);
+    frames.shift()();
+    assert.strictEqual(cell.textContent, '状态');
+    assert.strictEqual(cell.getAttribute('title'), '名称');
+    assert.strictEqual(search.getAttribute('placeholder'), '搜索');
+    assert.strictEqual(writes, 3);
+
+    // Nothing changed: the next batch writes nothing
+    writes = 0;
+    observer.callback([{type: 'attributes', target: row}]);
+    assert.strictEqual(frames.length, 1);
+    frames.shift()();
+    assert.strictEqual(writes, 0);
+    console.log('ok');
+})().catch(error => { console.error(error); process.exit(1); });
+"""
+
+
+def test_mutation_batching():
+    """Test that the runtime batches translation of added content per animation frame"""
+    print("\n--- Testing Mutation Batching ---")
+    import shutil
+    import subprocess
+    import tempfile
+    from flower_i18n.bundle import build_bundle
+
+    node = shutil.which('node')
+    if node is None:
+        print("  ⚠ Mutation batching test skipped (node not installed)")
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        runtime = Path(tmp) / 'i18n.js'
+        runtime.write_bytes(build_bundle().files['i18n.js'])
+        result = subprocess.run(
+            [node, '-e', MUTATION_BATCHING_SCRIPT, '--', str(runtime)],
+            capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    print("  ✓ Added subtrees are translated in one frame, skipping correct ones")
+
+
+def test_dom_translation():
+    """Test incremental translation of dynamic content under node and jsdom"""
+    print("\n--- Testing DOM Translation ---")
+    import shutil
+    import subprocess
+    import tempfile
+    from flower_i18n.bundle import build_bundle
+
+    node = shutil.which('node')
+    if node is None or subprocess.run(
+            [node, '-e', "require.resolve('jsdom')"], capture_output=True).returncode:
+        print("  ⚠ DOM translation test skipped (node or jsdom not installed)")
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        runtime = Path(tmp) / 'i18n.js'
+        runtime.write_bytes(build_bundle().files['i18n.js'])
+        result = subprocess.run(
+            [node, '-e', DOM_TRANSLATION_SCRIPT, '--', str(runtime)],
+            capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    print("  ✓ Added subtrees are translated once per animation frame")
+
+
+def test_catalog_cache():
+    """Test serialized catalog slices served by the catalog endpoint"""
+    print("\n--- Testing Catalog Cache ---")
+    import gzip
+    import json
+    import tornado.web
+    from flower_i18n.handlers import CatalogCache
+    from flower_i18n.i18n import get_i18n, setup_i18n
+
+    cache = CatalogCache(get_i18n())
+    entry = cache.get('zh_CN', ('common', 'tasks'))
+    keys = json.loads(entry.body)
+    assert keys and all(k.startswith(('common.', 'tasks.')) for k in keys)
+    assert cache.get('zh_CN', ('common', 'tasks')) is entry
+    assert cache.get('zh_CN').etag != entry.etag
+    assert json.loads(cache.get('zh_CN', ()).body) == {}
+    print("  ✓ Catalog slices are serialized once per locale and namespace")
+
+    app = tornado.web.Application([])
+    setup_i18n(app)
+    url = '/i18n/catalog/zh_CN.json'
+    full, compressed, sliced, unknown, empty, invalid = _serve_and_fetch(app, [
+        url, (url, {'Accept-Encoding': 'gzip'}), f'{url}?ns=tasks,common',
+        f'{url}?ns=no_such_ns', f'{url}?ns=', f'{url}?ns=../tasks',
+    ], decompress_response=False)
+    not_modified, = _serve_and_fetch(app, [(url, {'If-None-Match': full.headers['Etag']})])
+    assert full.code == 200 and json.loads(full.body) == dict(get_i18n().get_catalog('zh_CN'))
+    assert not_modified.code == 304 and not_modified.body == b''
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert compressed.headers['Vary'] == 'Accept-Encoding'
+    assert gzip.decompress(compressed.body) == full.body
+    assert 'Content-Encoding' not in full.headers
+    assert json.loads(sliced.body) == keys
+    assert json.loads(unknown.body) == {} and json.loads(empty.body) == {}
+    assert invalid.code == 400
+    print("  ✓ The endpoint revalidates, precompresses and filters by ?ns=")
+
+
+def test_hot_reload():
+    """Test reloading changed catalogs with an atomic swap"""
+    print("\n--- Testing Hot Reload ---")
+    import asyncio
+    import json
+    import os
+    import tempfile
+    from flower_i18n.i18n import I18n
+    from flower_i18n.watcher import CatalogWatcher
+
+    with tempfile.TemporaryDirectory() as tmp:
+        _write_locales(Path(tmp), {
+            'en_US': {'nav.tasks': 'Tasks'},
+            'zh_CN': {'nav.tasks': '任务'},
+        })
+        i18n = I18n(locales_dir=Path(tmp))
+        old_catalog = i18n.get_catalog('zh_CN')
+        watcher = CatalogWatcher(i18n)
+        watcher._mtimes = watcher.scan()
+
+        messages_file = Path(tmp) / 'zh_CN' / 'messages.json'
+        with open(messages_file, 'w', encoding='utf-8') as f:
+            json.dump({'nav.tasks': '任务列表'}, f, ensure_ascii=False)
+        os.utime(messages_file, ns=(0, 0))
+
+        asyncio.run(watcher.check())
+        assert i18n.get('nav.tasks', 'zh_CN') == '任务列表'
+        assert old_catalog['nav.tasks'] == '任务', "Published catalogs must not be mutated"
+    print("  ✓ Changed catalogs are reloaded without a restart")
+
+
+def test_binary_catalogs():
+    """Test compiled, memory-mapped catalogs"""
+    print("\n--- Testing Binary Catalogs ---")
+    import os
+    import tempfile
+    from flower_i18n.binary import BinaryCatalog
+    from flower_i18n.i18n import I18n
+
+    with tempfile.TemporaryDirectory() as tmp:
+        _write_locales(Path(tmp), {
+            'en_US': {'nav.tasks': 'Tasks', 'nav.broker': 'Broker'},
+            'zh_CN': {'nav.tasks': '任务'},
+        })
+        I18n(locales_dir=Path(tmp), catalog_format='json').compile_catalogs()
+
+        i18n = I18n(locales_dir=Path(tmp))
+        catalog = i18n.get_catalog('zh_CN')
+        assert isinstance(catalog, BinaryCatalog)
+        assert dict(catalog) == {'nav.tasks': '任务', 'nav.broker': 'Broker'}
+        assert i18n.get('nav.tasks', 'zh_CN') == '任务'
+        assert i18n.get('missing.key', 'zh_CN') == 'missing.key'
+        assert not i18n.translations, "No JSON should be parsed"
+
+        # Truncated or corrupt files fall back to the JSON sources
+        compiled = Path(tmp) / 'zh_CN' / 'messages.bin'
+        data = compiled.read_bytes()
+        for truncated in (b'FI18', data[:60], data[:-1]):
+            compiled.write_bytes(truncated)
+            i18n = I18n(locales_dir=Path(tmp))
+            assert i18n.get('nav.tasks', 'zh_CN') == '任务'
+            assert isinstance(i18n.get_catalog('zh_CN'), dict)
+        compiled.write_bytes(data)
+
+        # Editing a source makes the compiled file stale
+        future = os.stat(Path(tmp) / 'zh_CN' / 'messages.bin').st_mtime_ns + 10**9
+        os.utime(Path(tmp) / 'en_US' / 'messages.json', ns=(future, future))
+        assert isinstance(I18n(locales_dir=Path(tmp)).get_catalog('zh_CN'), dict)
+    print("  ✓ Compiled catalogs are mapped and stale ones ignored")
+
+
+def test_compact_catalogs():
+    """Test array-backed catalogs and translation by key ID"""
+    print("\n--- Testing Compact Catalogs ---")
+    import json
+    import tempfile
+    from flower_i18n.compact import CompactCatalog
+    from flower_i18n.i18n import I18n
+
+    with tempfile.TemporaryDirectory() as tmp:
+        _write_locales(Path(tmp), {
+            'en_US': {'nav.tasks': 'Tasks', 'nav.broker': 'Broker'},
+            'zh': {'nav.tasks': '任务'},
+            'zh_TW': {'nav.tasks': '', 'nav.broker': '代理'},
+        })
+        i18n = I18n(locales_dir=Path(tmp), catalog_format='compact')
+        catalog = i18n.get_catalog('zh_TW')
+        assert isinstance(catalog, CompactCatalog)
+        # Holes fall through the chain: zh_TW -> zh -> en_US
+        assert dict(catalog) == {'nav.tasks': '任务', 'nav.broker': '代理'}
+        assert not i18n.translations, "Raw dicts must not be kept"
+
+        tasks = i18n.key_id('nav.tasks')
+        assert i18n.key_id('nav.tasks') == tasks
+        assert i18n.get_by_id(tasks, 'zh_TW') == '任务'
+        assert i18n.get_by_id(i18n.key_id('no.such.key'), 'zh_TW') == 'no.such.key'
+        assert I18n(locales_dir=Path(tmp), catalog_format='json').get_by_id(tasks, 'zh') == '任务'
+
+        with open(Path(tmp) / 'zh' / 'messages.json', 'w', encoding='utf-8') as f:
+            json.dump({'nav.tasks': '工作'}, f)
+        i18n.reload(['zh'])
+        assert i18n.get('nav.tasks', 'zh_TW') == '工作'
+        assert catalog.get('nav.tasks') == '任务', "Old catalog is left untouched"
+    print("  ✓ Keys are interned once and locales stored as arrays")
+
+
+def test_rewrite_rules():
+    """Test the single-pass template rewrite engine"""
+    print("\n--- Testing Rewrite Rules ---")
+    from flower_i18n.patcher import rewrite_template_with_counts
+    from flower_i18n.rewrite import RuleSet, mark_i18n
+
+    assert mark_i18n('<th>Queue</th>', 'broker.queue') == '<th data-i18n="broker.queue">Queue</th>'
+
+    # Replaced text is never rescanned, and longer patterns win
+    rules = RuleSet({'a': 'b', 'b': 'c', 'ab': 'X'})
+    assert rules.apply('aab b') == ('bX c', {'a': 1, 'b': 1, 'ab': 1})
+
+    content, counts = rewrite_template_with_counts(
+        'broker.html', '<th>Queue</th><th>Queue</th><th>Ready</th>')
+    assert content.count('data-i18n="broker.queue"') == 2
+    assert counts['<th>Queue</th>'] == 2 and counts['<th>Consumers</th>'] == 0
+    print("  ✓ Rules are applied in one pass with per-rule counts")
+
+
+def test_patch_manifest():
+    """Test incremental patching driven by the content-hash manifest"""
+    print("\n--- Testing Patch Manifest ---")
+    import contextlib
+    import io
+    import json
+    import tempfile
+    from flower_i18n.patcher import FlowerTemplatePatcher
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        (root / 'templates').mkdir()
+        (root / 'static').mkdir()
+        (root / 'templates' / 'base.html').write_text('<html><body></body></html>')
+        (root / 'templates' / 'broker.html').write_text('<th>Queue</th>')
+
+        def run():
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                FlowerTemplatePatcher(root).patch()
+            return output.getvalue()
+
+        run()
+        patched = (root / 'templates' / 'broker.html').read_text()
+        assert 'data-i18n="broker.queue"' in patched
+        manifest = json.loads((root / '.flower_i18n_manifest.json').read_text())
+        assert set(manifest['templates']) == {'base.html', 'broker.html'}
+
+        def tree_state():
+            return {str(path): path.stat().st_mtime_ns for path in [root, *root.rglob('*')]}
+
+        # A second run writes nothing, not even a staged copy
+        before = tree_state()
+        second = run()
+        assert 'nothing to patch' in second, second
+        assert tree_state() == before
+        assert (root / 'templates' / 'broker.html').read_text() == patched
+
+        # A replaced template is re-patched and becomes the new original
+        (root / 'templates' / 'broker.html').write_text('<th>Queue</th><th>Ready</th>')
+        third = run()
+        assert 'Patched broker.html' in third and 'Patched base.html' not in third
+        backup = (root / 'templates_backup' / 'broker.html').read_text()
+        assert backup == '<th>Queue</th><th>Ready</th>'
+    print("  ✓ Unchanged files are skipped and replaced ones re-patched")
+
+
+def test_cli():
+    """Test the status and verify subcommands"""
+    print("\n--- Testing CLI ---")
+    import contextlib
+    import io
+    import tempfile
+    from flower_i18n.cli import main as cli
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        (root / 'templates').mkdir()
+        (root / 'static').mkdir()
+        (root / 'templates' / 'base.html').write_text('<html><body></body></html>')
+        args = ['--flower-path', tmp]
+
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            assert cli(['status'] + args) == 1
+            assert cli(['patch'] + args) == 0
+            # Other templates do not exist in this stand-in installation
+            assert cli(['verify'] + args) == 1
+        assert '✓ base.html: patched' in output.getvalue()
+        assert '✗ tasks.html: missing' in output.getvalue()
+
+        (root / 'templates' / 'base.html').write_text('<html><body>edited</body></html>')
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            cli(['status'] + args)
+        assert '✗ base.html: changed' in output.getvalue()
+    print("  ✓ status and verify report the patch state")
+
+
+def test_snapshots():
+    """Test copy-free snapshots and atomic directory swaps"""
+    print("\n--- Testing Snapshots ---")
+    import os
+    import tempfile
+    from flower_i18n.snapshot import atomic_write, snapshot_tree, stage_tree, swap_directory
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        live = root / 'templates'
+        live.mkdir()
+        (live / 'base.html').write_text('original')
+
+        snapshot_tree(live, root / 'backup')
+        assert (root / 'backup' / 'base.html').read_text() == 'original'
+
+        # Writes replace files, so the snapshot keeps the original data
+        atomic_write(live / 'base.html', b'patched')
+        assert (root / 'backup' / 'base.html').read_text() == 'original'
+
+        swap_directory(live, stage_tree(root / 'backup', live))
+        assert (live / 'base.html').read_text() == 'original'
+        assert sorted(os.listdir(root)) == ['backup', 'templates']
+
+        # A symlinked directory is flipped to the staged tree
+        os.rename(live, root / 'v1')
+        os.symlink('v1', live)
+        staged = stage_tree(root / 'v1', live)
+        atomic_write(staged / 'base.html', b'patched')
+        assert swap_directory(live, staged) == 'symlink'
+        assert (live / 'base.html').read_text() == 'patched'
+        assert not (root / 'v1').exists()
+    print("  ✓ Snapshots share data and swaps never expose a partial tree")
+
+
 def test_patcher():
     """Test patcher functionality"""
     print("\n--- Testing Patcher ---")
@@ -100,6 +1224,30 @@ def main():
     """Run all tests"""
     try:
         test_basic_functionality()
+        test_fallback_chain()
+        test_lazy_loading()
+        test_negotiation()
+        test_handler_translator()
+        test_context_locale()
+        test_message_format()
+        test_metrics()
+        test_feed_labels()
+        test_formatting()
+        test_locale_urls()
+        test_response_transform()
+        test_template_loader()
+        test_server_rendering()
+        test_static_bundle()
+        test_mutation_batching()
+        test_dom_translation()
+        test_catalog_cache()
+        test_hot_reload()
+        test_binary_catalogs()
+        test_compact_catalogs()
+        test_rewrite_rules()
+        test_patch_manifest()
+        test_snapshots()
+        test_cli()
         test_patcher()
         print("\n🎉 All tests completed successfully!")
         return 0